@@ -3,16 +3,28 @@ Attachments API - dosya yükleme ve yönetimi
 """
 import hashlib
 import os
+import zipfile
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
-from fastapi.responses import FileResponse
+from typing import BinaryIO, Callable, List, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Request, Response
+from starlette.concurrency import run_in_threadpool
 from sqlmodel import Session, select
 
+from app.audit import record_audit
 from app.database import get_session, DATA_DIR
-from app.models import Attachment, Entry, AuditLog
-from app.schemas import AttachmentRead
+from app.models import Attachment, Blob, Entry
+from app.schemas import AttachmentRead, BatchUploadItem, BatchUploadResult
+from app.pagination import paginate
+from app.quotas import check_quota
+from app.storage import multipart_body, stage_multipart, stage_stream, should_compress
+from app.blobs import PlacedBlob, acquire_blob, discard_placed, place_blob, storage_usage
+from app.gc import GC_GRACE
+from app.responses import content_response, guess_media_type
+from app.thumbnails import (
+    PDF_TYPES, THUMBNAIL_SIZES, supports_derivatives, schedule_derivatives, ensure_derivative,
+)
 
 router = APIRouter()
 
@@ -26,11 +38,12 @@ ALLOWED_EXTENSIONS = {
     "xlsx": 20 * 1024 * 1024,  # 20MB
     "csv": 10 * 1024 * 1024,   # 10MB
 }
+MAX_UPLOAD_SIZE = max(ALLOWED_EXTENSIONS.values())
 
-# Storage dizini
-STORAGE_DIR = DATA_DIR / "storage" / "attachments"
-STORAGE_DIR.mkdir(parents=True, exist_ok=True)
-
+# Toplu yüklemede paralel hash/yazma iş parçacığı sayısı
+BATCH_UPLOAD_WORKERS = int(os.getenv("BATCH_UPLOAD_WORKERS", "4"))
+# Tek istekte (veya arşivde) en fazla dosya
+BATCH_MAX_FILES = 1000
 
 def get_file_hash(content: bytes) -> str:
     """Dosya SHA256 hash'ini hesapla"""
@@ -42,109 +55,315 @@ def get_file_extension(filename: str) -> str:
     return filename.lower().split(".")[-1] if "." in filename else ""
 
 
-def validate_file(file: UploadFile, content: bytes) -> tuple[bool, str]:
-    """Dosya validasyonu"""
-    ext = get_file_extension(file.filename)
+def validate_file(filename: str) -> tuple[bool, str]:
+    """Dosya tipi validasyonu (boyut yükleme sırasında kontrol edilir)"""
+    ext = get_file_extension(filename)
     
     if ext not in ALLOWED_EXTENSIONS:
         return False, f"Desteklenmeyen dosya tipi: {ext}. İzin verilenler: {', '.join(ALLOWED_EXTENSIONS.keys())}"
     
-    max_size = ALLOWED_EXTENSIONS[ext]
-    if len(content) > max_size:
-        return False, f"Dosya çok büyük. Maksimum boyut: {max_size / (1024*1024):.1f}MB"
-    
     return True, ""
 
 
-@router.post("/", response_model=AttachmentRead, status_code=201)
+def _upload_limit(filename: str) -> int:
+    """Dosya tipini doğrula, tipin boyut limitini döndür"""
+    is_valid, error_msg = validate_file(filename)
+    if not is_valid:
+        raise HTTPException(status_code=422, detail=error_msg)
+    return ALLOWED_EXTENSIONS[get_file_extension(filename)]
+
+
+@router.post(
+    "/", response_model=AttachmentRead, status_code=201, openapi_extra=multipart_body("file"),
+)
 async def upload_attachment(
+    request: Request,
     entry_id: int = Query(..., description="Bağlı olduğu entry ID"),
     caption: Optional[str] = Query(None, description="Dosya açıklaması"),
-    file: UploadFile = File(...),
     session: Session = Depends(get_session),
 ):
-    """Dosya yükle ve entry'ye bağla"""
+    """Dosya yükle ve entry'ye bağla (multipart 'file' alanı)"""
     
     # Entry kontrolü
-    entry = session.get(Entry, entry_id)
+    entry = await run_in_threadpool(session.get, Entry, entry_id)
     if not entry:
         raise HTTPException(status_code=404, detail="Entry not found")
     
-    # Dosyayı oku
-    content = await file.read()
+    # Gövde okunurken yazıcı bağlantısını tutma
+    await run_in_threadpool(session.rollback)
     
-    # Validasyon
-    is_valid, error_msg = validate_file(file, content)
-    if not is_valid:
-        raise HTTPException(status_code=422, detail=error_msg)
+    # Gövde gelirken geçici dosyaya yazılır (tip, hash ve boyut limiti akış sırasında)
+    filename, staged = await stage_multipart(request, "file", MAX_UPLOAD_SIZE, _upload_limit)
     
-    # Hash hesapla
-    file_hash = get_file_hash(content)
+    # Disk ve veritabanı işlemleri event loop dışında; sıkıştırma transaction açılmadan
+    try:
+        placed = await run_in_threadpool(
+            place_blob, staged, should_compress(get_file_extension(filename))
+        )
+        attachment = await run_in_threadpool(
+            save_attachment, session, entry, filename, placed, caption
+        )
+    finally:
+        staged.discard()  # taşındıysa no-op
     
-    # Aynı dosya daha önce yüklendi mi?
-    existing = session.exec(
-        select(Attachment).where(Attachment.sha256 == file_hash)
-    ).first()
+    # Küçük resim ve önizleme arka planda (süreç havuzu)
+    schedule_derivatives(DATA_DIR / attachment.file_path, attachment.file_type, attachment.sha256)
+    return attachment
+
+
+def save_attachment(
+    session: Session,
+    entry: Entry,
+    filename: str,
+    placed: PlacedBlob,
+    caption: Optional[str],
+    before_commit: Optional[Callable[[Attachment], None]] = None,
+) -> Attachment:
+    """Yerine konmuş dosyayı veritabanına ekle
+
+    Dosya place_blob ile önceden konmuş olmalı; transaction yalnızca
+    satırları yazar. Kayıt yazılamazsa bu yüklemenin koyduğu dosya silinir.
+    before_commit verilirse aynı transaction içinde, commit'ten hemen önce
+    yeni kayıtla çağrılır.
+    """
+    file_hash = placed.sha256
+    try:
+        # Aynı dosya bu entry'ye daha önce eklendi mi? (başka entry'lerde paylaşılabilir)
+        existing = session.exec(
+            select(Attachment).where(
+                Attachment.sha256 == file_hash,
+                Attachment.entry_id == entry.id,
+                Attachment.deleted_at.is_(None),
+            )
+        ).first()
+        
+        if existing:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Bu dosya zaten yüklendi (ID: {existing.id})"
+            )
+        check_quota(session, entry, placed.staged.size)
+        
+        # İçerik adresli blob: aynı içerik diskte tek kopya
+        blob, _ = acquire_blob(session, placed)
+        
+        db_attachment = Attachment(
+            entry_id=entry.id,
+            file_path=blob.file_path,
+            file_type=get_file_extension(filename),
+            file_size=placed.staged.size,
+            original_name=filename,
+            caption=caption,
+            sha256=file_hash,
+        )
+        session.add(db_attachment)
+        session.flush()
+        
+        # Audit log (aynı transaction)
+        record_audit(session, "attachment", db_attachment.id, entry.author_id, "create")
+        if before_commit is not None:
+            before_commit(db_attachment)
+        session.commit()
+    except Exception:
+        # Kayıt yazılamadıysa diskte sahipsiz blob bırakma
+        session.rollback()
+        discard_placed(session, placed)
+        raise
+    
+    return db_attachment
+
+
+@router.post("/batch", response_model=BatchUploadResult)
+async def upload_attachments_batch(
+    entry_id: int = Query(..., description="Bağlı olduğu entry ID"),
+    caption: Optional[str] = Query(None, description="Tüm dosyalar için açıklama"),
+    files: List[UploadFile] = File(..., description="Dosyalar veya tek bir .zip arşivi"),
+    session: Session = Depends(get_session),
+):
+    """Çok sayıda dosyayı tek istekte yükle (dosya başına sonuç raporu)"""
+    entry = await run_in_threadpool(session.get, Entry, entry_id)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Entry not found")
+    
+    # Dosyalar hash'lenirken yazıcı bağlantısını tutma
+    await run_in_threadpool(session.rollback)
+    
+    return await run_in_threadpool(_save_batch, session, entry_id, files, caption)
+
+
+def _batch_sources(files: List[UploadFile]) -> List[Tuple[str, Callable[[], BinaryIO]]]:
+    """Yüklenen dosyalar veya zip arşivi üyeleri: (dosya adı, açıcı)"""
+    if len(files) == 1 and get_file_extension(files[0].filename) == "zip":
+        try:
+            archive = zipfile.ZipFile(files[0].file)
+        except zipfile.BadZipFile:
+            raise HTTPException(status_code=422, detail="Geçersiz zip arşivi")
+        members = [
+            info for info in archive.infolist()
+            if not info.is_dir() and not info.filename.startswith("__MACOSX/")
+        ]
+        sources = [
+            (Path(info.filename).name, lambda info=info: archive.open(info))
+            for info in members
+        ]
+    else:
+        sources = [(f.filename, lambda f=f: f.file) for f in files]
     
-    if existing:
+    if len(sources) > BATCH_MAX_FILES:
         raise HTTPException(
-            status_code=409,
-            detail=f"Bu dosya zaten yüklendi (ID: {existing.id})"
+            status_code=422, detail=f"En fazla {BATCH_MAX_FILES} dosya yüklenebilir"
         )
+    return sources
+
+
+def _stage_source(
+    filename: str, opener: Callable[[], BinaryIO]
+) -> Tuple[Optional[PlacedBlob], Optional[str]]:
+    """Tek dosyayı doğrula, geçici dosyaya yaz ve blob yoluna koy (iş parçacığında çalışır)"""
+    is_valid, error_msg = validate_file(filename)
+    if not is_valid:
+        return None, error_msg
+    ext = get_file_extension(filename)
+    try:
+        staged = stage_stream(opener(), ALLOWED_EXTENSIONS[ext])
+        try:
+            return place_blob(staged, should_compress(ext)), None
+        except BaseException:
+            staged.discard()
+            raise
+    except HTTPException as e:
+        return None, e.detail
+    except Exception as e:
+        return None, str(e)
+
+
+def _save_batch(
+    session: Session,
+    entry_id: int,
+    files: List[UploadFile],
+    caption: Optional[str],
+) -> BatchUploadResult:
+    """Dosyaları paralel hash'le, tek sorguda tekrarları bul, tek transaction'da ekle
+
+    Hash, sıkıştırma ve blob yoluna koyma veritabanı bağlantısı tutulmadan
+    yapılır; yazma transaction'ı ancak tüm dosyalar hazır olunca açılır ve
+    yalnızca satırları yazar.
+    """
+    sources = _batch_sources(files)
     
-    # Storage yolu oluştur: storage/attachments/yyyy/mm/hash.ext
-    now = datetime.utcnow()
-    year_dir = STORAGE_DIR / str(now.year)
-    month_dir = year_dir / f"{now.month:02d}"
-    month_dir.mkdir(parents=True, exist_ok=True)
-    
-    ext = get_file_extension(file.filename)
-    file_path = month_dir / f"{file_hash[:16]}.{ext}"
-    
-    # Dosyayı kaydet
-    with open(file_path, "wb") as f:
-        f.write(content)
-    
-    # Veritabanına kaydet (relative path)
-    relative_path = str(file_path.relative_to(DATA_DIR))
-    
-    db_attachment = Attachment(
-        entry_id=entry_id,
-        file_path=relative_path,
-        file_type=ext,
-        file_size=len(content),
-        original_name=file.filename,
-        caption=caption,
-        sha256=file_hash,
-    )
+    # Hash, sıkıştırma ve blob yoluna koyma paralel iş parçacıklarında
+    with ThreadPoolExecutor(max_workers=BATCH_UPLOAD_WORKERS) as pool:
+        staged = list(pool.map(lambda source: _stage_source(*source), sources))
     
-    session.add(db_attachment)
-    session.commit()
-    session.refresh(db_attachment)
-    
-    # Audit log
-    audit = AuditLog(
-        entity="attachment",
-        entity_id=db_attachment.id,
-        who=entry.author_id,
-        action="create",
-    )
-    session.add(audit)
-    session.commit()
+    try:
+        entry = session.get(Entry, entry_id)
+        if not entry:
+            raise HTTPException(status_code=404, detail="Entry not found")
+        hashes = {item.sha256 for item, _ in staged if item is not None}
+        # Bu entry'de zaten olanlar ve mevcut blob'lar: tek sorgu
+        existing = dict(session.exec(
+            select(Attachment.sha256, Attachment.id)
+            .where(
+                Attachment.entry_id == entry.id,
+                Attachment.sha256.in_(hashes),
+                Attachment.deleted_at.is_(None),
+            )
+        ).all()) if hashes else {}
+        if hashes:
+            # Kimlik haritasına yükle
+            session.exec(select(Blob).where(Blob.sha256.in_(hashes))).all()
+        # Kota tüm toplu yükleme için bir kez kontrol edilir
+        incoming = {
+            item.sha256: item.staged.size
+            for item, _ in staged if item is not None and item.sha256 not in existing
+        }
+        check_quota(session, entry, sum(incoming.values()))
+        
+        results: List[BatchUploadItem] = []
+        new_attachments: List[Tuple[BatchUploadItem, Attachment]] = []
+        seen = {}
+        for (filename, _), (item, error) in zip(sources, staged):
+            if item is None:
+                results.append(BatchUploadItem(filename=filename, status="error", detail=error))
+                continue
+            if item.sha256 in existing:
+                results.append(BatchUploadItem(
+                    filename=filename, status="duplicate", sha256=item.sha256,
+                    attachment_id=existing[item.sha256],
+                    detail=f"Bu dosya zaten yüklendi (ID: {existing[item.sha256]})",
+                ))
+                continue
+            if item.sha256 in seen:
+                results.append(BatchUploadItem(
+                    filename=filename, status="duplicate", sha256=item.sha256,
+                    detail=f"Aynı yüklemede tekrar: {seen[item.sha256]}",
+                ))
+                continue
+            seen[item.sha256] = filename
+            
+            blob, _ = acquire_blob(session, item)
+            attachment = Attachment(
+                entry_id=entry.id,
+                file_path=blob.file_path,
+                file_type=get_file_extension(filename),
+                file_size=item.staged.size,
+                original_name=filename,
+                caption=caption,
+                sha256=item.sha256,
+            )
+            session.add(attachment)
+            result = BatchUploadItem(filename=filename, status="created", sha256=item.sha256)
+            results.append(result)
+            new_attachments.append((result, attachment))
+        
+        try:
+            session.flush()
+            for result, attachment in new_attachments:
+                result.attachment_id = attachment.id
+                record_audit(session, "attachment", attachment.id, entry.author_id, "create")
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+    except Exception:
+        # Kayıt yazılamadıysa bu yüklemenin koyduğu dosyaları bırakma
+        session.rollback()
+        for item, _ in staged:
+            if item is not None:
+                discard_placed(session, item)
+        raise
+    finally:
+        for item, _ in staged:
+            if item is not None:
+                item.staged.discard()  # taşındıysa no-op
     
-    return db_attachment
+    for _, attachment in new_attachments:
+        schedule_derivatives(
+            DATA_DIR / attachment.file_path, attachment.file_type, attachment.sha256
+        )
+    
+    return BatchUploadResult(
+        entry_id=entry.id,
+        created=sum(r.status == "created" for r in results),
+        duplicates=sum(r.status == "duplicate" for r in results),
+        failed=sum(r.status == "error" for r in results),
+        results=results,
+    )
 
 
 @router.get("/", response_model=List[AttachmentRead])
-async def list_attachments(
+def list_attachments(
     entry_id: Optional[int] = Query(None),
     file_type: Optional[str] = Query(None),
     limit: int = Query(100, le=500),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Önceki yanıttaki X-Next-Cursor"),
+    estimate: bool = Query(False, description="X-Total-Estimate başlığını hesapla"),
+    response: Response = None,
     session: Session = Depends(get_session),
 ):
     """Dosyaları listele"""
-    statement = select(Attachment)
+    statement = select(Attachment).where(Attachment.deleted_at.is_(None))
     
     if entry_id:
         statement = statement.where(Attachment.entry_id == entry_id)
@@ -152,73 +371,156 @@ async def list_attachments(
     if file_type:
         statement = statement.where(Attachment.file_type == file_type)
     
-    statement = statement.order_by(Attachment.created_at.desc()).offset(offset).limit(limit)
-    attachments = session.exec(statement).all()
-    
-    return attachments
+    return paginate(
+        session, statement, response, Attachment.created_at, Attachment.id,
+        limit, offset, cursor, estimate,
+    )
+
+
+@router.get("/trash", response_model=List[AttachmentRead])
+def list_trash(
+    entry_id: Optional[int] = Query(None),
+    session: Session = Depends(get_session),
+):
+    """Çöp kutusundaki dosyalar (gc kalıcı silene kadar geri alınabilir)"""
+    statement = select(Attachment).where(Attachment.deleted_at.is_not(None))
+    if entry_id:
+        statement = statement.where(Attachment.entry_id == entry_id)
+    return session.exec(statement.order_by(Attachment.deleted_at.desc())).all()
+
+
+@router.get("/storage")
+def get_storage_usage(session: Session = Depends(get_session)):
+    """Depolama kullanımı: mantıksal ve fiziksel byte"""
+    return storage_usage(session)
+
+
+def _get_attachment(session: Session, attachment_id: int) -> Attachment:
+    """Attachment'ı getir; yoksa veya çöp kutusundaysa 404"""
+    attachment = session.get(Attachment, attachment_id)
+    if not attachment or attachment.deleted_at is not None:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    return attachment
 
 
 @router.get("/{attachment_id}", response_model=AttachmentRead)
-async def get_attachment(
+def get_attachment(
     attachment_id: int,
     session: Session = Depends(get_session),
 ):
     """Dosya detayı"""
-    attachment = session.get(Attachment, attachment_id)
-    if not attachment:
-        raise HTTPException(status_code=404, detail="Attachment not found")
+    attachment = _get_attachment(session, attachment_id)
     return attachment
 
 
-@router.get("/{attachment_id}/download")
-async def download_attachment(
+@router.api_route("/{attachment_id}/download", methods=["GET", "HEAD"])
+def download_attachment(
     attachment_id: int,
+    request: Request,
+    inline: bool = Query(False, description="Tarayıcıda göster (Content-Disposition: inline)"),
     session: Session = Depends(get_session),
 ):
-    """Dosyayı indir"""
-    attachment = session.get(Attachment, attachment_id)
-    if not attachment:
-        raise HTTPException(status_code=404, detail="Attachment not found")
+    """Dosyayı indir (Range, ETag/304 ve immutable önbellek destekli)"""
+    attachment = _get_attachment(session, attachment_id)
     
     file_path = DATA_DIR / attachment.file_path
     
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="File not found on disk")
     
-    return FileResponse(
-        path=file_path,
-        filename=attachment.original_name,
-        media_type=f"application/{attachment.file_type}",
+    return content_response(
+        request,
+        file_path,
+        attachment.sha256,
+        attachment.original_name,
+        media_type=guess_media_type(attachment.original_name, attachment.file_type),
+        content_disposition_type="inline" if inline else "attachment",
+        size=attachment.file_size,
+    )
+
+
+@router.api_route("/{attachment_id}/thumbnail", methods=["GET", "HEAD"])
+def get_thumbnail(
+    attachment_id: int,
+    request: Request,
+    size: str = Query("thumb", description="thumb (256px) veya preview (1024px)"),
+    session: Session = Depends(get_session),
+):
+    """Küçük resim/önizleme (yoksa üretilir)"""
+    if size not in THUMBNAIL_SIZES:
+        raise HTTPException(status_code=422, detail=f"Geçersiz boyut: {size}")
+    
+    attachment = _get_attachment(session, attachment_id)
+    if attachment.file_type in PDF_TYPES and not supports_derivatives(attachment.file_type):
+        raise HTTPException(
+            status_code=501, detail="PDF önizlemesi kullanılamıyor: PyMuPDF kurulu değil"
+        )
+    if not supports_derivatives(attachment.file_type):
+        raise HTTPException(status_code=404, detail="Bu dosya tipi için önizleme yok")
+    
+    path = ensure_derivative(
+        DATA_DIR / attachment.file_path, attachment.file_type, attachment.sha256, size
+    )
+    if path is None:
+        raise HTTPException(status_code=404, detail="Önizleme üretilemedi")
+    
+    stem = attachment.original_name.rsplit(".", 1)[0]
+    return content_response(
+        request, path, f"{attachment.sha256}.{size}", f"{stem}.{size}.jpg",
+        media_type="image/jpeg", content_disposition_type="inline",
     )
 
 
 @router.delete("/{attachment_id}")
-async def delete_attachment(
+def delete_attachment(
+    attachment_id: int,
+    user_id: int = Query(..., description="İşlemi yapan kullanıcı ID"),
+    session: Session = Depends(get_session),
+):
+    """Dosyayı çöp kutusuna taşı (dosya ve blob gc tarafından silinir)"""
+    attachment = _get_attachment(session, attachment_id)
+    
+    attachment.deleted_at = datetime.utcnow()
+    session.add(attachment)
+    record_audit(session, "attachment", attachment_id, user_id, "delete")
+    session.commit()
+    
+    return {
+        "status": "deleted",
+        "attachment_id": attachment_id,
+        "purge_after": attachment.deleted_at + GC_GRACE,
+    }
+
+
+@router.post("/{attachment_id}/restore", response_model=AttachmentRead)
+def restore_attachment(
     attachment_id: int,
     user_id: int = Query(..., description="İşlemi yapan kullanıcı ID"),
     session: Session = Depends(get_session),
 ):
-    """Dosyayı sil"""
+    """Çöp kutusundaki dosyayı geri al"""
     attachment = session.get(Attachment, attachment_id)
     if not attachment:
         raise HTTPException(status_code=404, detail="Attachment not found")
+    if attachment.deleted_at is None:
+        raise HTTPException(status_code=409, detail="Attachment is not deleted")
     
-    # Dosyayı diskten sil
-    file_path = DATA_DIR / attachment.file_path
-    if file_path.exists():
-        file_path.unlink()
-    
-    # Audit log
-    audit = AuditLog(
-        entity="attachment",
-        entity_id=attachment_id,
-        who=user_id,
-        action="delete",
-    )
-    session.add(audit)
+    # Silindikten sonra aynı dosya entry'ye yeniden eklendiyse geri alınamaz
+    duplicate = session.exec(
+        select(Attachment.id).where(
+            Attachment.entry_id == attachment.entry_id,
+            Attachment.sha256 == attachment.sha256,
+            Attachment.deleted_at.is_(None),
+        )
+    ).first()
+    if duplicate:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Bu dosya entry'de zaten mevcut (ID: {duplicate})",
+        )
     
-    # Veritabanından sil
-    session.delete(attachment)
+    attachment.deleted_at = None
+    session.add(attachment)
+    record_audit(session, "attachment", attachment_id, user_id, "restore")
     session.commit()
-    
-    return {"status": "deleted", "attachment_id": attachment_id}
+    return attachment
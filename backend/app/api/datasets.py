@@ -1,140 +1,240 @@
 """
 Datasets API - CSV/XLSX içe aktarma ve grafik üretimi
 """
-import io
+import os
 from datetime import datetime
 from pathlib import Path
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from starlette.concurrency import run_in_threadpool
 from sqlmodel import Session, select
-import pandas as pd
-import matplotlib
-matplotlib.use('Agg')  # GUI olmadan çalışma
-import matplotlib.pyplot as plt
 
+from app.audit import record_audit
 from app.database import get_session, DATA_DIR
-from app.models import Dataset, Chart, Entry, AuditLog
+from app.models import Dataset, Chart, Entry
 from app.schemas import DatasetRead, ChartCreateRequest, ChartRead
+from app.pagination import paginate
+from app.charts import CHART_DIR, CHART_TYPES, cache_key, render_async
+from app.columnar import ColumnarWriter, directory_size, read_columnar, remove_columnar
+from app.downsample import downsample
+from app.profiling import DatasetProfile
+from app.quotas import check_quota
+from app.storage import StagedFile, multipart_body, should_compress, stage_multipart, store_file
 
 router = APIRouter()
 
-# Storage dizinleri
+# Storage dizinleri (ilk yazmada oluşturulur)
 DATASET_DIR = DATA_DIR / "storage" / "datasets"
-CHART_DIR = DATA_DIR / "storage" / "charts"
-DATASET_DIR.mkdir(parents=True, exist_ok=True)
-CHART_DIR.mkdir(parents=True, exist_ok=True)
 
+# İçe aktarılabilecek en büyük dosya
+DATASET_MAX_BYTES = int(os.getenv("DATASET_MAX_BYTES", str(5 * 1024**3)))
+# CSV bu kadar satırlık parçalar halinde işlenir
+CSV_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", "100000"))
 
-@router.post("/import", response_model=DatasetRead, status_code=201)
+
+def read_table(path: Path, **kwargs):
+    """Saklanan CSV (gzip'li olabilir) veya XLSX dosyasını DataFrame olarak oku"""
+    import pandas as pd
+    if ".csv" in path.suffixes:
+        return pd.read_csv(path, **kwargs)  # .gz uzantısından sıkıştırmayı çıkarır
+    return pd.read_excel(path, **kwargs)
+
+
+def load_dataset(
+    dataset: Dataset,
+    columns: Optional[List[str]] = None,
+    nrows: Optional[int] = None,
+    offset: int = 0,
+):
+    """Dataset'i kolon önbelleğinden (yoksa kaynak dosyadan) oku
+
+    Yalnızca istenen kolonlar ve offset'ten başlayan nrows satır yüklenir.
+    """
+    if dataset.columnar_path:
+        columnar_dir = DATA_DIR / dataset.columnar_path
+        if columnar_dir.exists():
+            return read_columnar(columnar_dir, columns, nrows, offset)
+    # Kaynak dosyada pencere: önceki satırlar parse edilmeden atlanamaz
+    skiprows = range(1, offset + 1) if offset else None
+    return read_table(
+        DATA_DIR / dataset.source_file, usecols=columns, nrows=nrows, skiprows=skiprows
+    )
+
+
+def _column_values(series) -> list:
+    """Kolonu JSON listesine çevir (boş değerler null, tarihler ISO)"""
+    import pandas as pd
+    if series.dtype.kind == "M":
+        return [value.isoformat() if not pd.isna(value) else None for value in series]
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def _import_limit(filename: str) -> int:
+    """Dosya tipini doğrula (CSV/XLSX), boyut limitini döndür"""
+    if not filename.lower().endswith(('.csv', '.xlsx')):
+        raise HTTPException(
+            status_code=422,
+            detail="Sadece CSV ve XLSX dosyaları desteklenir"
+        )
+    return DATASET_MAX_BYTES
+
+
+@router.post(
+    "/import", response_model=DatasetRead, status_code=201, openapi_extra=multipart_body("file"),
+)
 async def import_dataset(
+    request: Request,
     entry_id: int = Query(...),
     name: str = Query(..., description="Dataset adı"),
-    file: UploadFile = File(...),
     session: Session = Depends(get_session),
 ):
-    """CSV veya XLSX dosyasını içe aktar"""
+    """CSV veya XLSX dosyasını içe aktar (multipart 'file' alanı)"""
     
     # Entry kontrolü
-    entry = session.get(Entry, entry_id)
+    entry = await run_in_threadpool(session.get, Entry, entry_id)
     if not entry:
         raise HTTPException(status_code=404, detail="Entry not found")
     
-    # Dosya tipini kontrol et
-    filename = file.filename.lower()
-    if not (filename.endswith('.csv') or filename.endswith('.xlsx')):
-        raise HTTPException(
-            status_code=422,
-            detail="Sadece CSV ve XLSX dosyaları desteklenir"
-        )
+    # Gövde okunurken yazıcı bağlantısını tutma
+    await run_in_threadpool(session.rollback)
     
-    # Dosyayı oku
-    content = await file.read()
+    # Dosya belleğe ve ara kopyaya alınmadan, gelirken geçici dosyaya yazılır
+    filename, staged = await stage_multipart(request, "file", DATASET_MAX_BYTES, _import_limit)
+    try:
+        # Parse, istatistik ve kayıt işlemleri event loop dışında
+        return await run_in_threadpool(
+            _store_dataset, session, entry_id, name, filename.lower(), staged
+        )
+    finally:
+        staged.discard()
+
+
+def _iter_chunks(path: Path, file_ext: str):
+    """Dosyayı DataFrame parçaları olarak oku (CSV: CSV_CHUNK_ROWS satır)"""
+    import pandas as pd
+    if file_ext == "csv":
+        with pd.read_csv(path, chunksize=CSV_CHUNK_ROWS) as reader:
+            yield from reader
+    else:
+        # XLSX parça parça okunamıyor: tek parça
+        yield pd.read_excel(path)
+
+
+def _store_dataset(
+    session: Session,
+    entry_id: int,
+    name: str,
+    filename: str,
+    staged: StagedFile,
+) -> Dataset:
+    """Dosyayı parça parça parse et, profil ve kolon önbelleğini çıkar, kaydet
+
+    Bellekte yalnızca o anki parça ve sabit boyutlu özetler tutulur.
+    """
+    entry = session.get(Entry, entry_id)
+    check_quota(session, entry, staged.size)
+    author_id = entry.author_id
+    # Uzun parse sırasında bağlantı tutulmasın
+    session.rollback()
     
-    # Pandas ile parse et
+    file_ext = "csv" if filename.endswith('.csv') else "xlsx"
+    profile = DatasetProfile()
+    # Sonraki okumalar için tipli kolon kopyası (yazılamazsa kaynaktan okunur)
+    writer: Optional[ColumnarWriter] = ColumnarWriter()
     try:
-        if filename.endswith('.csv'):
-            df = pd.read_csv(io.BytesIO(content))
-        else:
-            df = pd.read_excel(io.BytesIO(content))
+        for chunk in _iter_chunks(staged.path, file_ext):
+            profile.update(chunk)
+            if writer is not None:
+                try:
+                    writer.append(chunk)
+                except Exception as e:
+                    print(f"⚠️ Kolon önbelleği yazılamadı: {e}")
+                    writer.abort()
+                    writer = None
     except Exception as e:
+        if writer is not None:
+            writer.abort()
         raise HTTPException(
             status_code=422,
             detail=f"Dosya parse hatası: {str(e)}"
         )
     
-    if df.empty:
+    if profile.row_count == 0:
+        if writer is not None:
+            writer.abort()
         raise HTTPException(status_code=422, detail="Dosya boş")
     
+    columnar_dir = None
+    if writer is not None:
+        try:
+            columnar_dir = writer.close()
+        except Exception as e:
+            print(f"⚠️ Kolon önbelleği yazılamadı: {e}")
+            writer.abort()
+    
     # Dosyayı kaydet
     now = datetime.utcnow()
     year_dir = DATASET_DIR / str(now.year)
     month_dir = year_dir / f"{now.month:02d}"
     month_dir.mkdir(parents=True, exist_ok=True)
     
-    file_ext = "csv" if filename.endswith('.csv') else "xlsx"
     timestamp = now.strftime("%Y%m%d_%H%M%S")
     file_path = month_dir / f"{name.replace(' ', '_')}_{timestamp}.{file_ext}"
     
-    with open(file_path, "wb") as f:
-        f.write(content)
-    
-    # Kolon bilgileri
-    columns_info = {}
-    for col in df.columns:
-        dtype = str(df[col].dtype)
-        columns_info[col] = {
-            "dtype": dtype,
-            "non_null": int(df[col].count()),
-            "unique": int(df[col].nunique())
-        }
-    
-    # İstatistikler (sadece numerik kolonlar)
-    stats_info = {}
-    numeric_cols = df.select_dtypes(include=['number']).columns
-    if len(numeric_cols) > 0:
-        stats_df = df[numeric_cols].describe()
-        for col in numeric_cols:
-            stats_info[col] = {
-                "mean": float(stats_df.loc['mean', col]) if 'mean' in stats_df.index else None,
-                "std": float(stats_df.loc['std', col]) if 'std' in stats_df.index else None,
-                "min": float(stats_df.loc['min', col]) if 'min' in stats_df.index else None,
-                "max": float(stats_df.loc['max', col]) if 'max' in stats_df.index else None,
-            }
+    # CSV diske gzip'li yazılır (yeterli kazanç yoksa ham)
+    file_path, stored_size, encoding = store_file(staged.path, file_path, should_compress(file_ext))
     
     # Veritabanına kaydet
     relative_path = str(file_path.relative_to(DATA_DIR))
+    columnar_size = directory_size(columnar_dir) if columnar_dir else None
     
     db_dataset = Dataset(
         entry_id=entry_id,
         name=name,
         source_file=relative_path,
-        columns_json=columns_info,
-        stats_json=stats_info,
-        row_count=len(df),
+        file_size=staged.size,
+        stored_size=stored_size,
+        encoding=encoding,
+        sha256=staged.sha256,
+        columnar_path=str(columnar_dir.relative_to(DATA_DIR)) if columnar_dir else None,
+        columnar_size=columnar_size,
+        columns_json=profile.columns_json(),
+        stats_json=profile.stats_json(),
+        row_count=profile.row_count,
     )
     
-    session.add(db_dataset)
-    session.commit()
-    session.refresh(db_dataset)
-    
-    # Audit log
-    audit = AuditLog(
-        entity="dataset",
-        entity_id=db_dataset.id,
-        who=entry.author_id,
-        action="create",
-    )
-    session.add(audit)
-    session.commit()
+    try:
+        # Parse sırasında başka yüklemeler kotayı doldurmuş olabilir: kayıtla aynı
+        # transaction'da, deftere yazılacak gerçek boyutla yeniden kontrol
+        entry = session.get(Entry, entry_id)
+        if not entry:
+            raise HTTPException(status_code=404, detail="Entry not found")
+        check_quota(session, entry, stored_size + (columnar_size or 0))
+        
+        session.add(db_dataset)
+        session.flush()
+        
+        # Audit log (aynı transaction)
+        record_audit(session, "dataset", db_dataset.id, author_id, "create")
+        session.commit()
+    except Exception:
+        session.rollback()
+        file_path.unlink(missing_ok=True)
+        if columnar_dir is not None:
+            remove_columnar(columnar_dir)
+        raise
     
     return db_dataset
 
 
 @router.get("/", response_model=List[DatasetRead])
-async def list_datasets(
+def list_datasets(
     entry_id: Optional[int] = Query(None),
     limit: int = Query(50, le=200),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Önceki yanıttaki X-Next-Cursor"),
+    estimate: bool = Query(False, description="X-Total-Estimate başlığını hesapla"),
+    response: Response = None,
     session: Session = Depends(get_session),
 ):
     """Dataset'leri listele"""
@@ -143,14 +243,14 @@ async def list_datasets(
     if entry_id:
         statement = statement.where(Dataset.entry_id == entry_id)
     
-    statement = statement.order_by(Dataset.created_at.desc()).offset(offset).limit(limit)
-    datasets = session.exec(statement).all()
-    
-    return datasets
+    return paginate(
+        session, statement, response, Dataset.created_at, Dataset.id,
+        limit, offset, cursor, estimate,
+    )
 
 
 @router.get("/{dataset_id}", response_model=DatasetRead)
-async def get_dataset(
+def get_dataset(
     dataset_id: int,
     session: Session = Depends(get_session),
 ):
@@ -162,7 +262,7 @@ async def get_dataset(
 
 
 @router.get("/{dataset_id}/preview")
-async def preview_dataset(
+def preview_dataset(
     dataset_id: int,
     rows: int = Query(100, le=1000, description="Gösterilecek satır sayısı"),
     session: Session = Depends(get_session),
@@ -172,16 +272,11 @@ async def preview_dataset(
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset not found")
     
-    file_path = DATA_DIR / dataset.source_file
-    if not file_path.exists():
-        raise HTTPException(status_code=404, detail="Source file not found")
-    
-    # Dosyayı oku
+    # Önbellekten yalnızca ilk N satır
     try:
-        if dataset.source_file.endswith('.csv'):
-            df = pd.read_csv(file_path, nrows=rows)
-        else:
-            df = pd.read_excel(file_path, nrows=rows)
+        df = load_dataset(dataset, nrows=rows)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Source file not found")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Read error: {str(e)}")
     
@@ -195,67 +290,123 @@ async def preview_dataset(
     }
 
 
-@router.post("/{dataset_id}/chart", response_model=ChartRead, status_code=201)
-async def create_chart(
+@router.get("/{dataset_id}/rows")
+def dataset_rows(
     dataset_id: int,
-    chart_request: ChartCreateRequest,
-    user_id: int = Query(..., description="İşlemi yapan kullanıcı ID"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=10000),
+    columns: Optional[str] = Query(None, description="Virgülle ayrılmış kolon adları (boş: tümü)"),
     session: Session = Depends(get_session),
 ):
-    """Dataset'ten grafik üret"""
-    
+    """Satır penceresi (kolon bazlı JSON)
+
+    Kolon önbelleğinden memory-map ile okunur; süre offset'ten bağımsızdır.
+    Yanıt satır başına sözlük yerine kolon başına bir liste içerir.
+    """
     dataset = session.get(Dataset, dataset_id)
     if not dataset:
         raise HTTPException(status_code=404, detail="Dataset not found")
     
-    # Dosyayı oku
-    file_path = DATA_DIR / dataset.source_file
+    if columns:
+        names = [name.strip() for name in columns.split(",") if name.strip()]
+    else:
+        names = list(dataset.columns_json)
+    missing = [name for name in names if name not in dataset.columns_json]
+    if missing:
+        raise HTTPException(status_code=422, detail=f"Column '{missing[0]}' not found")
+    
     try:
-        if dataset.source_file.endswith('.csv'):
-            df = pd.read_csv(file_path)
-        else:
-            df = pd.read_excel(file_path)
+        df = None
+        if offset < dataset.row_count:
+            df = load_dataset(dataset, columns=names, nrows=limit, offset=offset)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Source file not found")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Read error: {str(e)}")
     
-    # Kolon kontrolü
-    if chart_request.x_column not in df.columns:
+    return {
+        "dataset_id": dataset_id,
+        "total_rows": dataset.row_count,
+        "offset": offset,
+        "row_count": len(df) if df is not None else 0,
+        "columns": names,
+        "data": {name: _column_values(df[name]) if df is not None else [] for name in names},
+    }
+
+
+def _cached_chart(session: Session, dataset_id: int, key: str) -> Optional[Chart]:
+    """Dataset'in aynı anahtarlı, PNG'si diskte duran en yeni grafiği"""
+    chart = session.exec(
+        select(Chart)
+        .where(Chart.cache_key == key, Chart.dataset_id == dataset_id)
+        .order_by(Chart.created_at.desc(), Chart.id.desc())
+    ).first()
+    if chart and (DATA_DIR / chart.image_path).exists():
+        return chart
+    return None
+
+
+def _lookup_chart(session: Session, dataset_id: int, chart_request: ChartCreateRequest):
+    """Kontroller ve önbellek araması: (dataset, anahtar, önbellekteki grafik)"""
+    dataset = session.get(Dataset, dataset_id)
+    if not dataset:
+        raise HTTPException(status_code=404, detail="Dataset not found")
+    
+    # Kolon kontrolü (import sırasında kaydedilen kolon bilgisinden)
+    if chart_request.x_column not in dataset.columns_json:
         raise HTTPException(status_code=422, detail=f"Column '{chart_request.x_column}' not found")
-    if chart_request.y_column not in df.columns:
+    if chart_request.y_column not in dataset.columns_json:
         raise HTTPException(status_code=422, detail=f"Column '{chart_request.y_column}' not found")
-    
-    # Grafik oluştur
-    plt.figure(figsize=(10, 6))
-    
-    if chart_request.chart_type == "line":
-        plt.plot(df[chart_request.x_column], df[chart_request.y_column], marker='o')
-    elif chart_request.chart_type == "scatter":
-        plt.scatter(df[chart_request.x_column], df[chart_request.y_column])
-    elif chart_request.chart_type == "bar":
-        plt.bar(df[chart_request.x_column], df[chart_request.y_column])
-    elif chart_request.chart_type == "histogram":
-        plt.hist(df[chart_request.y_column], bins=30)
-    else:
+    if chart_request.chart_type not in CHART_TYPES:
         raise HTTPException(status_code=422, detail="Invalid chart type")
     
-    plt.xlabel(chart_request.x_column)
-    plt.ylabel(chart_request.y_column)
-    plt.title(chart_request.title or f"{chart_request.y_column} vs {chart_request.x_column}")
-    plt.grid(True, alpha=0.3)
-    plt.tight_layout()
-    
-    # Grafiği kaydet
-    now = datetime.utcnow()
-    year_dir = CHART_DIR / str(now.year)
-    month_dir = year_dir / f"{now.month:02d}"
-    month_dir.mkdir(parents=True, exist_ok=True)
-    
-    timestamp = now.strftime("%Y%m%d_%H%M%S")
-    chart_filename = f"chart_{dataset_id}_{timestamp}.png"
-    chart_path = month_dir / chart_filename
+    key = cache_key(
+        dataset, chart_request.chart_type, chart_request.x_column, chart_request.y_column,
+        chart_request.title, chart_request.config_json,
+    )
+    return dataset, key, _cached_chart(session, dataset_id, key)
+
+
+def _chart_data(session: Session, dataset: Dataset, chart_request: ChartCreateRequest):
+    """Çizilecek kolonları oku ve azalt: (DataFrame, orijinal nokta sayısı)"""
+    # Yalnızca gereken kolonları oku
+    columns = list(dict.fromkeys([chart_request.x_column, chart_request.y_column]))
+    try:
+        df = load_dataset(dataset, columns=columns)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Read error: {str(e)}")
+    finally:
+        # Çizim sürerken bağlantı tutulmasın
+        session.rollback()
     
-    plt.savefig(chart_path, dpi=150, bbox_inches='tight')
-    plt.close()
+    # Büyük serilerde çizilecek noktaları azalt
+    point_count = len(df)
+    try:
+        df = downsample(
+            df, chart_request.x_column, chart_request.y_column,
+            chart_request.chart_type, chart_request.config_json,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return df, point_count
+
+
+def _record_chart(
+    session: Session,
+    dataset_id: int,
+    chart_request: ChartCreateRequest,
+    key: str,
+    chart_path: Path,
+    file_size: int,
+    point_count: int,
+    rendered_point_count: int,
+    user_id: int,
+) -> Chart:
+    """Çizilen grafiği kaydet (bu arada aynısı kaydedildiyse onu döndür)"""
+    cached = _cached_chart(session, dataset_id, key)
+    if cached:
+        chart_path.unlink(missing_ok=True)
+        return cached
     
     # Veritabanına kaydet
     relative_path = str(chart_path.relative_to(DATA_DIR))
@@ -267,30 +418,75 @@ async def create_chart(
         y_column=chart_request.y_column,
         title=chart_request.title,
         image_path=relative_path,
+        file_size=file_size,
+        point_count=point_count,
+        rendered_point_count=rendered_point_count,
+        cache_key=key,
         config_json=chart_request.config_json,
     )
     
     session.add(db_chart)
-    session.commit()
-    session.refresh(db_chart)
-    
-    # Audit log
-    audit = AuditLog(
-        entity="chart",
-        entity_id=db_chart.id,
-        who=user_id,
-        action="create",
-    )
-    session.add(audit)
+    session.flush()
+    
+    # Audit log (aynı transaction)
+    record_audit(session, "chart", db_chart.id, user_id, "create")
     session.commit()
     
     return db_chart
 
 
+@router.post("/{dataset_id}/chart", response_model=ChartRead, status_code=201)
+async def create_chart(
+    dataset_id: int,
+    chart_request: ChartCreateRequest,
+    response: Response,
+    user_id: int = Query(..., description="İşlemi yapan kullanıcı ID"),
+    session: Session = Depends(get_session),
+):
+    """Dataset'ten grafik üret
+
+    Aynı dataset içeriği ve ayarlarla çizilmiş grafik varsa yeniden
+    çizilmeden 200 ile döner. Çizim süreç havuzunda yapılır.
+    """
+    dataset, key, cached = await run_in_threadpool(
+        _lookup_chart, session, dataset_id, chart_request
+    )
+    if cached:
+        response.status_code = 200
+        return cached
+    
+    df, point_count = await run_in_threadpool(_chart_data, session, dataset, chart_request)
+    
+    # Grafiği çiz ve kaydet
+    now = datetime.utcnow()
+    timestamp = now.strftime("%Y%m%d_%H%M%S")
+    chart_name = f"chart_{dataset_id}_{timestamp}_{key[:12]}.png"
+    chart_path = CHART_DIR / str(now.year) / f"{now.month:02d}" / chart_name
+    try:
+        file_size = await render_async(
+            chart_request.chart_type,
+            df[chart_request.x_column],
+            df[chart_request.y_column],
+            chart_request.x_column,
+            chart_request.y_column,
+            chart_request.title or f"{chart_request.y_column} vs {chart_request.x_column}",
+            str(chart_path),
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Render error: {str(e)}")
+    
+    return await run_in_threadpool(
+        _record_chart, session, dataset_id, chart_request, key,
+        chart_path, file_size, point_count, len(df), user_id,
+    )
+
+
 @router.get("/charts/", response_model=List[ChartRead])
-async def list_charts(
+def list_charts(
     dataset_id: Optional[int] = Query(None),
     limit: int = Query(50, le=200),
+    cursor: Optional[str] = Query(None, description="Önceki yanıttaki X-Next-Cursor"),
+    response: Response = None,
     session: Session = Depends(get_session),
 ):
     """Grafikleri listele"""
@@ -299,7 +495,4 @@ async def list_charts(
     if dataset_id:
         statement = statement.where(Chart.dataset_id == dataset_id)
     
-    statement = statement.order_by(Chart.created_at.desc()).limit(limit)
-    charts = session.exec(statement).all()
-    
-    return charts
+    return paginate(session, statement, response, Chart.created_at, Chart.id, limit, cursor=cursor)
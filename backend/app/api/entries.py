@@ -3,42 +3,39 @@ Entries API endpoints
 """
 from typing import List, Optional
 from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlmodel import Session, select
 
+from app.audit import record_audit
 from app.database import get_session
-from app.models import Entry, AuditLog
+from app.models import Entry
 from app.schemas import EntryCreate, EntryUpdate, EntryRead
+from app.tags import tag_filter
+from app.pagination import paginate
+from app.versioning import hydrate_bodies, lineage_root, store_previous_version
 
 router = APIRouter()
 
 
 @router.post("/", response_model=EntryRead, status_code=201)
-async def create_entry(
+def create_entry(
     entry: EntryCreate,
     session: Session = Depends(get_session),
 ):
     """Yeni entry oluştur"""
     db_entry = Entry(**entry.model_dump())
     session.add(db_entry)
-    session.commit()
-    session.refresh(db_entry)
-    
-    # Audit log
-    audit = AuditLog(
-        entity="entry",
-        entity_id=db_entry.id,
-        who=entry.author_id,
-        action="create",
-    )
-    session.add(audit)
+    session.flush()
+    
+    # Audit log (aynı transaction)
+    record_audit(session, "entry", db_entry.id, entry.author_id, "create")
     session.commit()
     
     return db_entry
 
 
 @router.patch("/{entry_id}", response_model=EntryRead)
-async def update_entry(
+def update_entry(
     entry_id: int,
     entry_update: EntryUpdate,
     session: Session = Depends(get_session),
@@ -48,6 +45,11 @@ async def update_entry(
     old_entry = session.get(Entry, entry_id)
     if not old_entry:
         raise HTTPException(status_code=404, detail="Entry not found")
+    if not old_entry.is_head:
+        raise HTTPException(
+            status_code=409,
+            detail="Sadece en güncel versiyon güncellenebilir"
+        )
     
     # Yeni versiyon oluştur
     new_entry_data = old_entry.model_dump()
@@ -60,40 +62,43 @@ async def update_entry(
     update_data = entry_update.model_dump(exclude_unset=True)
     new_entry_data.update(update_data)
     
-    # Yeni entry kaydet
+    # Yeni entry kaydet, eski versiyon aynı transaction'da head olmaktan çıkar
+    # ve yeni versiyona göre delta olarak saklanır
     db_entry = Entry(**new_entry_data)
+    store_previous_version(old_entry, db_entry.body_md)
+    old_entry.is_head = False
+    session.add(old_entry)
     session.add(db_entry)
-    session.commit()
-    session.refresh(db_entry)
-    
-    # Audit log
-    audit = AuditLog(
-        entity="entry",
-        entity_id=db_entry.id,
-        who=old_entry.author_id,
-        action="update",
-        diff_json=update_data,
-    )
-    session.add(audit)
+    session.flush()
+    
+    # Audit log (aynı transaction)
+    record_audit(session, "entry", db_entry.id, old_entry.author_id, "update", update_data)
     session.commit()
     
     return db_entry
 
 
 @router.get("/", response_model=List[EntryRead])
-async def list_entries(
+def list_entries(
     experiment_id: Optional[int] = Query(None),
     author_id: Optional[int] = Query(None),
     tag: Optional[str] = Query(None),
     date_from: Optional[datetime] = Query(None),
     date_to: Optional[datetime] = Query(None),
+    include_history: bool = Query(False, description="Eski versiyonları da getir"),
     limit: int = Query(50, le=200),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Önceki yanıttaki X-Next-Cursor"),
+    estimate: bool = Query(False, description="X-Total-Estimate başlığını hesapla"),
+    response: Response = None,
     session: Session = Depends(get_session),
 ):
-    """Entry'leri listele"""
+    """Entry'leri listele (varsayılan: sadece güncel versiyonlar)"""
     statement = select(Entry)
     
+    if not include_history:
+        statement = statement.where(Entry.is_head.is_(True))
+    
     if experiment_id:
         statement = statement.where(Entry.experiment_id == experiment_id)
     
@@ -101,7 +106,7 @@ async def list_entries(
         statement = statement.where(Entry.author_id == author_id)
     
     if tag:
-        statement = statement.where(Entry.tags.contains(tag))
+        statement = statement.where(tag_filter(Entry, [tag]))
     
     if date_from:
         statement = statement.where(Entry.created_at >= date_from)
@@ -109,14 +114,15 @@ async def list_entries(
     if date_to:
         statement = statement.where(Entry.created_at <= date_to)
     
-    statement = statement.order_by(Entry.created_at.desc()).offset(offset).limit(limit)
-    entries = session.exec(statement).all()
-    
-    return entries
+    entries = paginate(
+        session, statement, response, Entry.created_at, Entry.id,
+        limit, offset, cursor, estimate,
+    )
+    return hydrate_bodies(session, entries)
 
 
 @router.get("/{entry_id}", response_model=EntryRead)
-async def get_entry(
+def get_entry(
     entry_id: int,
     session: Session = Depends(get_session),
 ):
@@ -124,24 +130,24 @@ async def get_entry(
     entry = session.get(Entry, entry_id)
     if not entry:
         raise HTTPException(status_code=404, detail="Entry not found")
+    hydrate_bodies(session, [entry])
     return entry
 
 
 @router.get("/{entry_id}/versions", response_model=List[EntryRead])
-async def get_entry_versions(
+def get_entry_versions(
     entry_id: int,
     session: Session = Depends(get_session),
 ):
     """Entry'nin tüm versiyonlarını getir"""
-    # İlk versiyonu bul
     entry = session.get(Entry, entry_id)
     if not entry:
         raise HTTPException(status_code=404, detail="Entry not found")
     
-    # Tüm versiyonları bul
+    # Zincirin tüm versiyonları (root_id indeksi üzerinden tek sorgu)
     statement = select(Entry).where(
-        (Entry.id == entry_id) | (Entry.parent_version_id == entry_id)
+        Entry.root_id == lineage_root(entry)
     ).order_by(Entry.version)
     
     versions = session.exec(statement).all()
-    return versions
+    return hydrate_bodies(session, versions)
@@ -2,18 +2,21 @@
 Experiments API endpoints
 """
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlmodel import Session, select
 
+from app.audit import record_audit
 from app.database import get_session
-from app.models import Experiment, AuditLog
+from app.models import Experiment
 from app.schemas import ExperimentCreate, ExperimentRead
+from app.tags import tag_filter
+from app.pagination import paginate
 
 router = APIRouter()
 
 
 @router.post("/", response_model=ExperimentRead, status_code=201)
-async def create_experiment(
+def create_experiment(
     experiment: ExperimentCreate,
     user_id: int = Query(..., description="İşlemi yapan kullanıcı ID"),
     session: Session = Depends(get_session),
@@ -21,29 +24,25 @@ async def create_experiment(
     """Yeni deney oluştur"""
     db_experiment = Experiment(**experiment.model_dump())
     session.add(db_experiment)
-    session.commit()
-    session.refresh(db_experiment)
+    session.flush()
     
-    # Audit log
-    audit = AuditLog(
-        entity="experiment",
-        entity_id=db_experiment.id,
-        who=user_id,
-        action="create",
-    )
-    session.add(audit)
+    # Audit log (aynı transaction)
+    record_audit(session, "experiment", db_experiment.id, user_id, "create")
     session.commit()
     
     return db_experiment
 
 
 @router.get("/", response_model=List[ExperimentRead])
-async def list_experiments(
+def list_experiments(
     project_id: Optional[int] = Query(None),
     tag: Optional[str] = Query(None),
     archived: bool = Query(False),
     limit: int = Query(50, le=200),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Önceki yanıttaki X-Next-Cursor"),
+    estimate: bool = Query(False, description="X-Total-Estimate başlığını hesapla"),
+    response: Response = None,
     session: Session = Depends(get_session),
 ):
     """Deneyleri listele"""
@@ -53,16 +52,16 @@ async def list_experiments(
         statement = statement.where(Experiment.project_id == project_id)
     
     if tag:
-        statement = statement.where(Experiment.tags.contains(tag))
+        statement = statement.where(tag_filter(Experiment, [tag]))
     
-    statement = statement.offset(offset).limit(limit)
-    experiments = session.exec(statement).all()
-    
-    return experiments
+    return paginate(
+        session, statement, response, Experiment.start_ts, Experiment.id,
+        limit, offset, cursor, estimate,
+    )
 
 
 @router.get("/{experiment_id}", response_model=ExperimentRead)
-async def get_experiment(
+def get_experiment(
     experiment_id: int,
     session: Session = Depends(get_session),
 ):
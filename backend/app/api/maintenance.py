@@ -0,0 +1,48 @@
+"""
+Maintenance API - depolama bütünlük denetimi ve çöp toplama
+"""
+from datetime import timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query, Response
+from sqlmodel import Session
+
+from app.database import get_read_session, get_session
+from app.gc import GC_GRACE, collect_garbage
+from app.scrubber import scrubber
+
+router = APIRouter()
+
+
+@router.post("/scrub")
+def start_scrub(
+    response: Response,
+    wait: bool = Query(False, description="Denetim bitene kadar bekle ve raporu döndür"),
+    session: Session = Depends(get_read_session),
+):
+    """Depolama denetimini başlat (varsayılan: arka planda)"""
+    # Denetim salt okunur: kendi kısa oturumlarını okuma havuzunda açar
+    engine = session.get_bind()
+    if wait:
+        return scrubber.run(engine).to_dict()
+    started = scrubber.start(engine)
+    response.status_code = 202
+    return {"started": started, **scrubber.status()}
+
+
+@router.get("/scrub")
+def get_scrub_status():
+    """Denetim durumu ve son rapor"""
+    return scrubber.status()
+
+
+@router.post("/gc")
+def run_gc(
+    grace_hours: Optional[float] = Query(
+        None, ge=0, description="Çöp kutusu bekleme süresi (varsayılan: GC_GRACE_HOURS)",
+    ),
+    session: Session = Depends(get_session),
+):
+    """Çöp toplamayı çalıştır, öncesi/sonrası disk kullanımını döndür"""
+    grace = GC_GRACE if grace_hours is None else timedelta(hours=grace_hours)
+    return collect_garbage(session.get_bind(), grace=grace).to_dict()
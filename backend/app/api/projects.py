@@ -2,47 +2,47 @@
 Projects API endpoints
 """
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlmodel import Session, select
 
+from app.audit import record_audit
 from app.database import get_session
-from app.models import Project, AuditLog
-from app.schemas import ProjectCreate, ProjectRead
+from app.models import Project
+from app.schemas import ProjectCreate, ProjectRead, ProjectQuotaUpdate
+from app.quotas import project_storage
+from app.tags import tag_filter
+from app.pagination import paginate
 
 router = APIRouter()
 
 
 @router.post("/", response_model=ProjectRead, status_code=201)
-async def create_project(
+def create_project(
     project: ProjectCreate,
     session: Session = Depends(get_session),
 ):
     """Yeni proje oluştur"""
     db_project = Project(**project.model_dump())
     session.add(db_project)
-    session.commit()
-    session.refresh(db_project)
+    session.flush()  # ID ataması için, commit etmeden
     
-    # Audit log
-    audit = AuditLog(
-        entity="project",
-        entity_id=db_project.id,
-        who=project.created_by,
-        action="create",
-    )
-    session.add(audit)
+    # Audit log (aynı transaction)
+    record_audit(session, "project", db_project.id, project.created_by, "create")
     session.commit()
     
     return db_project
 
 
 @router.get("/", response_model=List[ProjectRead])
-async def list_projects(
+def list_projects(
     query: Optional[str] = Query(None, description="Proje adında arama"),
     tag: Optional[str] = Query(None, description="Etiket filtresi"),
     archived: bool = Query(False, description="Arşivlenmiş projeleri göster"),
     limit: int = Query(50, le=200),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Önceki yanıttaki X-Next-Cursor"),
+    estimate: bool = Query(False, description="X-Total-Estimate başlığını hesapla"),
+    response: Response = None,
     session: Session = Depends(get_session),
 ):
     """Projeleri listele"""
@@ -52,17 +52,17 @@ async def list_projects(
         statement = statement.where(Project.name.contains(query))
     
     if tag:
-        # JSON içinde etiket arama (SQLite için basit yaklaşım)
-        statement = statement.where(Project.tags.contains(tag))
-    
-    statement = statement.offset(offset).limit(limit)
-    projects = session.exec(statement).all()
+        # Etiket indeksi üzerinden tam eşleşme
+        statement = statement.where(tag_filter(Project, [tag]))
     
-    return projects
+    return paginate(
+        session, statement, response, Project.created_at, Project.id,
+        limit, offset, cursor, estimate,
+    )
 
 
 @router.get("/{project_id}", response_model=ProjectRead)
-async def get_project(
+def get_project(
     project_id: int,
     session: Session = Depends(get_session),
 ):
@@ -73,8 +73,42 @@ async def get_project(
     return project
 
 
+@router.get("/{project_id}/storage")
+def get_project_storage(
+    project_id: int,
+    session: Session = Depends(get_session),
+):
+    """Proje ve deney bazında depolama kullanımı, kota"""
+    project = session.get(Project, project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return project_storage(session, project)
+
+
+@router.put("/{project_id}/quota", response_model=ProjectRead)
+def set_project_quota(
+    project_id: int,
+    quota: ProjectQuotaUpdate,
+    user_id: int = Query(..., description="İşlemi yapan kullanıcı ID"),
+    session: Session = Depends(get_session),
+):
+    """Depolama kotasını ayarla (null: sınırsız)"""
+    project = session.get(Project, project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    project.storage_quota_bytes = quota.storage_quota_bytes
+    session.add(project)
+    record_audit(
+        session, "project", project_id, user_id, "quota",
+        diff_json={"storage_quota_bytes": quota.storage_quota_bytes},
+    )
+    session.commit()
+    return project
+
+
 @router.patch("/{project_id}/archive")
-async def archive_project(
+def archive_project(
     project_id: int,
     user_id: int = Query(..., description="İşlemi yapan kullanıcı ID"),
     session: Session = Depends(get_session),
@@ -88,13 +122,7 @@ async def archive_project(
     session.add(project)
     
     # Audit log
-    audit = AuditLog(
-        entity="project",
-        entity_id=project_id,
-        who=user_id,
-        action="archive",
-    )
-    session.add(audit)
+    record_audit(session, "project", project_id, user_id, "archive")
     session.commit()
     
     return {"status": "archived", "project_id": project_id}
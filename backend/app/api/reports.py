@@ -1,41 +1,65 @@
 """
 Reports API - DOCX/PDF/XLSX üretimi
 """
+import gzip
 import io
+import shutil
 import zipfile
 from datetime import datetime
 from pathlib import Path
-from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import FileResponse, StreamingResponse
 from sqlmodel import Session, select
-import pandas as pd
-from docx import Document
-from docx.shared import Inches, Pt
-from docx.enum.text import WD_ALIGN_PARAGRAPH
 
-from app.database import get_session, DATA_DIR
-from app.models import Entry, Experiment, Project, Attachment, Dataset, Chart, Template
+from app.database import get_read_session, get_session, DATA_DIR
+from app.models import Entry, Experiment, Project, Attachment, Dataset, Chart
 from app.schemas import ReportDOCXRequest, ReportPDFRequest, ReportXLSXRequest
+from app.versioning import hydrate_bodies
+from app.stats import REPORT_DIR, charge_report
+from app.responses import accepts_gzip
+from app.storage import GZIP_LEVEL, iter_stored, open_stored
+from app.api.datasets import load_dataset
+from app.thumbnails import supports_derivatives, ensure_derivative
 
 router = APIRouter()
 
-# Report dizini
-REPORT_DIR = DATA_DIR / "storage" / "reports"
-REPORT_DIR.mkdir(parents=True, exist_ok=True)
+
+def _report_path(filename: str) -> Path:
+    """Rapor dosyası yolu (dizin yoksa oluştur)"""
+    REPORT_DIR.mkdir(parents=True, exist_ok=True)
+    return REPORT_DIR / filename
+
+
+def _file_size(path: Path) -> int:
+    return path.stat().st_size if path.exists() else 0
+
+
+def _record_report(session: Session, entry_id: int, path: Path, previous_size: int):
+    """Yazılan rapor dosyasını projenin depolama defterine işle (üzerine yazıldıysa fark)
+
+    session yazıcı session'ıdır ve yalnızca burada kullanılır: rapor okuma
+    session'ıyla üretilirken yazıcı bağlantısı tutulmaz.
+    """
+    charge_report(session, entry_id, path.stat().st_size - previous_size)
+    session.commit()
 
 
 @router.post("/docx")
-async def generate_docx_report(
+def generate_docx_report(
     request: ReportDOCXRequest,
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
+    write_session: Session = Depends(get_session),
 ):
     """DOCX raporu oluştur"""
+    from docx import Document
+    from docx.shared import Inches
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
     
     # Entry ve ilişkili verileri getir
     entry = session.get(Entry, request.entry_id)
     if not entry:
         raise HTTPException(status_code=404, detail="Entry not found")
+    hydrate_bodies(session, [entry])
     
     experiment = session.get(Experiment, entry.experiment_id)
     project = session.get(Project, experiment.project_id) if experiment else None
@@ -94,7 +118,9 @@ async def generate_docx_report(
     
     # Ekleri listele
     attachments = session.exec(
-        select(Attachment).where(Attachment.entry_id == request.entry_id)
+        select(Attachment).where(
+            Attachment.entry_id == request.entry_id, Attachment.deleted_at.is_(None)
+        )
     ).all()
     
     if attachments:
@@ -106,11 +132,14 @@ async def generate_docx_report(
             if att.caption:
                 doc.add_paragraph(att.caption)
             
-            # Resim ekleri gömülü olarak ekle
-            if att.file_type in ['png', 'jpg', 'jpeg']:
+            # Resim ekleri (ve pdf ilk sayfası) önizleme boyutunda gömülü olarak ekle
+            if supports_derivatives(att.file_type):
                 try:
                     img_path = DATA_DIR / att.file_path
-                    if img_path.exists():
+                    preview = ensure_derivative(img_path, att.file_type, att.sha256, "preview")
+                    if preview is not None:
+                        doc.add_picture(str(preview), width=Inches(5))
+                    elif att.file_type in ['png', 'jpg', 'jpeg'] and img_path.exists():
                         doc.add_picture(str(img_path), width=Inches(5))
                 except Exception as e:
                     doc.add_paragraph(f'[Resim yüklenemedi: {str(e)}]')
@@ -157,9 +186,11 @@ async def generate_docx_report(
     # Kaydet
     timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
     filename = f"report_entry_{request.entry_id}_{timestamp}.docx"
-    file_path = REPORT_DIR / filename
+    file_path = _report_path(filename)
+    previous_size = _file_size(file_path)
     
     doc.save(str(file_path))
+    _record_report(write_session, request.entry_id, file_path, previous_size)
     
     return FileResponse(
         path=file_path,
@@ -169,11 +200,13 @@ async def generate_docx_report(
 
 
 @router.post("/xlsx")
-async def generate_xlsx_report(
+def generate_xlsx_report(
     request: ReportXLSXRequest,
-    session: Session = Depends(get_session),
+    session: Session = Depends(get_read_session),
+    write_session: Session = Depends(get_session),
 ):
     """XLSX raporu oluştur (dataset verilerini içerir)"""
+    import pandas as pd
     
     entry = session.get(Entry, request.entry_id)
     if not entry:
@@ -185,7 +218,8 @@ async def generate_xlsx_report(
     # Excel dosyası oluştur
     timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
     filename = f"report_entry_{request.entry_id}_{timestamp}.xlsx"
-    file_path = REPORT_DIR / filename
+    file_path = _report_path(filename)
+    previous_size = _file_size(file_path)
     
     with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
         # Özet sayfası
@@ -212,16 +246,13 @@ async def generate_xlsx_report(
             sheet_name = f'Dataset_{i}'[:31]  # Excel limit: 31 char
             
             try:
-                file_path_dataset = DATA_DIR / dataset.source_file
-                if dataset.source_file.endswith('.csv'):
-                    df = pd.read_csv(file_path_dataset)
-                else:
-                    df = pd.read_excel(file_path_dataset)
+                df = load_dataset(dataset)
                 
                 df.to_excel(writer, sheet_name=sheet_name, index=False)
             except Exception as e:
                 error_df = pd.DataFrame({'Hata': [f'Dataset yüklenemedi: {str(e)}']})
                 error_df.to_excel(writer, sheet_name=sheet_name, index=False)
+    _record_report(write_session, request.entry_id, file_path, previous_size)
     
     return FileResponse(
         path=file_path,
@@ -231,15 +262,18 @@ async def generate_xlsx_report(
 
 
 @router.post("/pdf")
-async def generate_pdf_report(
+def generate_pdf_report(
     request: ReportPDFRequest,
-    session: Session = Depends(get_session),
+    http_request: Request,
+    session: Session = Depends(get_read_session),
+    write_session: Session = Depends(get_session),
 ):
     """PDF raporu oluştur (basit HTML → PDF)"""
     
     entry = session.get(Entry, request.entry_id)
     if not entry:
         raise HTTPException(status_code=404, detail="Entry not found")
+    hydrate_bodies(session, [entry])
     
     experiment = session.get(Experiment, entry.experiment_id)
     project = session.get(Project, experiment.project_id) if experiment else None
@@ -282,20 +316,29 @@ async def generate_pdf_report(
     # HTML'i PDF'e çevir (basit versiyon - WeasyPrint gerektirmeden)
     timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
     filename = f"report_entry_{request.entry_id}_{timestamp}.html"
-    file_path = REPORT_DIR / filename
+    file_path = _report_path(filename + ".gz")
+    previous_size = _file_size(file_path)
     
-    with open(file_path, 'w', encoding='utf-8') as f:
+    # Diskte gzip'li saklanır
+    with gzip.open(file_path, 'wt', encoding='utf-8', compresslevel=GZIP_LEVEL) as f:
         f.write(html_content)
-    
-    return FileResponse(
-        path=file_path,
-        filename=filename,
-        media_type="text/html"
-    )
+    _record_report(write_session, request.entry_id, file_path, previous_size)
+    
+    headers = {"Vary": "Accept-Encoding"}
+    if accepts_gzip(http_request):
+        headers["Content-Encoding"] = "gzip"
+        return FileResponse(
+            path=file_path,
+            filename=filename,
+            media_type="text/html",
+            headers=headers,
+        )
+    headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return StreamingResponse(iter_stored(file_path), media_type="text/html", headers=headers)
 
 
 @router.get("/export/experiment/{experiment_id}/zip")
-async def export_experiment_zip(
+def export_experiment_zip(
     experiment_id: int,
     session: Session = Depends(get_session),
 ):
@@ -306,9 +349,9 @@ async def export_experiment_zip(
         raise HTTPException(status_code=404, detail="Experiment not found")
     
     # Entry'leri ve eklerini topla
-    entries = session.exec(
+    entries = hydrate_bodies(session, session.exec(
         select(Entry).where(Entry.experiment_id == experiment_id)
-    ).all()
+    ).all())
     
     # Bellek içi ZIP oluştur
     zip_buffer = io.BytesIO()
@@ -331,17 +374,20 @@ Etiketler: {', '.join(entry.tags)}
             
             # Attachments
             attachments = session.exec(
-                select(Attachment).where(Attachment.entry_id == entry.id)
+                select(Attachment).where(
+                    Attachment.entry_id == entry.id, Attachment.deleted_at.is_(None)
+                )
             ).all()
             
             for att in attachments:
                 try:
                     att_path = DATA_DIR / att.file_path
                     if att_path.exists():
-                        zip_file.write(
-                            att_path,
-                            f"{entry_dir}/attachments/{att.original_name}"
-                        )
+                        # gzip'li blob'lar açılarak yazılır
+                        with open_stored(att_path) as src, zip_file.open(
+                            f"{entry_dir}/attachments/{att.original_name}", "w"
+                        ) as dst:
+                            shutil.copyfileobj(src, dst)
                 except Exception:
                     pass
             
@@ -354,10 +400,14 @@ Etiketler: {', '.join(entry.tags)}
                 try:
                     ds_path = DATA_DIR / dataset.source_file
                     if ds_path.exists():
-                        zip_file.write(
-                            ds_path,
-                            f"{entry_dir}/datasets/{dataset.name}{ds_path.suffix}"
-                        )
+                        # .csv.gz → .csv
+                        suffix = ds_path.suffix
+                        if suffix == ".gz":
+                            suffix = ds_path.with_suffix("").suffix
+                        with open_stored(ds_path) as src, zip_file.open(
+                            f"{entry_dir}/datasets/{dataset.name}{suffix}", "w"
+                        ) as dst:
+                            shutil.copyfileobj(src, dst)
                 except Exception:
                     pass
     
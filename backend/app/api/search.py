@@ -3,18 +3,23 @@ Search API - çoklu kriter arama
 """
 from typing import List, Optional
 from datetime import datetime
-from fastapi import APIRouter, Depends, Query
-from sqlmodel import Session, select, or_, and_
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, select
 
 from app.database import get_session
 from app.models import Entry, Experiment, Project
 from app.schemas import EntryRead, ExperimentRead, ProjectRead
+from app.tags import TAG_ENTITIES, tag_filter, tag_counts
+from app.fts import fts_match, search_ranked
+from app.pagination import paginate
+from app.versioning import hydrate_bodies
 
 router = APIRouter()
 
 
 @router.get("/entries", response_model=List[EntryRead])
-async def search_entries(
+def search_entries(
     text: Optional[str] = Query(None, description="Başlık veya içerikte ara"),
     project_id: Optional[int] = Query(None),
     experiment_id: Optional[int] = Query(None),
@@ -22,22 +27,24 @@ async def search_entries(
     author_id: Optional[int] = Query(None),
     date_from: Optional[datetime] = Query(None),
     date_to: Optional[datetime] = Query(None),
+    include_history: bool = Query(False, description="Eski versiyonlarda da ara"),
     limit: int = Query(50, le=200),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Önceki yanıttaki X-Next-Cursor"),
+    estimate: bool = Query(False, description="X-Total-Estimate başlığını hesapla"),
+    response: Response = None,
     session: Session = Depends(get_session),
 ):
     """Entry'lerde arama yap"""
     
     statement = select(Entry)
     
-    # Metin araması (başlık veya içerik)
+    if not include_history:
+        statement = statement.where(Entry.is_head.is_(True))
+    
+    # Metin araması (başlık veya içerik, FTS5 indeksi)
     if text:
-        statement = statement.where(
-            or_(
-                Entry.title.contains(text),
-                Entry.body_md.contains(text)
-            )
-        )
+        statement = statement.where(fts_match(Entry, text, include_history))
     
     # Experiment filtresi
     if experiment_id:
@@ -61,22 +68,24 @@ async def search_entries(
     
     # Tag filtresi
     if tags:
-        tag_list = [t.strip() for t in tags.split(',')]
-        for tag in tag_list:
-            statement = statement.where(Entry.tags.contains(tag))
+        statement = statement.where(tag_filter(Entry, tags.split(',')))
     
-    statement = statement.order_by(Entry.created_at.desc()).offset(offset).limit(limit)
-    entries = session.exec(statement).all()
-    
-    return entries
+    entries = paginate(
+        session, statement, response, Entry.created_at, Entry.id,
+        limit, offset, cursor, estimate,
+    )
+    return hydrate_bodies(session, entries)
 
 
 @router.get("/experiments", response_model=List[ExperimentRead])
-async def search_experiments(
+def search_experiments(
     text: Optional[str] = Query(None, description="Başlık veya açıklamada ara"),
     project_id: Optional[int] = Query(None),
     tags: Optional[str] = Query(None),
     limit: int = Query(50, le=200),
+    cursor: Optional[str] = Query(None, description="Önceki yanıttaki X-Next-Cursor"),
+    estimate: bool = Query(False),
+    response: Response = None,
     session: Session = Depends(get_session),
 ):
     """Deneylerde arama yap"""
@@ -84,32 +93,28 @@ async def search_experiments(
     statement = select(Experiment)
     
     if text:
-        statement = statement.where(
-            or_(
-                Experiment.title.contains(text),
-                Experiment.description.contains(text)
-            )
-        )
+        statement = statement.where(fts_match(Experiment, text))
     
     if project_id:
         statement = statement.where(Experiment.project_id == project_id)
     
     if tags:
-        tag_list = [t.strip() for t in tags.split(',')]
-        for tag in tag_list:
-            statement = statement.where(Experiment.tags.contains(tag))
+        statement = statement.where(tag_filter(Experiment, tags.split(',')))
     
-    statement = statement.order_by(Experiment.start_ts.desc()).limit(limit)
-    experiments = session.exec(statement).all()
-    
-    return experiments
+    return paginate(
+        session, statement, response, Experiment.start_ts, Experiment.id,
+        limit, cursor=cursor, estimate=estimate,
+    )
 
 
 @router.get("/projects", response_model=List[ProjectRead])
-async def search_projects(
+def search_projects(
     text: Optional[str] = Query(None, description="Proje adında ara"),
     tags: Optional[str] = Query(None),
     limit: int = Query(50, le=200),
+    cursor: Optional[str] = Query(None, description="Önceki yanıttaki X-Next-Cursor"),
+    estimate: bool = Query(False),
+    response: Response = None,
     session: Session = Depends(get_session),
 ):
     """Projelerde arama yap"""
@@ -117,65 +122,54 @@ async def search_projects(
     statement = select(Project)
     
     if text:
-        statement = statement.where(
-            or_(
-                Project.name.contains(text),
-                Project.description.contains(text)
-            )
-        )
+        statement = statement.where(fts_match(Project, text))
     
     if tags:
-        tag_list = [t.strip() for t in tags.split(',')]
-        for tag in tag_list:
-            statement = statement.where(Project.tags.contains(tag))
-    
-    statement = statement.order_by(Project.created_at.desc()).limit(limit)
-    projects = session.exec(statement).all()
+        statement = statement.where(tag_filter(Project, tags.split(',')))
     
-    return projects
+    return paginate(
+        session, statement, response, Project.created_at, Project.id,
+        limit, cursor=cursor, estimate=estimate,
+    )
 
 
 @router.get("/all")
-async def search_all(
-    text: str = Query(..., min_length=2, description="Arama metni"),
+def search_all(
+    text: str = Query(..., min_length=2, description="Arama metni (\"ifade\", önek*)"),
     limit: int = Query(20, le=100),
     session: Session = Depends(get_session),
 ):
-    """Tüm entity'lerde arama yap (birleşik sonuç)"""
-    
-    # Projects
-    proj_statement = select(Project).where(
-        or_(
-            Project.name.contains(text),
-            Project.description.contains(text)
-        )
-    ).limit(limit)
-    projects = session.exec(proj_statement).all()
-    
-    # Experiments
-    exp_statement = select(Experiment).where(
-        or_(
-            Experiment.title.contains(text),
-            Experiment.description.contains(text)
+    """Tüm entity'lerde arama yap (BM25 sıralı birleşik sonuç)"""
+    try:
+        hits = search_ranked(session.connection(), text, limit)
+    except OperationalError as e:
+        raise HTTPException(status_code=422, detail=f"Geçersiz arama ifadesi: {e.orig}")
+    
+    # Eski yanıt yapısı: entity tipine göre gruplanmış sonuçlar
+    groups = {"project": "projects", "experiment": "experiments", "entry": "entries"}
+    results = {key: [] for key in groups.values()}
+    for hit in hits:
+        title_key = "name" if hit["type"] == "project" else "title"
+        results[groups[hit["type"]]].append(
+            {"id": hit["id"], title_key: hit["title"], "type": hit["type"]}
         )
-    ).limit(limit)
-    experiments = session.exec(exp_statement).all()
-    
-    # Entries
-    entry_statement = select(Entry).where(
-        or_(
-            Entry.title.contains(text),
-            Entry.body_md.contains(text)
-        )
-    ).limit(limit)
-    entries = session.exec(entry_statement).all()
     
     return {
         "query": text,
-        "results": {
-            "projects": [{"id": p.id, "name": p.name, "type": "project"} for p in projects],
-            "experiments": [{"id": e.id, "title": e.title, "type": "experiment"} for e in experiments],
-            "entries": [{"id": e.id, "title": e.title, "type": "entry"} for e in entries],
-        },
-        "total": len(projects) + len(experiments) + len(entries)
+        "hits": hits,
+        "results": results,
+        "total": len(hits)
     }
+
+
+@router.get("/tags")
+def list_tag_counts(
+    entity: str = Query("entry", description="project, experiment veya entry"),
+    limit: int = Query(100, le=1000),
+    session: Session = Depends(get_session),
+):
+    """Etiket başına kayıt sayısı"""
+    model = TAG_ENTITIES.get(entity)
+    if model is None:
+        raise HTTPException(status_code=422, detail=f"Geçersiz entity: {entity}")
+    return tag_counts(session, model, limit)
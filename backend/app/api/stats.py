@@ -0,0 +1,24 @@
+"""
+Stats API - dashboard istatistikleri
+"""
+from fastapi import APIRouter, Depends
+from sqlmodel import Session
+
+from app.database import get_session
+from app.stats import read_stats, recompute_counters
+
+router = APIRouter()
+
+
+@router.get("/")
+def get_stats(session: Session = Depends(get_session)):
+    """Toplam sayılar, depolama, proje bazlı döküm ve son aktivite"""
+    return read_stats(session)
+
+
+@router.post("/rebuild")
+def rebuild_stats(session: Session = Depends(get_session)):
+    """Sayaçları mevcut verilerden yeniden hesapla"""
+    recompute_counters(session.connection())
+    session.commit()
+    return read_stats(session)
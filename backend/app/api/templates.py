@@ -1,28 +1,38 @@
 """
 Templates API - rapor şablonu yönetimi
 """
-from typing import List
+from datetime import datetime
+from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
+from starlette.concurrency import run_in_threadpool
 from sqlmodel import Session, select
 
 from app.database import get_session, DATA_DIR
+from app.gc import GC_GRACE
 from app.models import Template
-from app.schemas import TemplateRead, TemplateCreate
+from app.schemas import TemplateRead
 
 router = APIRouter()
 
-# Template dizini
+# Template dizini (ilk yüklemede oluşturulur)
 TEMPLATE_DIR = DATA_DIR / "templates"
-TEMPLATE_DIR.mkdir(parents=True, exist_ok=True)
+
+
+def _get_template(session: Session, template_id: int) -> Template:
+    """Şablonu getir; yoksa veya çöp kutusundaysa 404"""
+    template = session.get(Template, template_id)
+    if not template or template.deleted_at is not None:
+        raise HTTPException(status_code=404, detail="Template not found")
+    return template
 
 
 @router.get("/", response_model=List[TemplateRead])
-async def list_templates(
+def list_templates(
     type: str = Query(None, description="Şablon tipi: docx, html, pdf"),
     session: Session = Depends(get_session),
 ):
     """Şablonları listele"""
-    statement = select(Template)
+    statement = select(Template).where(Template.deleted_at.is_(None))
     
     if type:
         statement = statement.where(Template.type == type)
@@ -34,15 +44,12 @@ async def list_templates(
 
 
 @router.get("/{template_id}", response_model=TemplateRead)
-async def get_template(
+def get_template(
     template_id: int,
     session: Session = Depends(get_session),
 ):
     """Şablon detayı"""
-    template = session.get(Template, template_id)
-    if not template:
-        raise HTTPException(status_code=404, detail="Template not found")
-    return template
+    return _get_template(session, template_id)
 
 
 @router.post("/", response_model=TemplateRead, status_code=201)
@@ -58,7 +65,23 @@ async def create_template(
     
     # Dosyayı kaydet
     content = await file.read()
-    file_path = TEMPLATE_DIR / file.filename
+    return await run_in_threadpool(
+        _store_template, session, name, description, type, is_default, file.filename, content
+    )
+
+
+def _store_template(
+    session: Session,
+    name: str,
+    description: Optional[str],
+    type: str,
+    is_default: bool,
+    filename: str,
+    content: bytes,
+) -> Template:
+    """Şablon dosyasını kaydet ve veritabanına ekle"""
+    TEMPLATE_DIR.mkdir(parents=True, exist_ok=True)
+    file_path = TEMPLATE_DIR / filename
     
     with open(file_path, "wb") as f:
         f.write(content)
@@ -91,24 +114,35 @@ async def create_template(
 
 
 @router.delete("/{template_id}")
-async def delete_template(
+def delete_template(
     template_id: int,
     session: Session = Depends(get_session),
 ):
-    """Şablonu sil"""
+    """Şablonu çöp kutusuna taşı (dosya gc tarafından silinir)"""
+    template = _get_template(session, template_id)
+    template.deleted_at = datetime.utcnow()
+    session.add(template)
+    session.commit()
+    
+    return {
+        "status": "deleted",
+        "template_id": template_id,
+        "purge_after": template.deleted_at + GC_GRACE,
+    }
+
+
+@router.post("/{template_id}/restore", response_model=TemplateRead)
+def restore_template(
+    template_id: int,
+    session: Session = Depends(get_session),
+):
+    """Çöp kutusundaki şablonu geri al"""
     template = session.get(Template, template_id)
     if not template:
         raise HTTPException(status_code=404, detail="Template not found")
-    
-    # Dosyayı sil
-    try:
-        file_path = DATA_DIR / template.file_path
-        if file_path.exists():
-            file_path.unlink()
-    except Exception:
-        pass
-    
-    session.delete(template)
+    if template.deleted_at is None:
+        raise HTTPException(status_code=409, detail="Template is not deleted")
+    template.deleted_at = None
+    session.add(template)
     session.commit()
-    
-    return {"status": "deleted", "template_id": template_id}
+    return template
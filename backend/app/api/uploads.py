@@ -0,0 +1,260 @@
+"""
+Uploads API - devam ettirilebilir parçalı yüklemeler
+
+1. POST /api/uploads/ ile oturum aç (dosya adı, toplam boyut, opsiyonel sha256)
+2. PUT /api/uploads/{id}/chunks/{offset} ile parçaları gönder (paralel olabilir)
+3. Kesinti sonrası GET /api/uploads/{id} eksik parçaları listeler
+4. POST /api/uploads/{id}/complete hash'i doğrular ve Attachment oluşturur
+"""
+import uuid
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlmodel import Session, select, delete, func, update
+from starlette.concurrency import run_in_threadpool
+
+from app.blobs import discard_placed, place_blob
+from app.database import get_session, DATA_DIR
+from app.models import Attachment, Entry, UploadChunk, UploadSession
+from app.quotas import check_quota
+from app.schemas import AttachmentRead, UploadSessionCreate, UploadSessionRead
+from app.storage import StagedFile, hash_file, should_compress
+from app.thumbnails import schedule_derivatives
+from app.uploads import (
+    DEFAULT_CHUNK_SIZE, MIN_CHUNK_SIZE, MAX_CHUNK_SIZE, RESUMABLE_MAX_BYTES, INSTRUMENT_EXTENSIONS,
+    chunk_count, create_part_file, discard_session, expected_chunk, missing_ranges,
+    part_path, write_chunk,
+)
+from app.api.attachments import save_attachment, validate_file, get_file_extension
+
+router = APIRouter()
+
+
+def _get_upload(session: Session, upload_id: str) -> UploadSession:
+    upload = session.get(UploadSession, upload_id)
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return upload
+
+
+def _session_read(session: Session, upload: UploadSession) -> UploadSessionRead:
+    received = session.exec(
+        select(UploadChunk.offset, UploadChunk.size).where(UploadChunk.session_id == upload.id)
+    ).all()
+    completed = upload.status == "completed"
+    missing = [] if completed else missing_ranges(upload, [o for o, _ in received])
+    return UploadSessionRead(
+        id=upload.id,
+        entry_id=upload.entry_id,
+        filename=upload.filename,
+        total_size=upload.total_size,
+        chunk_size=upload.chunk_size,
+        status=upload.status,
+        received_bytes=upload.total_size if completed else sum(s for _, s in received),
+        missing=[list(r) for r in missing],
+        attachment_id=upload.attachment_id,
+        created_at=upload.created_at,
+        updated_at=upload.updated_at,
+    )
+
+
+@router.post("/", response_model=UploadSessionRead, status_code=201)
+def create_upload(
+    request: UploadSessionCreate,
+    session: Session = Depends(get_session),
+):
+    """Yükleme oturumu aç"""
+    entry = session.get(Entry, request.entry_id)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Entry not found")
+
+    if get_file_extension(request.filename) not in INSTRUMENT_EXTENSIONS:
+        is_valid, error_msg = validate_file(request.filename)
+        if not is_valid:
+            raise HTTPException(status_code=422, detail=error_msg)
+    if request.total_size > RESUMABLE_MAX_BYTES:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Dosya çok büyük. Maksimum boyut: {RESUMABLE_MAX_BYTES / (1024**3):.1f}GB",
+        )
+    # Parçalar gönderilmeden önce reddet (tamamlarken tekrar kontrol edilir)
+    check_quota(session, entry, request.total_size)
+
+    chunk_size = request.chunk_size or DEFAULT_CHUNK_SIZE
+    if not MIN_CHUNK_SIZE <= chunk_size <= MAX_CHUNK_SIZE:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Parça boyutu {MIN_CHUNK_SIZE}-{MAX_CHUNK_SIZE} byte arasında olmalı",
+        )
+
+    upload = UploadSession(
+        id=uuid.uuid4().hex,
+        entry_id=request.entry_id,
+        filename=request.filename,
+        caption=request.caption,
+        total_size=request.total_size,
+        chunk_size=chunk_size,
+        sha256=request.sha256.lower() if request.sha256 else None,
+    )
+    create_part_file(upload.id, upload.total_size)
+    session.add(upload)
+    session.commit()
+    return _session_read(session, upload)
+
+
+@router.get("/{upload_id}", response_model=UploadSessionRead)
+def get_upload(
+    upload_id: str,
+    session: Session = Depends(get_session),
+):
+    """Oturum durumu ve eksik parçalar"""
+    return _session_read(session, _get_upload(session, upload_id))
+
+
+@router.put("/{upload_id}/chunks/{offset}")
+async def put_chunk(
+    upload_id: str,
+    offset: int,
+    request: Request,
+    session: Session = Depends(get_session),
+):
+    """Ham gövdeyi parça olarak ofsete yaz (tekrar gönderim üzerine yazar)"""
+    upload = await run_in_threadpool(_get_upload, session, upload_id)
+    if upload.status != "open":
+        raise HTTPException(status_code=409, detail="Upload already completed")
+    expected = expected_chunk(upload, offset)
+
+    # Gövde okunurken yazıcı bağlantısını tutma
+    await run_in_threadpool(session.rollback)
+
+    written = await write_chunk(upload_id, offset, expected, request.stream())
+    if written != expected:
+        raise HTTPException(status_code=422, detail=f"Eksik parça: {written}/{expected} byte")
+
+    await run_in_threadpool(_record_chunk, session, upload_id, offset, written)
+    return {"upload_id": upload_id, "offset": offset, "size": written}
+
+
+def _record_chunk(session: Session, upload_id: str, offset: int, size: int):
+    upload = _get_upload(session, upload_id)
+    session.merge(UploadChunk(session_id=upload_id, offset=offset, size=size))
+    upload.updated_at = datetime.utcnow()
+    session.add(upload)
+    session.commit()
+
+
+def _completed_attachment(session: Session, upload: UploadSession) -> Attachment:
+    """Tamamlanmış oturumun attachment'ı; başka bir çağrı hâlâ tamamlıyorsa 409"""
+    if upload.status == "completed":
+        return session.get(Attachment, upload.attachment_id)
+    raise HTTPException(status_code=409, detail="Yükleme şu anda tamamlanıyor")
+
+
+def _release_completion(session: Session, upload_id: str):
+    """Başarısız tamamlamada oturumu yeniden açık duruma getir"""
+    session.rollback()
+    session.exec(
+        update(UploadSession)
+        .where(UploadSession.id == upload_id, UploadSession.status == "completing")
+        .values(status="open")
+    )
+    session.commit()
+
+
+@router.post("/{upload_id}/complete", response_model=AttachmentRead, status_code=201)
+def complete_upload(
+    upload_id: str,
+    session: Session = Depends(get_session),
+):
+    """Tüm parçalar geldiyse hash'i doğrula ve Attachment oluştur
+
+    Oturum önce "completing" durumuna alınır (koşullu UPDATE); eşzamanlı
+    ikinci çağrı 409 alır, tamamlandıktan sonraki tekrar çağrı mevcut
+    attachment'ı döndürür.
+    """
+    upload = _get_upload(session, upload_id)
+    if upload.status != "open":
+        return _completed_attachment(session, upload)
+
+    count, received = session.exec(
+        select(func.count(), func.coalesce(func.sum(UploadChunk.size), 0))
+        .where(UploadChunk.session_id == upload_id)
+    ).one()
+    if count != chunk_count(upload) or received != upload.total_size:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Eksik parçalar var: {received}/{upload.total_size} byte alındı",
+        )
+    expected_hash, total_size, filename = upload.sha256, upload.total_size, upload.filename
+
+    # Tamamlamayı üstlen: yalnızca bir çağrı "open" → "completing" geçişini yapar
+    claimed = session.exec(
+        update(UploadSession)
+        .where(UploadSession.id == upload_id, UploadSession.status == "open")
+        .values(status="completing", updated_at=datetime.utcnow())
+    ).rowcount
+    session.commit()
+    if not claimed:
+        return _completed_attachment(session, _get_upload(session, upload_id))
+
+    try:
+        # Büyük dosyanın hash'i hesaplanırken ve sıkıştırılırken yazıcı bağlantısını tutma
+        file_hash = hash_file(part_path(upload_id))
+
+        if expected_hash and file_hash != expected_hash:
+            # Hangi parçanın bozuk olduğu bilinmiyor: tüm parçalar yeniden gönderilmeli
+            session.exec(delete(UploadChunk).where(UploadChunk.session_id == upload_id))
+            session.commit()
+            raise HTTPException(
+                status_code=422,
+                detail="Hash uyuşmuyor; parçalar yeniden gönderilmeli",
+            )
+
+        staged = StagedFile(path=part_path(upload_id), size=total_size, sha256=file_hash)
+        placed = place_blob(staged, should_compress(get_file_extension(filename)))
+
+        upload = _get_upload(session, upload_id)
+        entry = session.get(Entry, upload.entry_id)
+        if not entry:
+            discard_placed(session, placed)
+            raise HTTPException(status_code=404, detail="Entry not found")
+
+        def finish(attachment: Attachment):
+            # Oturum, attachment ile aynı transaction'da kapanır
+            upload.status = "completed"
+            upload.attachment_id = attachment.id
+            upload.updated_at = datetime.utcnow()
+            session.add(upload)
+            session.exec(delete(UploadChunk).where(UploadChunk.session_id == upload_id))
+
+        try:
+            attachment = save_attachment(
+                session, entry, filename, placed, upload.caption, before_commit=finish,
+            )
+        except HTTPException as e:
+            if e.status_code == 409:
+                # Dosya bu entry'de zaten var: oturumun işi kalmadı
+                discard_session(session, upload_id)
+                session.commit()
+            raise
+    except Exception:
+        _release_completion(session, upload_id)
+        raise
+    staged.discard()  # blob zaten varsa kısmi dosya kullanılmadı
+
+    schedule_derivatives(DATA_DIR / attachment.file_path, attachment.file_type, attachment.sha256)
+    return attachment
+
+
+@router.delete("/{upload_id}")
+def abort_upload(
+    upload_id: str,
+    session: Session = Depends(get_session),
+):
+    """Oturumu iptal et ve kısmi dosyayı sil"""
+    upload = _get_upload(session, upload_id)
+    if upload.status != "open":
+        raise HTTPException(status_code=409, detail="Upload already completed")
+    discard_session(session, upload_id)
+    session.commit()
+    return {"status": "aborted", "upload_id": upload_id}
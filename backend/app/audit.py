@@ -0,0 +1,142 @@
+"""
+Audit log yazımı
+
+Varsayılan modda audit kaydı, entity ile aynı transaction içinde yazılır.
+AUDIT_WRITE_BEHIND=1 ile kayıtlar commit sonrası bellekte biriktirilir ve
+boyut ya da süre eşiğinde toplu olarak yazılır.
+"""
+import os
+import threading
+from typing import List, Optional
+
+from sqlalchemy import event
+from sqlmodel import Session
+
+from app.database import engine
+from app.models import AuditLog
+
+AUDIT_WRITE_BEHIND = os.getenv("AUDIT_WRITE_BEHIND", "0") == "1"
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "100"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "2.0"))
+
+# session.info içinde commit bekleyen audit kayıtları
+_PENDING_KEY = "pending_audits"
+
+
+class AuditBuffer:
+    """Audit kayıtlarını biriktirip toplu yazan arabellek"""
+
+    def __init__(self, batch_size: int, flush_interval: float):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._items: List[AuditLog] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, audits: List[AuditLog]):
+        """Kayıtları ekle, boyut eşiği aşıldıysa yazıcı thread'i uyandır
+
+        Yazma commit hook'u içinden yapılmaz: yazıcı bağlantısı o anda
+        hâlâ commit eden session'da olabilir.
+        """
+        with self._lock:
+            self._items.extend(audits)
+            full = len(self._items) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """Biriken kayıtları tek transaction'da yaz
+
+        Yazma başarısız olursa (SQLITE_BUSY, havuz zaman aşımı vb.) kayıtlar
+        sıranın başına geri konur ve bir sonraki flush'ta yeniden denenir.
+        """
+        with self._flush_lock:
+            with self._lock:
+                items, self._items = self._items, []
+            if not items:
+                return 0
+            try:
+                with Session(engine) as session:
+                    session.add_all(items)
+                    session.commit()
+            except Exception as e:
+                print(f"⚠️ {len(items)} audit kaydı yazılamadı, yeniden denenecek: {e}")
+                for item in items:
+                    item.id = None  # geri alınan INSERT'in atadığı id
+                with self._lock:
+                    self._items[:0] = items
+                raise
+            return len(items)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                pass  # flush logladı, kayıtlar sırada bekliyor
+
+    def start(self):
+        """Süre eşiği için arka plan thread'ini başlat"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Thread'i durdur ve kalan kayıtları yaz"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+audit_buffer = AuditBuffer(AUDIT_BATCH_SIZE, AUDIT_FLUSH_INTERVAL)
+
+
+def record_audit(
+    session: Session,
+    entity: str,
+    entity_id: int,
+    who: int,
+    action: str,
+    diff_json: Optional[dict] = None,
+) -> AuditLog:
+    """Audit kaydı oluştur
+
+    Senkron modda kayıt session'a eklenir ve entity ile aynı commit'te
+    yazılır. Write-behind modunda commit başarılı olursa arabelleğe
+    aktarılır, rollback olursa atılır.
+    """
+    audit = AuditLog(
+        entity=entity,
+        entity_id=entity_id,
+        who=who,
+        action=action,
+        diff_json=diff_json,
+    )
+    if AUDIT_WRITE_BEHIND:
+        session.info.setdefault(_PENDING_KEY, []).append(audit)
+    else:
+        session.add(audit)
+    return audit
+
+
+@event.listens_for(Session, "after_commit")
+def _push_pending_audits(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        audit_buffer.add(pending)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _drop_pending_audits(session, previous_transaction):
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,187 @@
+"""
+İçerik adresli blob deposu
+
+Her benzersiz dosya içeriği tam SHA-256 hash'i ile bir kez saklanır:
+storage/blobs/ab/cd/<sha256>. Attachment kayıtları blob'a hash ile
+bağlanır ve blob'un refcount'u bağlı kayıt sayısını tutar. Son referans
+silindiğinde blob satırı aynı transaction'da silinir; dosya ise commit
+sonrasında diskten kaldırılır.
+
+Dosyanın sıkıştırılıp blob yoluna konması (place_blob) transaction
+dışında, iş parçacığında yapılır; yazma transaction'ı (acquire_blob)
+yalnızca satır ekler veya refcount artırır.
+"""
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Tuple
+
+from sqlmodel import Session, select, func
+
+from app.database import DATA_DIR
+from app.models import Attachment, Blob
+from app.storage import StagedFile, store_file
+
+BLOB_DIR = DATA_DIR / "storage" / "blobs"
+
+
+def blob_path(sha256: str) -> Path:
+    """Hash için fan-out dizinli blob yolu"""
+    return BLOB_DIR / sha256[:2] / sha256[2:4] / sha256
+
+
+@dataclass
+class PlacedBlob:
+    """Blob yoluna konmuş (veya orada zaten bulunan) dosya"""
+    staged: StagedFile
+    path: Path
+    stored_size: int
+    encoding: Optional[str]
+    created: bool  # dosyayı bu çağrı yazdı
+
+    @property
+    def sha256(self) -> str:
+        return self.staged.sha256
+
+
+def place_blob(staged: StagedFile, compress: bool = False) -> PlacedBlob:
+    """Geçici dosyayı blob yoluna koy (veritabanı bağlantısı tutulmadan çağrılır)
+
+    Aynı içerik diskte zaten varsa dosyaya dokunulmaz ve geçici dosya
+    kullanılmaz; yoksa dosya taşınır (compress ise gzip'lenerek).
+    """
+    target = blob_path(staged.sha256)
+    for path, encoding in ((target.with_name(target.name + ".gz"), "gzip"), (target, None)):
+        try:
+            return PlacedBlob(staged, path, path.stat().st_size, encoding, False)
+        except FileNotFoundError:
+            continue
+    path, stored_size, encoding = store_file(staged.path, target, compress)
+    return PlacedBlob(staged, path, stored_size, encoding, True)
+
+
+def acquire_blob(session: Session, placed: PlacedBlob) -> Tuple[Blob, bool]:
+    """Yerine konmuş dosya için blob referansı al
+
+    İçerik zaten kayıtlıysa refcount artırılır; yoksa blob satırı eklenir.
+    Dosya place_blob ile bu transaction arasında silindiyse (ör. çöp
+    toplama) geçici dosyadan yeniden konur. (blob, yeni_oluşturuldu)
+    döndürür; commit çağırana aittir.
+    """
+    blob = session.get(Blob, placed.sha256)
+    if blob is not None:
+        blob.refcount += 1
+        session.add(blob)
+        return blob, False
+
+    path, stored_size, encoding = placed.path, placed.stored_size, placed.encoding
+    if not path.exists():
+        path, stored_size, encoding = store_file(
+            placed.staged.path, blob_path(placed.sha256), placed.encoding == "gzip"
+        )
+    blob = Blob(
+        sha256=placed.sha256,
+        file_path=str(path.relative_to(DATA_DIR)),
+        size=placed.staged.size,
+        stored_size=stored_size,
+        encoding=encoding,
+        refcount=1,
+    )
+    session.add(blob)
+    return blob, True
+
+
+def discard_placed(session: Session, placed: PlacedBlob):
+    """Kaydı yazılamayan yüklemenin konduğu dosyayı sil
+
+    Yalnızca dosyayı bu yükleme yazdıysa ve hiçbir blob satırı ona
+    bağlanmadıysa; kontrol yazıcı bağlantısı tutulurken yapılır, böylece
+    aynı içeriği eşzamanlı kaydeden bir yüklemenin dosyası silinmez.
+    """
+    if not placed.created:
+        return
+    try:
+        if session.get(Blob, placed.sha256) is None:
+            placed.path.unlink(missing_ok=True)
+    finally:
+        session.rollback()
+
+
+def release_blob(session: Session, sha256: str) -> Optional[Path]:
+    """Blob referansını bırak
+
+    Son referanssa blob satırı silinir ve commit sonrasında silinecek
+    dosya yolu döner; aksi halde None.
+    """
+    blob = session.get(Blob, sha256)
+    if blob is None:
+        return None
+    blob.refcount -= 1
+    if blob.refcount > 0:
+        session.add(blob)
+        return None
+    session.delete(blob)
+    return DATA_DIR / blob.file_path
+
+
+def storage_usage(session: Session) -> dict:
+    """Mantıksal (attachment başına), benzersiz ve fiziksel (diskte) byte
+
+    Mantıksal byte yalnızca canlı attachment'ları sayar; çöp kutusundakiler
+    (blob'ları gc'ye kadar diskte kalır) trashed_bytes olarak ayrıca raporlanır.
+    """
+    trashed = Attachment.deleted_at.is_not(None)
+    logical, trashed_bytes = session.exec(
+        select(
+            func.coalesce(func.sum(Attachment.file_size).filter(~trashed), 0),
+            func.coalesce(func.sum(Attachment.file_size).filter(trashed), 0),
+        )
+    ).one()
+    unique, physical, blobs = session.exec(
+        select(
+            func.coalesce(func.sum(Blob.size), 0),
+            func.coalesce(func.sum(func.coalesce(Blob.stored_size, Blob.size)), 0),
+            func.count(),
+        )
+    ).one()
+    return {
+        "logical_bytes": logical,
+        "trashed_bytes": trashed_bytes,
+        "unique_bytes": unique,
+        "physical_bytes": physical,
+        "saved_bytes": logical + trashed_bytes - physical,
+        "blob_count": blobs,
+    }
+
+
+def migrate_legacy_attachments(engine) -> int:
+    """Blob'u olmayan eski attachment dosyalarını blob deposuna taşı
+
+    Dosya blob yoluna taşınır, attachment yolları güncellenir ve refcount
+    mevcut referans sayısıyla yazılır. Taşınan blob sayısını döndürür.
+    """
+    with Session(engine) as session:
+        rows = session.exec(
+            select(
+                Attachment.sha256,
+                func.min(Attachment.file_path),
+                func.count(),
+                func.max(Attachment.file_size),
+            )
+            .where(Attachment.sha256.notin_(select(Blob.sha256)))
+            .group_by(Attachment.sha256)
+        ).all()
+        for sha256, legacy_path, refcount, size in rows:
+            target = blob_path(sha256)
+            source = DATA_DIR / legacy_path
+            if not target.exists() and source.exists():
+                target.parent.mkdir(parents=True, exist_ok=True)
+                source.replace(target)
+            relative = str(target.relative_to(DATA_DIR))
+            session.add(Blob(
+                sha256=sha256, file_path=relative, size=size, stored_size=size, refcount=refcount,
+            ))
+            for attachment in session.exec(select(Attachment).where(Attachment.sha256 == sha256)):
+                attachment.file_path = relative
+                session.add(attachment)
+        session.commit()
+        return len(rows)
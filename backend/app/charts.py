@@ -0,0 +1,119 @@
+"""
+Grafik çizimi ve çizim önbelleği
+
+Grafikler matplotlib'in nesne tabanlı Figure API'si ile (pyplot'un global
+durumu kullanılmadan) bir süreç havuzunda çizilir; istek işleyicisi ve
+event loop beklemez, eşzamanlı çizimler birbirini etkilemez.
+
+Her grafiğin önbellek anahtarı dataset içeriğinin hash'i ve grafik
+ayarlarından (tip, kolonlar, başlık, config) hesaplanır. Aynı anahtarlı
+bir grafik ve PNG'si varsa yeniden çizilmez.
+"""
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.database import DATA_DIR
+from app.models import Dataset
+
+CHART_DIR = DATA_DIR / "storage" / "charts"
+CHART_TYPES = ("line", "scatter", "bar", "histogram")
+
+# 0: grafikler istek iş parçacığında çizilir (havuz yok)
+CHART_WORKERS = int(os.getenv("CHART_WORKERS", "2"))
+# Çizim kodu değişince artırılır: eski önbellek kayıtları kullanılmaz
+RENDER_VERSION = 1
+
+# Yoğun çizgi grafiklerinde işaretçiler çizgiyi kapatır
+MARKER_MAX_POINTS = 200
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def cache_key(
+    dataset: Dataset,
+    chart_type: str,
+    x_column: str,
+    y_column: str,
+    title: Optional[str],
+    config: Optional[dict],
+) -> str:
+    """Grafiğin içerik anahtarı (sha256)"""
+    # Hash'i olmayan eski dataset'ler: kaynak dosyası değişmez, yolu yeterli
+    content = dataset.sha256 or f"{dataset.id}:{dataset.source_file}"
+    spec = {
+        "version": RENDER_VERSION,
+        "dataset": content,
+        "type": chart_type,
+        "x": x_column,
+        "y": y_column,
+        "title": title,
+        "config": config or {},
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def render_chart(chart_type: str, x, y, x_label: str, y_label: str, title: str, target: str) -> int:
+    """Grafiği PNG olarak çiz (süreç havuzunda çalışır), dosya boyutunu döndür"""
+    from matplotlib.figure import Figure
+
+    figure = Figure(figsize=(10, 6))
+    axes = figure.subplots()
+    if chart_type == "line":
+        axes.plot(x, y, marker='o' if len(y) <= MARKER_MAX_POINTS else None)
+    elif chart_type == "scatter":
+        axes.scatter(x, y)
+    elif chart_type == "bar":
+        axes.bar(x, y)
+    elif chart_type == "histogram":
+        axes.hist(y, bins=30)
+    else:
+        raise ValueError(f"Invalid chart type: {chart_type}")
+
+    axes.set_xlabel(x_label)
+    axes.set_ylabel(y_label)
+    axes.set_title(title)
+    axes.grid(True, alpha=0.3)
+    figure.tight_layout()
+
+    target_path = Path(target)
+    target_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=target_path.parent, suffix=".part")
+    with os.fdopen(fd, "wb") as out:
+        figure.savefig(out, format="png", dpi=150, bbox_inches='tight')
+    os.replace(tmp, target_path)
+    return target_path.stat().st_size
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: çok iş parçacıklı sunucudan fork güvenli değil
+        _pool = ProcessPoolExecutor(
+            max_workers=CHART_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+async def render_async(*args) -> int:
+    """render_chart'ı havuzda (CHART_WORKERS=0 ise iş parçacığında) çalıştır ve bekle"""
+    if CHART_WORKERS <= 0:
+        return await run_in_threadpool(render_chart, *args)
+    return await asyncio.wrap_future(_get_pool().submit(render_chart, *args))
+
+
+def shutdown_render_pool():
+    """Süreç havuzunu kapat"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
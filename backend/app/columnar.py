@@ -0,0 +1,419 @@
+"""
+Dataset'lerin kolon bazlı önbelleği
+
+İçe aktarılan her dataset için tipli bir kopya yazılır:
+storage/columnar/<dizin>/ altında her kolon ayrı bir .npy dosyası ve
+kolon adları/tiplerini tutan manifest.json. Okumada .npy dosyaları
+memory-map ile açılır ve yalnızca istenen kolonlar (istenirse ilk N
+satır) yüklenir; CSV/XLSX yeniden parse edilmez.
+
+Metin kolonları sözlük kodlanır: int32 kodlar .npy'de (-1: boş değer),
+kategoriler ayrı ofset/byte .npy dosyalarında tutulur. Farklı değer
+sayısı CATEGORY_LIMIT'i aşan kolonlar düz metin olarak (satır ofsetleri +
+UTF-8 byte'lar + boş değer maskesi) yazılır; manifest küçük kalır. Yazma parça parça yapılabilir
+(ColumnarWriter); bellekte yalnızca o anki parça tutulur. Orijinal
+kaynak dosya indirme için olduğu gibi saklanır.
+"""
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.database import DATA_DIR
+
+COLUMNAR_DIR = DATA_DIR / "storage" / "columnar"
+MANIFEST_NAME = "manifest.json"
+FORMAT_VERSION = 2
+# Bellekte tutulan çözülmüş manifest sayısı
+MANIFEST_CACHE_SIZE = int(os.getenv("COLUMNAR_MANIFEST_CACHE", "256"))
+
+
+# Kolon tipleri: ana dosyanın dtype'ı ve manifest'teki tür
+_KINDS = {
+    "int": ("int64", "numeric"),
+    "float": ("float64", "numeric"),
+    "bool": ("bool", "numeric"),
+    "datetime": ("datetime64[ns]", "datetime"),
+    "category": ("int32", "category"),
+    "string": ("int64", "string"),  # satır ofsetleri
+}
+
+# Sözlük kodlamada en fazla farklı değer; aşılırsa kolon düz metin (string) olur
+CATEGORY_LIMIT = int(os.getenv("COLUMNAR_CATEGORY_LIMIT", "65536"))
+
+# Tip dönüşümünde okunan blok (eleman sayısı)
+_CONVERT_BLOCK = 1 << 20
+
+
+def _kind_of(series) -> str:
+    kind = series.dtype.kind
+    if kind in "iu":
+        return "int"
+    if kind == "f":
+        return "float"
+    if kind == "b":
+        return "bool"
+    if kind == "M" and getattr(series.dtype, "tz", None) is None:
+        return "datetime"
+    return "category"
+
+
+def _merge_kinds(current: str, new: str) -> str:
+    """Parçalar arasında tip değişirse ortak tip (string son duraktır)"""
+    if current == new or current == "string":
+        return current
+    if {current, new} == {"int", "float"}:
+        return "float"
+    return "category"
+
+
+def _encode_strings(values):
+    """Metinleri UTF-8 olarak birleştir: (uzunluklar, byte'lar)"""
+    import numpy as np
+
+    encoded = [value.encode("utf-8") for value in values]
+    lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+    return lengths, b"".join(encoded)
+
+
+class _RawArray:
+    """Tek .npy dosyasının gövdesi; eklendikçe ham dosyaya yazılır, finish'te başlık eklenir"""
+
+    def __init__(self, path: Path, dtype: str):
+        import numpy as np
+
+        self.path = path
+        self.raw = path.with_suffix(".raw")
+        self.dtype = np.dtype(dtype)
+        self.length = 0
+        self._out = open(self.raw, "wb")
+
+    def append(self, array):
+        import numpy as np
+
+        self._out.write(np.ascontiguousarray(array, dtype=self.dtype).tobytes())
+        self.length += len(array)
+
+    def finish(self):
+        import numpy as np
+
+        self._out.close()
+        with open(self.path, "wb") as out:
+            np.lib.format.write_array_header_1_0(out, {
+                "descr": np.lib.format.dtype_to_descr(self.dtype),
+                "fortran_order": False,
+                "shape": (self.length,),
+            })
+            with open(self.raw, "rb") as raw:
+                shutil.copyfileobj(raw, out, 1024 * 1024)
+        self.raw.unlink()
+
+    def close(self):
+        self._out.close()
+
+
+class _ColumnWriter:
+    """Tek kolonun dosyaları; parçalar eklendikçe yazılır
+
+    Sonraki bir parça tipi değiştirirse (ör. int → float, sayı → metin)
+    yazılmış veri blok blok yeni tipe dönüştürülür. Sözlük CATEGORY_LIMIT
+    farklı değeri aşarsa kolon string türüne (ofsetler + UTF-8 byte'lar +
+    boş değer maskesi) geçer; bellekte tutulan sözlük bu sınırla kalır.
+    """
+
+    def __init__(self, directory: Path, index: int, name: str):
+        self.directory = directory
+        self.index = index
+        self.name = name
+        self.kind: Optional[str] = None
+        self.source_dtype = ""
+        self.length = 0
+        self.categories: Dict[str, int] = {}
+        self._arrays: Dict[str, _RawArray] = {}
+        self._data_size = 0
+
+    def _path(self, suffix: str = "") -> Path:
+        return self.directory / f"{self.index}{suffix}.npy"
+
+    def _open(self):
+        import numpy as np
+
+        self._arrays = {"file": _RawArray(self._path(), _KINDS[self.kind][0])}
+        if self.kind == "string":
+            self._arrays["data"] = _RawArray(self._path(".data"), "uint8")
+            self._arrays["nulls"] = _RawArray(self._path(".nulls"), "bool")
+            self._arrays["file"].append(np.zeros(1, dtype=np.int64))  # ilk ofset
+            self._data_size = 0
+
+    def append(self, series):
+        kind = _kind_of(series)
+        if self.kind is None:
+            self.kind = kind
+            self.source_dtype = str(series.dtype)
+            self._open()
+        elif _merge_kinds(self.kind, kind) != self.kind:
+            self._convert(_merge_kinds(self.kind, kind))
+        if self.kind == "category" and self._overflows(series):
+            self._convert("string")
+        self._write(series)
+        self.length += len(series)
+
+    def _overflows(self, series) -> bool:
+        """Parçanın yeni değerleriyle sözlük sınırı aşılıyor mu?"""
+        values = series.dropna().astype(str).unique()
+        new = sum(1 for value in values if value not in self.categories)
+        return len(self.categories) + new > CATEGORY_LIMIT
+
+    def _write(self, series):
+        import numpy as np
+
+        if self.kind == "category":
+            mask = series.notna().to_numpy()
+            values = series[mask].astype(str)
+            for value in values.unique():
+                self.categories.setdefault(value, len(self.categories))
+            codes = np.full(len(series), -1, dtype=np.int32)
+            codes[mask] = values.map(self.categories).to_numpy(dtype=np.int32)
+            self._arrays["file"].append(codes)
+        elif self.kind == "string":
+            mask = series.notna().to_numpy()
+            text = series.astype(str).where(mask, "")
+            lengths, data = _encode_strings(text)
+            offsets = self._data_size + np.cumsum(lengths)
+            if len(offsets):
+                self._data_size = int(offsets[-1])
+            self._arrays["file"].append(offsets)
+            self._arrays["data"].append(np.frombuffer(data, dtype=np.uint8))
+            self._arrays["nulls"].append(~mask)
+        else:
+            self._arrays["file"].append(series.to_numpy(dtype=_KINDS[self.kind][0]))
+
+    def _convert(self, kind: str):
+        """Yazılmış veriyi yeni tipe dönüştür"""
+        import numpy as np
+        import pandas as pd
+
+        old_kind = self.kind
+        old = self._arrays["file"]
+        old.close()
+        old_path = old.raw.with_suffix(".old")
+        os.replace(old.raw, old_path)
+        # Kodları çözmek için (sözlük CATEGORY_LIMIT ile sınırlı); -1 → None
+        labels = np.array(list(self.categories) + [None], dtype=object)
+        self.kind = kind
+        self.categories = {}
+        self.source_dtype = "object" if kind in ("category", "string") else _KINDS[kind][0]
+        self._open()
+        if old.length:
+            data = np.memmap(old_path, dtype=old.dtype, mode="r")
+        else:
+            data = np.empty(0, old.dtype)
+        for start in range(0, old.length, _CONVERT_BLOCK):
+            block = np.array(data[start:start + _CONVERT_BLOCK])
+            if old_kind == "category":
+                self._write(pd.Series(labels[block], dtype=object))
+            else:
+                self._write(pd.Series(block))
+        del data
+        old_path.unlink()
+
+    def finish(self) -> dict:
+        """.npy dosyalarını yaz, manifest kaydını döndür"""
+        import numpy as np
+
+        info = {"name": self.name, "kind": _KINDS[self.kind][1], "dtype": self.source_dtype}
+        for key, array in self._arrays.items():
+            array.finish()
+            info[key] = array.path.name
+        if self.kind == "category":
+            # Sözlük manifest'e değil ayrı dosyalara: okuyucu yalnızca gerekenleri çözer
+            lengths, data = _encode_strings(self.categories)
+            offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+            np.save(self._path(".cat_offsets"), offsets)
+            np.save(self._path(".cat_data"), np.frombuffer(data, dtype=np.uint8))
+            info["categories"] = {
+                "offsets": self._path(".cat_offsets").name,
+                "data": self._path(".cat_data").name,
+                "count": len(self.categories),
+            }
+        return info
+
+    def close(self):
+        for array in self._arrays.values():
+            array.close()
+
+
+class ColumnarWriter:
+    """DataFrame parçalarını kolon dosyalarına ekleyerek yazar
+
+    Dosyalar geçici dizine yazılır; close() manifest'i yazar ve dizini
+    yerine taşır. Hata durumunda abort() geçici dizini siler.
+    """
+
+    def __init__(self, root: Path = COLUMNAR_DIR):
+        root.mkdir(parents=True, exist_ok=True)
+        self.root = root
+        self.tmp = Path(tempfile.mkdtemp(dir=root, suffix=".part"))
+        self.columns: Optional[List[_ColumnWriter]] = None
+        self.row_count = 0
+
+    def append(self, df):
+        if self.columns is None:
+            self.columns = [
+                _ColumnWriter(self.tmp, i, str(name)) for i, name in enumerate(df.columns)
+            ]
+        elif [c.name for c in self.columns] != [str(name) for name in df.columns]:
+            raise ValueError("Parçaların kolonları farklı")
+        for i, column in enumerate(self.columns):
+            column.append(df.iloc[:, i])
+        self.row_count += len(df)
+
+    def close(self) -> Path:
+        manifest = {
+            "version": FORMAT_VERSION,
+            "row_count": self.row_count,
+            "columns": [column.finish() for column in self.columns or []],
+        }
+        (self.tmp / MANIFEST_NAME).write_text(
+            json.dumps(manifest, ensure_ascii=False), encoding="utf-8"
+        )
+        target = self.root / uuid.uuid4().hex
+        os.replace(self.tmp, target)
+        return target
+
+    def abort(self):
+        for column in self.columns or []:
+            column.close()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+
+def write_columnar(df, root: Path = COLUMNAR_DIR) -> Path:
+    """Tek DataFrame'i kolon dosyaları olarak yaz, dizin yolunu döndür"""
+    writer = ColumnarWriter(root)
+    try:
+        writer.append(df)
+        return writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+
+
+def read_manifest(directory: Path) -> dict:
+    return json.loads((directory / MANIFEST_NAME).read_text(encoding="utf-8"))
+
+
+def directory_size(directory: Path) -> int:
+    """Kolon dosyalarının diskteki toplam boyutu"""
+    return sum(path.stat().st_size for path in directory.iterdir() if path.is_file())
+
+
+def _decode_strings(offsets, data) -> List[str]:
+    """Ofsetler (n+1) ve UTF-8 byte'lardan metin listesi"""
+    import numpy as np
+
+    offsets = np.asarray(offsets) - offsets[0]
+    raw = bytes(data)
+    return [raw[start:end].decode("utf-8") for start, end in zip(offsets[:-1], offsets[1:])]
+
+
+def column_categories(directory: Path, info: dict) -> List[str]:
+    """Kategori kolonunun sözlüğü (format 1: manifest'teki liste)"""
+    import numpy as np
+
+    categories = info["categories"]
+    if isinstance(categories, list):
+        return categories
+    offsets = np.load(directory / categories["offsets"], mmap_mode="r", allow_pickle=False)
+    data = np.load(directory / categories["data"], mmap_mode="r", allow_pickle=False)
+    return _decode_strings(offsets, data[offsets[0]:offsets[-1]])
+
+
+def _window_categories(directory: Path, info: dict, codes):
+    """Penceredeki kodlar için (yeni kodlar, kategoriler); yalnızca kullanılan değerler çözülür"""
+    import numpy as np
+
+    used = np.unique(codes[codes >= 0])
+    remapped = np.where(codes >= 0, np.searchsorted(used, codes), -1).astype(np.int32)
+    categories = info["categories"]
+    if isinstance(categories, list):
+        return remapped, [categories[code] for code in used]
+    offsets = np.load(directory / categories["offsets"], mmap_mode="r", allow_pickle=False)
+    data = np.load(directory / categories["data"], mmap_mode="r", allow_pickle=False)
+    values = [
+        bytes(data[offsets[code]:offsets[code + 1]]).decode("utf-8") for code in used
+    ]
+    return remapped, values
+
+
+@lru_cache(maxsize=MANIFEST_CACHE_SIZE)
+def _column_index(directory: Path) -> Tuple[List[str], Dict[str, dict]]:
+    """Kolon sırası ve ada göre kolon kayıtları (dizinler değişmez, önbelleklenir)"""
+    manifest = read_manifest(directory)
+    return (
+        [column["name"] for column in manifest["columns"]],
+        {column["name"]: column for column in manifest["columns"]},
+    )
+
+
+def _read_strings(directory: Path, info: dict, offset: int, nrows: Optional[int]):
+    """string kolonunun [offset, offset + nrows) penceresi; yalnızca o byte aralığı okunur"""
+    import numpy as np
+
+    offsets = np.load(directory / info["file"], mmap_mode="r", allow_pickle=False)
+    stop = len(offsets) - 1 if nrows is None else min(offset + nrows, len(offsets) - 1)
+    if stop <= offset:
+        return np.empty(0, dtype=object)
+    window = np.array(offsets[offset:stop + 1])
+    data = np.load(directory / info["data"], mmap_mode="r", allow_pickle=False)
+    nulls = np.load(directory / info["nulls"], mmap_mode="r", allow_pickle=False)
+    values = np.array(_decode_strings(window, data[window[0]:window[-1]]), dtype=object)
+    values[np.asarray(nulls[offset:stop])] = None
+    return values
+
+
+def read_columnar(
+    directory: Path,
+    columns: Optional[Sequence[str]] = None,
+    nrows: Optional[int] = None,
+    offset: int = 0,
+):
+    """Kolonları memory-map ile oku (columns verilmezse tümü, sırası korunur)
+
+    offset'ten başlayan nrows satırlık pencere okunur; yalnızca o aralığın
+    sayfaları diskten yüklenir. Kategori kolonlarında sözlükten yalnızca
+    pencerede geçen değerler çözülür; manifest dizin başına bir kez
+    okunur. Bilinmeyen kolon adı için KeyError.
+    """
+    import numpy as np
+    import pandas as pd
+
+    order, by_name = _column_index(directory)
+    names: List[str] = list(columns) if columns is not None else list(order)
+    missing = [name for name in names if name not in by_name]
+    if missing:
+        raise KeyError(", ".join(missing))
+
+    data = {}
+    for name in names:
+        info = by_name[name]
+        if info["kind"] == "string":
+            data[name] = _read_strings(directory, info, offset, nrows)
+            continue
+        array = np.load(directory / info["file"], mmap_mode="r", allow_pickle=False)
+        array = array[offset:offset + nrows if nrows is not None else None]
+        if info["kind"] == "category":
+            codes, categories = _window_categories(directory, info, np.asarray(array))
+            data[name] = pd.Categorical.from_codes(codes, categories=categories)
+        else:
+            # Kopya: memmap'e bağlı DataFrame dosya kapanınca geçersiz kalmasın
+            data[name] = np.array(array)
+    return pd.DataFrame(data, columns=names)
+
+
+def remove_columnar(directory: Path):
+    shutil.rmtree(directory, ignore_errors=True)
+    _column_index.cache_clear()
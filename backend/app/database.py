@@ -2,7 +2,9 @@
 Database connection and session management
 """
 from sqlmodel import SQLModel, create_engine, Session
-from sqlalchemy.pool import StaticPool
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool, QueuePool
+from fastapi import Request
 import os
 from pathlib import Path
 
@@ -13,21 +15,106 @@ DATA_DIR.mkdir(parents=True, exist_ok=True)
 # SQLite veritabanı yolu
 DATABASE_URL = f"sqlite:///{DATA_DIR / 'lab_reports.db'}"
 
-# Engine oluştur
-engine = create_engine(
-    DATABASE_URL,
-    echo=False,  # SQL sorgularını logla (geliştirme için True)
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
-)
+# Engine modu: "wal" (üretim: okuma havuzu + tek yazıcı) veya "simple" (tek paylaşımlı bağlantı)
+DB_MODE = os.getenv("DB_MODE", "wal").lower()
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", "8"))
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+
+# Her yeni bağlantıda uygulanan SQLite ayarları
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",      # WAL ile güvenli, commit başına fsync yok
+    "cache_size": -64000,         # ~64MB sayfa önbelleği
+    "mmap_size": 268435456,       # 256MB bellek eşlemeli okuma
+    "temp_store": "MEMORY",
+    "busy_timeout": DB_BUSY_TIMEOUT_MS,
+}
+
+# Okuma isteği sayılan HTTP metodları
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+def _apply_pragmas(dbapi_connection, read_only: bool = False):
+    """Bağlantıya SQLite pragma'larını uygula"""
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    if read_only:
+        cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+
+if DB_MODE == "simple":
+    # Eski davranış: tüm process tek bağlantıyı paylaşır
+    engine = create_engine(
+        DATABASE_URL,
+        echo=False,  # SQL sorgularını logla (geliştirme için True)
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    read_engine = engine
+else:
+    # Yazıcı: tek bağlantı, yazma işlemleri sırayla yapılır
+    engine = create_engine(
+        DATABASE_URL,
+        echo=False,
+        connect_args={"check_same_thread": False, "timeout": DB_BUSY_TIMEOUT_MS / 1000},
+        poolclass=QueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=30,
+    )
+    # Okuyucular: WAL sayesinde yazıcıyı beklemeden paralel okuma
+    read_engine = create_engine(
+        DATABASE_URL,
+        echo=False,
+        connect_args={"check_same_thread": False, "timeout": DB_BUSY_TIMEOUT_MS / 1000},
+        poolclass=QueuePool,
+        pool_size=DB_READ_POOL_SIZE,
+        max_overflow=0,
+        pool_timeout=30,
+    )
+
+    @event.listens_for(engine, "connect")
+    def _on_write_connect(dbapi_connection, connection_record):
+        _apply_pragmas(dbapi_connection)
+
+    @event.listens_for(read_engine, "connect")
+    def _on_read_connect(dbapi_connection, connection_record):
+        _apply_pragmas(dbapi_connection, read_only=True)
 
 
 def create_db_and_tables():
     """Veritabanı ve tabloları oluştur"""
+    from app.migrations import add_missing_columns, run_data_migrations
+
     SQLModel.metadata.create_all(engine)
+    # Mevcut tablolara sonradan eklenen kolonlar ve indeksler (create_all bunları atlar)
+    added = add_missing_columns(engine)
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    run_data_migrations(engine, added)
+
+
+def get_session(request: Request):
+    """Veritabanı session'ı döndür (dependency injection için)
+
+    GET/HEAD istekleri okuma havuzundan salt okunur session alır,
+    diğer istekler tek yazıcı bağlantısını kullanır.
+    """
+    bind = read_engine if request.method in READ_METHODS else engine
+    # expire_on_commit=False: commit sonrası yanıt için ek SELECT yapılmaz
+    with Session(bind, expire_on_commit=False) as session:
+        yield session
+
 
+def get_read_session():
+    """Her istek metodunda okuma havuzundan salt okunur session
 
-def get_session():
-    """Veritabanı session'ı döndür (dependency injection için)"""
-    with Session(engine) as session:
+    Uzun süren ama yalnızca okuyan POST işlemleri (rapor üretimi gibi) için:
+    yazıcı bağlantısı yalnızca gerçekten yazılacağı zaman, ayrı bir
+    get_session session'ıyla kısa süre tutulur.
+    """
+    with Session(read_engine, expire_on_commit=False) as session:
         yield session
@@ -0,0 +1,128 @@
+"""
+Grafik öncesi nokta azaltma
+
+Büyük serilerde her nokta çizilmez; görünümü koruyan bir alt küme seçilir:
+- lttb: Largest-Triangle-Three-Buckets, çizgi grafikleri için (şekli ve
+  tepe noktalarını korur)
+- minmax: x aralığı eşit kovalara bölünür, her kovadan en küçük ve en
+  büyük y alınır (yoğun seriler ve scatter için)
+
+Ayarlar ChartCreateRequest.config_json["downsample"] içinden okunur:
+{"algorithm": "lttb" | "minmax" | "none", "threshold": <nokta sayısı>}.
+Verilmezse line → lttb, scatter → minmax; diğer grafik tipleri azaltılmaz.
+Algoritmalar seçilen satırların indekslerini döndürür.
+"""
+import os
+from typing import Optional, Tuple
+
+# Bu sayıdan fazla noktası olan seriler azaltılır
+DOWNSAMPLE_THRESHOLD = int(os.getenv("CHART_DOWNSAMPLE_THRESHOLD", "2000"))
+
+ALGORITHMS = ("lttb", "minmax", "none")
+DEFAULT_ALGORITHMS = {"line": "lttb", "scatter": "minmax"}
+
+
+def resolve_settings(chart_type: str, config: Optional[dict]) -> Tuple[str, int]:
+    """(algoritma, eşik); geçersiz ayarda ValueError"""
+    settings = (config or {}).get("downsample") or {}
+    if not isinstance(settings, dict):
+        raise ValueError("downsample bir nesne olmalı")
+    algorithm = settings.get("algorithm", DEFAULT_ALGORITHMS.get(chart_type, "none"))
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Geçersiz downsample algoritması: {algorithm}")
+    threshold = settings.get("threshold", DOWNSAMPLE_THRESHOLD)
+    if not isinstance(threshold, int) or isinstance(threshold, bool) or threshold < 3:
+        raise ValueError("downsample eşiği en az 3 olan bir tamsayı olmalı")
+    return algorithm, threshold
+
+
+def _as_float(series):
+    """Kolonu float eksene çevir (tarih: ns, sayısal olmayan: sıra numarası)"""
+    import numpy as np
+
+    kind = series.dtype.kind
+    if kind == "M":
+        return series.to_numpy(dtype="datetime64[ns]").astype(np.int64).astype(np.float64)
+    if kind in "iufb":
+        return series.to_numpy(dtype=np.float64, na_value=np.nan)
+    return np.arange(len(series), dtype=np.float64)
+
+
+def lttb(x, y, threshold: int):
+    """Largest-Triangle-Three-Buckets; seçilen indeksler (sıralı)
+
+    İlk ve son nokta her zaman tutulur; aradaki noktalar threshold - 2
+    kovaya bölünür ve her kovadan, önceki seçilen nokta ile sonraki
+    kovanın ortalamasıyla en büyük üçgeni oluşturan nokta seçilir.
+    """
+    import numpy as np
+
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    # Kova ortalamaları (sonraki kova ortalaması için önceden, vektörel)
+    cum_x = np.concatenate([[0.0], np.cumsum(x)])
+    cum_y = np.concatenate([[0.0], np.cumsum(y)])
+    starts, ends = edges[:-1], edges[1:]
+    counts = ends - starts
+    mean_x = (cum_x[ends] - cum_x[starts]) / counts
+    mean_y = (cum_y[ends] - cum_y[starts]) / counts
+    # Son kovanın "sonraki"si son nokta
+    next_x = np.append(mean_x[1:], x[n - 1])
+    next_y = np.append(mean_y[1:], y[n - 1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = starts[bucket], ends[bucket]
+        px, py = x[previous], y[previous]
+        area = np.abs(
+            (px - next_x[bucket]) * (y[start:end] - py)
+            - (px - x[start:end]) * (next_y[bucket] - py)
+        )
+        previous = start + int(np.argmax(area))
+        selected[bucket + 1] = previous
+    return selected
+
+
+def minmax(x, y, threshold: int):
+    """x aralığını threshold / 2 kovaya böl, her kovadan min ve max y; seçilen indeksler (sıralı)"""
+    import numpy as np
+
+    n = len(x)
+    if threshold >= n:
+        return np.arange(n)
+    buckets = max(threshold // 2, 1)
+    low, high = float(np.min(x)), float(np.max(x))
+    span = high - low
+    if span > 0:
+        bucket = np.minimum(((x - low) / span * buckets).astype(np.int64), buckets - 1)
+    else:
+        bucket = np.zeros(n, dtype=np.int64)
+    # Kova içinde y'ye göre sıralı: her kovanın ilk ve son elemanı min/max
+    order = np.lexsort((y, bucket))
+    sorted_buckets = bucket[order]
+    first = np.flatnonzero(np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]])
+    last = np.r_[first[1:] - 1, n - 1]
+    return np.unique(np.concatenate([order[first], order[last]]))
+
+
+def downsample(df, x_column: str, y_column: str, chart_type: str, config: Optional[dict]):
+    """Grafik için azaltılmış DataFrame (gerekmiyorsa aynısı)
+
+    Eksik x/y değerli satırlar çizilmediği için önce çıkarılır.
+    """
+    import numpy as np
+
+    algorithm, threshold = resolve_settings(chart_type, config)
+    if algorithm == "none" or len(df) <= threshold:
+        return df
+    x = _as_float(df[x_column])
+    y = _as_float(df[y_column])
+    valid = np.flatnonzero(~np.isnan(x) & ~np.isnan(y))
+    if len(valid) <= threshold:
+        return df.iloc[valid]
+    pick = lttb if algorithm == "lttb" else minmax
+    return df.iloc[valid[pick(x[valid], y[valid], threshold)]]
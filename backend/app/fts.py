@@ -0,0 +1,218 @@
+"""
+SQLite FTS5 tam metin indeksi
+
+entries, experiments ve projects tabloları için external-content FTS5
+tabloları ve bunları güncel tutan trigger'lar. Tablolar metadata
+create_all ile birlikte oluşturulur; mevcut veritabanlarında
+ensure_fts_indexes ilk çalıştırmada indeksi oluşturup doldurur.
+
+Delta olarak saklanan eski entry versiyonlarının body_md alanı boştur;
+bu versiyonların tam metni, delta yazılırken bir trigger ile ayrı bir
+FTS5 tablosuna (entries_history_fts, içeriği kendisi saklar) eklenir.
+include_history aramaları bu tabloyu da kullanır.
+"""
+import html
+import re
+from typing import List
+
+from sqlalchemy import event, text, column, false
+
+from app.models import Project, Experiment, Entry
+
+# Model → (FTS tablo adı, indekslenen kolonlar)
+FTS_TABLES = {
+    Entry: ("entries_fts", ("title", "body_md")),
+    Experiment: ("experiments_fts", ("title", "description")),
+    Project: ("projects_fts", ("name", "description")),
+}
+
+# Delta saklanan eski versiyonların metin indeksi
+HISTORY_FTS = "entries_history_fts"
+
+# Türkçe karakterler için aksan duyarsız tokenizer
+FTS_TOKENIZE = "unicode61 remove_diacritics 2"
+
+# Sorgudaki tırnaklı ifadeler ve tekil kelimeler
+_QUERY_TOKEN = re.compile(r'"([^"]*)"|(\S+)')
+_WORD_CHARS = re.compile(r"[^\w]+", re.UNICODE)
+
+# Vurgu sınırları: SQL'de kontrol karakterleri, escape sonrası <mark>'a çevrilir
+_MARK_OPEN, _MARK_CLOSE = "\x02", "\x03"
+
+
+def _fts_ddl(model) -> List[str]:
+    """FTS tablosu ve senkronizasyon trigger'ları için DDL"""
+    fts, columns = FTS_TABLES[model]
+    source = model.__tablename__
+    cols = ", ".join(columns)
+    new_vals = ", ".join(f"new.{c}" for c in columns)
+    old_vals = ", ".join(f"old.{c}" for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{cols}, content='{source}', content_rowid='id', tokenize='{FTS_TOKENIZE}')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {source} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {source} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {source} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_vals}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_vals}); END",
+    ]
+
+
+def _history_ddl() -> List[str]:
+    """Eski versiyon indeksi ve onu besleyen trigger'lar için DDL"""
+    _, columns = FTS_TABLES[Entry]
+    cols = ", ".join(columns)
+    old_vals = ", ".join(f"old.{c}" for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {HISTORY_FTS} USING fts5("
+        f"{cols}, tokenize='{FTS_TOKENIZE}')",
+        # Tam metin deltaya çevrilirken (body_md boşaltılır) eski metni sakla
+        f"CREATE TRIGGER IF NOT EXISTS {HISTORY_FTS}_au AFTER UPDATE OF body_md ON entries "
+        f"WHEN old.body_delta IS NULL AND new.body_delta IS NOT NULL BEGIN "
+        f"DELETE FROM {HISTORY_FTS} WHERE rowid = old.id; "
+        f"INSERT INTO {HISTORY_FTS}(rowid, {cols}) VALUES (old.id, {old_vals}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {HISTORY_FTS}_ad AFTER DELETE ON entries BEGIN "
+        f"DELETE FROM {HISTORY_FTS} WHERE rowid = old.id; END",
+    ]
+
+
+def _create_fts(model, connection):
+    for statement in _fts_ddl(model):
+        connection.exec_driver_sql(statement)
+    if model is Entry:
+        for statement in _history_ddl():
+            connection.exec_driver_sql(statement)
+
+
+def _fill_history(connection):
+    """Mevcut delta versiyonları yeniden kurup eski versiyon indeksine ekle"""
+    from sqlmodel import Session, select
+
+    from app.versioning import hydrate_bodies
+
+    session = Session(bind=connection)
+    entries = session.exec(select(Entry).where(Entry.body_delta.is_not(None))).all()
+    for entry in hydrate_bodies(session, entries):
+        connection.exec_driver_sql(
+            f"INSERT INTO {HISTORY_FTS}(rowid, title, body_md) VALUES (?, ?, ?)",
+            (entry.id, entry.title, entry.body_md),
+        )
+    session.close()
+
+
+for _model in FTS_TABLES:
+    event.listen(
+        _model.__table__,
+        "after_create",
+        lambda target, connection, _model=_model, **kw: _create_fts(_model, connection),
+    )
+
+
+def ensure_fts_indexes(engine) -> List[str]:
+    """Eksik FTS tablolarını oluştur ve mevcut verilerden doldur"""
+    created = []
+    with engine.begin() as connection:
+        history = connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (HISTORY_FTS,)
+        ).first()
+        if not history:
+            for statement in _history_ddl():
+                connection.exec_driver_sql(statement)
+            _fill_history(connection)
+            created.append(HISTORY_FTS)
+        for model, (fts, _) in FTS_TABLES.items():
+            exists = connection.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (fts,)
+            ).first()
+            if exists:
+                continue
+            _create_fts(model, connection)
+            connection.exec_driver_sql(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+            created.append(fts)
+    return created
+
+
+def build_match_query(query: str) -> str:
+    """Kullanıcı metnini güvenli bir FTS5 MATCH ifadesine çevir
+
+    - "tırnaklı ifade" → phrase sorgusu
+    - kelime* → prefix sorgusu
+    - diğer kelimeler AND ile birleştirilir
+    FTS5 operatörleri (NEAR, OR, sütun filtreleri) kullanıcı girdisinden
+    yorumlanmaz.
+    """
+    terms = []
+    for phrase, word in _QUERY_TOKEN.findall(query or ""):
+        if phrase:
+            words = [w for w in _WORD_CHARS.split(phrase) if w]
+            if words:
+                terms.append('"' + " ".join(words) + '"')
+            continue
+        prefix = word.endswith("*")
+        for part in (p for p in _WORD_CHARS.split(word) if p):
+            terms.append(f'"{part}"')
+        if prefix and terms and not terms[-1].endswith("*"):
+            terms[-1] += "*"
+    return " ".join(terms)
+
+
+def fts_match(model, query: str, include_history: bool = False):
+    """model.id için FTS eşleşmesi koşulu (IN alt sorgusu)
+
+    include_history: Entry için delta saklanan eski versiyonların metninde de ara
+    """
+    fts, _ = FTS_TABLES[model]
+    match = build_match_query(query)
+    if not match:
+        return false()
+    sql = f"SELECT rowid FROM {fts} WHERE {fts} MATCH :fts_query"
+    if include_history and model is Entry:
+        sql += f" UNION SELECT rowid FROM {HISTORY_FTS} WHERE {HISTORY_FTS} MATCH :fts_query"
+    matching = text(sql).bindparams(fts_query=match).columns(column("rowid"))
+    return model.id.in_(matching)
+
+
+def search_ranked(connection, query: str, limit: int) -> List[dict]:
+    """Tüm entity'lerde BM25 sıralı arama (tek sorgu)
+
+    Her sonuç için vurgulanmış başlık ve içerik snippet'i döner (HTML
+    escape edilmiş, eşleşmeler <mark> içinde).
+    Düşük bm25 skoru daha iyi eşleşmedir.
+    """
+    match = build_match_query(query)
+    if not match:
+        return []
+
+    parts = []
+    for model, kind in ((Project, "project"), (Experiment, "experiment"), (Entry, "entry")):
+        fts, (title_col, _) = FTS_TABLES[model]
+        part = (
+            f"SELECT '{kind}' AS type, rowid AS id, {title_col} AS title, "
+            f"highlight({fts}, 0, :mark_open, :mark_close) AS title_html, "
+            f"snippet({fts}, 1, :mark_open, :mark_close, '…', 16) AS snippet, "
+            f"bm25({fts}) AS score "
+            f"FROM {fts} WHERE {fts} MATCH :q"
+        )
+        if model is Entry:
+            # Eski versiyonlar birleşik aramada gösterilmez
+            part += " AND rowid IN (SELECT id FROM entries WHERE is_head = 1)"
+        parts.append(part)
+    sql = " UNION ALL ".join(parts) + " ORDER BY score LIMIT :limit"
+    params = {"q": match, "limit": limit, "mark_open": _MARK_OPEN, "mark_close": _MARK_CLOSE}
+    rows = connection.execute(text(sql), params).mappings().all()
+    hits = []
+    for row in rows:
+        hit = dict(row)
+        hit["title_html"] = _mark_html(hit["title_html"])
+        hit["snippet"] = _mark_html(hit["snippet"])
+        hits.append(hit)
+    return hits
+
+
+def _mark_html(value):
+    """Kullanıcı metnini HTML escape et, vurgu sınırlarını <mark> yap"""
+    if value is None:
+        return None
+    return html.escape(value).replace(_MARK_OPEN, "<mark>").replace(_MARK_CLOSE, "</mark>")
@@ -0,0 +1,276 @@
+"""
+Ertelenmiş silme ve çöp toplama
+
+Attachment ve şablon silme istekleri kaydı yalnızca çöp kutusuna taşır
+(deleted_at) ve dosyaya dokunmadan döner; grace süresi boyunca geri
+alınabilir. Toplayıcı periyodik olarak (veya istek üzerine):
+- grace süresini geçen çöp kutusu kayıtlarını parti parti kalıcı siler
+  (blob'un son referansıysa dosya ve türevleri de silinir),
+- aynı dataset/kolon/ayarlar için yenisi üretilmiş eski grafikleri siler,
+- süresi dolan rapor dosyalarını ve hiçbir kayda ait olmayan grafik /
+  dataset / kolon önbelleği dosyalarını siler.
+
+Her parti kısa bir transaction'da silinir; dosyalar commit sonrasında,
+veritabanı bağlantısı tutulmadan kaldırılır. İstisna blob dosyalarıdır:
+eşzamanlı bir yeniden yüklemeyle yarışmamak için satırla aynı yazma
+transaction'ı içinde silinirler. Çalışma öncesi ve sonrası
+disk kullanımı raporlanır.
+"""
+import asyncio
+import os
+import threading
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional
+
+from sqlalchemy import String, cast
+from sqlmodel import Session, select, func
+from starlette.concurrency import run_in_threadpool
+
+from app.blobs import release_blob
+from app.charts import CHART_DIR
+from app.columnar import COLUMNAR_DIR
+from app.database import DATA_DIR
+from app.models import Attachment, Chart, Dataset, Template
+from app.stats import REPORT_DIR, charge_report, report_entry_id
+from app.thumbnails import remove_derivatives
+
+# Çöp kutusundaki kayıtlar bu süre sonunda kalıcı silinir (geri alma penceresi)
+GC_GRACE = timedelta(hours=float(os.getenv("GC_GRACE_HOURS", "72")))
+# 0: periyodik toplama kapalı
+GC_INTERVAL_HOURS = float(os.getenv("GC_INTERVAL_HOURS", "6"))
+# Tek transaction'da silinen kayıt sayısı
+GC_BATCH_SIZE = int(os.getenv("GC_BATCH_SIZE", "200"))
+# Üretilen rapor dosyaları indirildikten sonra bu süre tutulur
+REPORT_TTL = timedelta(hours=float(os.getenv("REPORT_TTL_HOURS", "24")))
+# Bu süreden yeni kaydı olmayan dosyalar sahipsiz sayılmaz (yazılıyor veya
+# kaydı henüz commit edilmemiş olabilir); çöp kutusu grace süresinden bağımsız
+ORPHAN_GRACE = timedelta(hours=float(os.getenv("GC_ORPHAN_GRACE_HOURS", "1")))
+
+STORAGE_ROOTS = [DATA_DIR / "storage", DATA_DIR / "templates"]
+DATASET_DIR = DATA_DIR / "storage" / "datasets"
+
+_run_lock = threading.Lock()
+
+
+@dataclass
+class GCReport:
+    """Çöp toplama sonucu"""
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    attachments: int = 0  # kalıcı silinen attachment kaydı
+    templates: int = 0
+    charts: int = 0  # yenisiyle geçersiz kalan grafikler
+    reports: int = 0  # süresi dolan rapor dosyaları
+    orphan_files: int = 0  # kaydı olmayan grafik/dataset/kolon önbelleği dosyaları
+    files_removed: int = 0
+    bytes_before: int = 0
+    bytes_after: int = 0
+
+    @property
+    def reclaimed_bytes(self) -> int:
+        return max(self.bytes_before - self.bytes_after, 0)
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data["reclaimed_bytes"] = self.reclaimed_bytes
+        return data
+
+
+def disk_usage() -> int:
+    """Depolama dizinlerindeki toplam byte"""
+    total = 0
+    for root in STORAGE_ROOTS:
+        if root.exists():
+            total += sum(path.stat().st_size for path in root.rglob("*") if path.is_file())
+    return total
+
+
+def _remove(paths: List[Path], report: GCReport):
+    for path in paths:
+        try:
+            path.unlink()
+            report.files_removed += 1
+        except FileNotFoundError:
+            pass
+
+
+def _purge_attachments(engine, cutoff: datetime, batch_size: int, report: GCReport):
+    """Süresi dolan çöp kutusu attachment'larını parti parti sil"""
+    while True:
+        orphans = []
+        with Session(engine) as session:
+            rows = session.exec(
+                select(Attachment)
+                .where(Attachment.deleted_at.is_not(None), Attachment.deleted_at < cutoff)
+                .order_by(Attachment.id)
+                .limit(batch_size)
+            ).all()
+            for attachment in rows:
+                path = release_blob(session, attachment.sha256)
+                if path is not None:
+                    orphans.append((path, attachment.sha256))
+                session.delete(attachment)
+            session.flush()
+            # Blob dosyaları yazıcı bağlantısı tutulurken silinir: aynı içeriği
+            # yeniden yükleyen acquire_blob araya giremez, girerse dosyayı yeniden koyar
+            _remove([path for path, _ in orphans], report)
+            session.commit()
+        for _, sha256 in orphans:
+            remove_derivatives(sha256)
+        report.attachments += len(rows)
+        if len(rows) < batch_size:
+            return
+
+
+def _purge_templates(engine, cutoff: datetime, batch_size: int, report: GCReport):
+    """Süresi dolan çöp kutusu şablonlarını parti parti sil"""
+    while True:
+        with Session(engine) as session:
+            rows = session.exec(
+                select(Template)
+                .where(Template.deleted_at.is_not(None), Template.deleted_at < cutoff)
+                .order_by(Template.id)
+                .limit(batch_size)
+            ).all()
+            for template in rows:
+                session.delete(template)
+            session.flush()
+            # Şablonlar dosya adıyla saklanır: aynı dosyayı kullanan başka kayıt varsa dosya kalır
+            relative = {template.file_path for template in rows}
+            shared = set(session.exec(
+                select(Template.file_path).where(Template.file_path.in_(relative))
+            ).all()) if relative else set()
+            session.commit()
+        _remove([DATA_DIR / rel for rel in sorted(relative - shared)], report)
+        report.templates += len(rows)
+        if len(rows) < batch_size:
+            return
+
+
+def _superseded_charts(cutoff: datetime, batch_size: int):
+    """Aynı dataset, tip, kolonlar ve ayarlarla daha yeni bir kopyası olan grafikler"""
+    ranked = select(
+        Chart.id,
+        Chart.created_at,
+        func.row_number().over(
+            partition_by=(
+                Chart.dataset_id, Chart.chart_type, Chart.x_column, Chart.y_column,
+                func.coalesce(Chart.title, ""), cast(Chart.config_json, String),
+            ),
+            order_by=(Chart.created_at.desc(), Chart.id.desc()),
+        ).label("rank"),
+    ).subquery()
+    return (
+        select(ranked.c.id)
+        .where(ranked.c.rank > 1, ranked.c.created_at < cutoff)
+        .order_by(ranked.c.id)
+        .limit(batch_size)
+    )
+
+
+def _prune_charts(engine, cutoff: datetime, batch_size: int, report: GCReport):
+    """Geçersiz kalan grafikleri parti parti sil"""
+    while True:
+        with Session(engine) as session:
+            ids = session.exec(_superseded_charts(cutoff, batch_size)).all()
+            rows = session.exec(select(Chart).where(Chart.id.in_(ids))).all() if ids else []
+            paths = [DATA_DIR / chart.image_path for chart in rows]
+            for chart in rows:
+                session.delete(chart)
+            session.commit()
+        _remove(paths, report)
+        report.charts += len(rows)
+        if len(ids) < batch_size:
+            return
+
+
+def _sweep_files(engine, orphan_grace: timedelta, report_ttl: timedelta, report: GCReport):
+    """Süresi dolan raporlar ve kaydı olmayan grafik/dataset/önbellek dosyaları"""
+    now = time.time()
+    if REPORT_DIR.exists():
+        stale = [
+            (path, path.stat())
+            for path in REPORT_DIR.iterdir()
+            if path.is_file() and now - path.stat().st_mtime > report_ttl.total_seconds()
+        ]
+        _remove([path for path, _ in stale], report)
+        report.reports += len(stale)
+        # Rapor dosyalarının kaydı yok: defterden elle düş
+        with Session(engine) as session:
+            for path, stat_result in stale:
+                entry_id = report_entry_id(path.name)
+                if entry_id is not None and not path.exists():
+                    charge_report(session, entry_id, -stat_result.st_size)
+            session.commit()
+
+    with Session(engine) as session:
+        referenced = {DATA_DIR / rel for rel in session.exec(select(Chart.image_path)).all()}
+        referenced.update(DATA_DIR / rel for rel in session.exec(select(Dataset.source_file)).all())
+        # Kolon önbelleği: dizin referans alınır
+        referenced.update(
+            DATA_DIR / rel
+            for rel in session.exec(
+                select(Dataset.columnar_path).where(Dataset.columnar_path.is_not(None))
+            ).all()
+        )
+    orphans = []
+    for root in (CHART_DIR, DATASET_DIR, COLUMNAR_DIR):
+        if not root.exists():
+            continue
+        for path in root.rglob("*"):
+            # Yeni dosyalar (içe aktarma, .part dizinleri, çizimler) henüz kaydedilmemiş olabilir
+            if (
+                path.is_file() and path not in referenced and path.parent not in referenced
+                and now - path.stat().st_mtime > orphan_grace.total_seconds()
+            ):
+                orphans.append(path)
+    _remove(orphans, report)
+    report.orphan_files += len(orphans)
+    # Boşalan önbellek dizinleri
+    for directory in {path.parent for path in orphans if path.parent.parent == COLUMNAR_DIR}:
+        try:
+            directory.rmdir()
+        except OSError:
+            pass
+
+
+def collect_garbage(
+    engine,
+    grace: timedelta = GC_GRACE,
+    batch_size: int = GC_BATCH_SIZE,
+    report_ttl: timedelta = REPORT_TTL,
+    orphan_grace: timedelta = ORPHAN_GRACE,
+) -> GCReport:
+    """Tam çöp toplama çalıştır (aynı anda tek çalışma)
+
+    grace yalnızca çöp kutusu kayıtlarına uygulanır; sahipsiz dosyalar
+    en az orphan_grace kadar eski olmalıdır.
+    """
+    with _run_lock:
+        report = GCReport(started_at=datetime.utcnow(), bytes_before=disk_usage())
+        cutoff = report.started_at - grace
+        _purge_attachments(engine, cutoff, batch_size, report)
+        _purge_templates(engine, cutoff, batch_size, report)
+        _prune_charts(engine, cutoff, batch_size, report)
+        _sweep_files(engine, orphan_grace, report_ttl, report)
+        report.bytes_after = disk_usage()
+        report.finished_at = datetime.utcnow()
+        return report
+
+
+async def gc_loop(engine):
+    """Periyodik çöp toplama (GC_INTERVAL_HOURS > 0 ise lifespan'de çalışır)"""
+    while True:
+        await asyncio.sleep(GC_INTERVAL_HOURS * 3600)
+        try:
+            report = await run_in_threadpool(collect_garbage, engine)
+            if report.files_removed:
+                print(
+                    f"🗑️ Çöp toplama: {report.files_removed} dosya silindi, "
+                    f"{report.reclaimed_bytes / (1024 * 1024):.1f}MB geri kazanıldı"
+                )
+        except Exception as e:
+            print(f"⚠️ Çöp toplama başarısız: {e}")
@@ -2,15 +2,29 @@
 FastAPI main application
 Lab Report Management System - MVP Backend
 """
+import asyncio
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from contextlib import asynccontextmanager
 from pathlib import Path
 
-from app.database import create_db_and_tables
-from app.api import projects, experiments, entries, attachments, datasets, reports, search, templates
+from app.audit import audit_buffer, AUDIT_WRITE_BEHIND
+from app.database import create_db_and_tables, engine, read_engine
+from app.tags import backfill_tags
+from app.fts import ensure_fts_indexes
+from app.stats import backfill_file_sizes, rebuild_counters
+from app.blobs import migrate_legacy_attachments
+from app.thumbnails import shutdown_pool
+from app.charts import shutdown_render_pool
+from app.uploads import cleanup_stale_uploads, cleanup_loop
+from app.scrubber import SCRUB_INTERVAL_HOURS, scrub_loop
+from app.gc import GC_INTERVAL_HOURS, gc_loop
+from app.api import (
+    projects, experiments, entries, attachments, datasets, reports, search, templates, stats,
+    uploads, maintenance,
+)
 
 
 @asynccontextmanager
@@ -18,9 +32,36 @@ async def lifespan(app: FastAPI):
     """Uygulama başlangıç ve kapanış olayları"""
     # Başlangıç: Veritabanını oluştur
     create_db_and_tables()
+    for fts_table in ensure_fts_indexes(engine):
+        print(f"🔎 {fts_table} tam metin indeksi oluşturuldu")
+    backfilled = backfill_tags(engine)
+    if backfilled:
+        print(f"🏷️ {backfilled} kayıt için etiket indeksi oluşturuldu")
+    measured = backfill_file_sizes(engine)
+    if measured:
+        print(f"📏 {measured} dataset/grafik dosyasının boyutu kaydedildi")
+    if rebuild_counters(engine, force=bool(measured)):
+        print("📊 Dashboard sayaçları hesaplandı")
+    migrated = migrate_legacy_attachments(engine)
+    if migrated:
+        print(f"📦 {migrated} ek dosyası blob deposuna taşındı")
+    cleanup_stale_uploads(engine)
     print("✅ Database initialized")
+    if AUDIT_WRITE_BEHIND:
+        audit_buffer.start()
+    background = [asyncio.create_task(cleanup_loop(engine))]
+    if SCRUB_INTERVAL_HOURS > 0:
+        background.append(asyncio.create_task(scrub_loop(read_engine)))
+    if GC_INTERVAL_HOURS > 0:
+        background.append(asyncio.create_task(gc_loop(engine)))
     yield
     # Kapanış: Temizlik işlemleri
+    for task in background:
+        task.cancel()
+    if AUDIT_WRITE_BEHIND:
+        audit_buffer.stop()
+    shutdown_pool()
+    shutdown_render_pool()
     print("👋 Application shutdown")
 
 
@@ -45,6 +86,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Estimate"],
 )
 
 
@@ -57,6 +99,9 @@ app.include_router(datasets.router, prefix="/api/datasets", tags=["Datasets"])
 app.include_router(reports.router, prefix="/api/reports", tags=["Reports"])
 app.include_router(search.router, prefix="/api/search", tags=["Search"])
 app.include_router(templates.router, prefix="/api/templates", tags=["Templates"])
+app.include_router(stats.router, prefix="/api/stats", tags=["Stats"])
+app.include_router(uploads.router, prefix="/api/uploads", tags=["Uploads"])
+app.include_router(maintenance.router, prefix="/api/maintenance", tags=["Maintenance"])
 
 # Frontend klasörünü belirle
 FRONTEND_DIR = Path(__file__).parent.parent.parent / "frontend"
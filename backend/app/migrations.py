@@ -0,0 +1,83 @@
+"""
+Basit şema yükseltmeleri
+
+create_all mevcut tablolara yeni kolon eklemez. Modellere sonradan
+eklenen kolonlar burada ALTER TABLE ile eklenir ve gerekiyorsa ilgili
+veri dönüşümü bir kez çalıştırılır.
+"""
+from typing import Dict, List, Set, Tuple
+
+from sqlalchemy import inspect
+from sqlmodel import SQLModel
+
+# (tablo, kolon) eklendiğinde çalışacak veri dönüşümleri
+DATA_MIGRATIONS: Dict[Tuple[str, str], List[str]] = {
+    ("entries", "is_head"): [
+        # Alt versiyonu olan entry'ler artık güncel değil
+        "UPDATE entries SET is_head = 0 "
+        "WHERE id IN (SELECT parent_version_id FROM entries WHERE parent_version_id IS NOT NULL)",
+    ],
+    ("entries", "root_id"): [
+        # parent_version_id zincirini köke kadar yürü
+        "WITH RECURSIVE chain(id, root) AS ("
+        " SELECT id, id FROM entries WHERE parent_version_id IS NULL"
+        " UNION ALL"
+        " SELECT e.id, chain.root FROM entries e JOIN chain ON e.parent_version_id = chain.id"
+        ") UPDATE entries SET root_id = (SELECT root FROM chain WHERE chain.id = entries.id)",
+    ],
+    ("blobs", "stored_size"): [
+        # Mevcut blob'lar ham saklanıyor
+        "UPDATE blobs SET stored_size = size WHERE stored_size IS NULL",
+    ],
+}
+
+
+def _column_default_sql(column) -> str:
+    """ALTER TABLE için DEFAULT ifadesi (Python tarafı skaler default'tan)"""
+    default = column.default
+    if default is None or not default.is_scalar:
+        return ""
+    value = default.arg
+    if isinstance(value, bool):
+        return f" DEFAULT {int(value)}"
+    if isinstance(value, (int, float)):
+        return f" DEFAULT {value}"
+    if isinstance(value, str):
+        escaped = value.replace("'", "''")
+        return f" DEFAULT '{escaped}'"
+    return ""
+
+
+def add_missing_columns(engine) -> Set[Tuple[str, str]]:
+    """Modelde olup tabloda olmayan kolonları ekle, eklenenleri döndür"""
+    added = set()
+    # Tek bağlantı: yazıcı havuzu tek bağlantılık olabilir
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        existing_tables = set(inspector.get_table_names())
+        for table in SQLModel.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                col_type = column.type.compile(dialect=engine.dialect)
+                default = _column_default_sql(column)
+                # SQLite, DEFAULT olmadan NOT NULL kolon eklemeye izin vermez
+                not_null = " NOT NULL" if not column.nullable and default else ""
+                connection.exec_driver_sql(
+                    f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" '
+                    f'{col_type}{not_null}{default}'
+                )
+                added.add((table.name, column.name))
+    return added
+
+
+def run_data_migrations(engine, added: Set[Tuple[str, str]]):
+    """Yeni eklenen kolonlar için veri dönüşümlerini çalıştır"""
+    with engine.begin() as connection:
+        for key, statements in DATA_MIGRATIONS.items():
+            if key in added:
+                for statement in statements:
+                    connection.exec_driver_sql(statement)
@@ -4,6 +4,7 @@ Database models for Lab Report Management System
 from datetime import datetime
 from typing import Optional, List
 from sqlmodel import Field, SQLModel, Relationship, Column, JSON
+from sqlalchemy import Index, LargeBinary
 from pydantic import EmailStr
 
 
@@ -25,6 +26,10 @@ class User(SQLModel, table=True):
 class Project(SQLModel, table=True):
     """Proje modeli"""
     __tablename__ = "projects"
+    __table_args__ = (
+        # Keyset sayfalama: ORDER BY created_at DESC, id DESC
+        Index("ix_projects_created_at_id", "created_at", "id"),
+    )
     
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str = Field(index=True)
@@ -33,6 +38,7 @@ class Project(SQLModel, table=True):
     created_by: int = Field(foreign_key="users.id")
     created_at: datetime = Field(default_factory=datetime.utcnow)
     archived: bool = Field(default=False)
+    storage_quota_bytes: Optional[int] = None  # None: sınırsız
     
     # İlişkiler
     creator: Optional[User] = Relationship(back_populates="projects")
@@ -42,6 +48,10 @@ class Project(SQLModel, table=True):
 class Experiment(SQLModel, table=True):
     """Deney modeli"""
     __tablename__ = "experiments"
+    __table_args__ = (
+        # Keyset sayfalama: ORDER BY start_ts DESC, id DESC
+        Index("ix_experiments_start_ts_id", "start_ts", "id"),
+    )
     
     id: Optional[int] = Field(default=None, primary_key=True)
     project_id: int = Field(foreign_key="projects.id", index=True)
@@ -60,15 +70,27 @@ class Experiment(SQLModel, table=True):
 class Entry(SQLModel, table=True):
     """Deney günlüğü girişi (versiyonlu)"""
     __tablename__ = "entries"
+    __table_args__ = (
+        # Keyset sayfalama: ORDER BY created_at DESC, id DESC
+        Index("ix_entries_created_at_id", "created_at", "id"),
+        # Sadece güncel versiyonları listeleme
+        Index("ix_entries_is_head_created_at_id", "is_head", "created_at", "id"),
+        # Bir zincirin tüm versiyonları tek indeksli sorguda
+        Index("ix_entries_root_id_version", "root_id", "version"),
+    )
     
     id: Optional[int] = Field(default=None, primary_key=True)
     experiment_id: int = Field(foreign_key="experiments.id", index=True)
     author_id: int = Field(foreign_key="users.id", index=True)
     title: str = Field(index=True)
-    body_md: str  # Markdown formatında içerik
+    body_md: str  # Markdown formatında içerik (delta saklanan versiyonlarda boş)
+    # Sonraki versiyona göre sıkıştırılmış delta
+    body_delta: Optional[bytes] = Field(default=None, sa_column=Column(LargeBinary))
     tags: List[str] = Field(default=[], sa_column=Column(JSON))
     version: int = Field(default=1)
     parent_version_id: Optional[int] = Field(default=None, foreign_key="entries.id")
+    is_head: bool = Field(default=True, index=True)  # En güncel versiyon mu?
+    root_id: Optional[int] = Field(default=None)  # Zincirin ilk versiyonu (lineage)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     
@@ -79,19 +101,70 @@ class Entry(SQLModel, table=True):
     datasets: List["Dataset"] = Relationship(back_populates="entry")
 
 
+class Tag(SQLModel, table=True):
+    """Normalize edilmiş etiket"""
+    __tablename__ = "tags"
+    
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str = Field(unique=True, index=True)
+
+
+class ProjectTag(SQLModel, table=True):
+    """Proje-etiket bağlantısı"""
+    __tablename__ = "project_tags"
+    
+    tag_id: int = Field(foreign_key="tags.id", primary_key=True)
+    project_id: int = Field(foreign_key="projects.id", primary_key=True, index=True)
+
+
+class ExperimentTag(SQLModel, table=True):
+    """Deney-etiket bağlantısı"""
+    __tablename__ = "experiment_tags"
+    
+    tag_id: int = Field(foreign_key="tags.id", primary_key=True)
+    experiment_id: int = Field(foreign_key="experiments.id", primary_key=True, index=True)
+
+
+class EntryTag(SQLModel, table=True):
+    """Entry-etiket bağlantısı"""
+    __tablename__ = "entry_tags"
+    
+    tag_id: int = Field(foreign_key="tags.id", primary_key=True)
+    entry_id: int = Field(foreign_key="entries.id", primary_key=True, index=True)
+
+
+class Blob(SQLModel, table=True):
+    """İçerik adresli dosya (her benzersiz içerik bir kez saklanır)"""
+    __tablename__ = "blobs"
+    
+    sha256: str = Field(primary_key=True)  # Tam içerik hash'i
+    file_path: str  # storage/blobs/ab/cd/<sha256>[.gz]
+    size: int  # bytes (açılmış içerik)
+    stored_size: Optional[int] = None  # Diskteki boyut (sıkıştırılmışsa daha küçük)
+    encoding: Optional[str] = None  # None (ham) veya gzip
+    refcount: int = Field(default=0)  # Bu içeriğe bağlı attachment sayısı
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+
 class Attachment(SQLModel, table=True):
     """Dosya eki modeli"""
     __tablename__ = "attachments"
+    __table_args__ = (
+        # Keyset sayfalama: ORDER BY created_at DESC, id DESC
+        Index("ix_attachments_created_at_id", "created_at", "id"),
+    )
     
     id: Optional[int] = Field(default=None, primary_key=True)
     entry_id: int = Field(foreign_key="entries.id", index=True)
-    file_path: str  # storage/attachments/yyyy/mm/uuid.ext
+    file_path: str  # Blob yolu: storage/blobs/ab/cd/<sha256>
     file_type: str  # png, jpg, pdf, docx, xlsx, csv
-    file_size: int  # bytes
+    file_size: int  # bytes (mantıksal)
     original_name: str
     caption: Optional[str] = None
-    sha256: str = Field(index=True)  # Dosya hash'i
+    sha256: str = Field(foreign_key="blobs.sha256", index=True)  # Dosya hash'i
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    # Çöp kutusunda (gc kalıcı siler)
+    deleted_at: Optional[datetime] = Field(default=None, index=True)
     
     # İlişkiler
     entry: Optional[Entry] = Relationship(back_populates="attachments")
@@ -100,11 +173,21 @@ class Attachment(SQLModel, table=True):
 class Dataset(SQLModel, table=True):
     """İçe aktarılan veri seti modeli"""
     __tablename__ = "datasets"
+    __table_args__ = (
+        # Keyset sayfalama: ORDER BY created_at DESC, id DESC
+        Index("ix_datasets_created_at_id", "created_at", "id"),
+    )
     
     id: Optional[int] = Field(default=None, primary_key=True)
     entry_id: int = Field(foreign_key="entries.id", index=True)
     name: str
-    source_file: str  # Orijinal dosya yolu
+    source_file: str  # Orijinal dosya yolu (csv ise .csv.gz olabilir)
+    file_size: Optional[int] = None  # Orijinal boyut (bytes)
+    stored_size: Optional[int] = None  # Diskteki boyut
+    encoding: Optional[str] = None  # None (ham) veya gzip
+    sha256: Optional[str] = None  # Kaynak dosya içeriğinin hash'i
+    columnar_path: Optional[str] = None  # Kolon önbelleği dizini (storage/columnar/...)
+    columnar_size: Optional[int] = None  # Kolon önbelleğinin diskteki boyutu
     columns_json: dict = Field(sa_column=Column(JSON))  # Kolon adları ve tipleri
     stats_json: dict = Field(sa_column=Column(JSON))  # İstatistikler (mean, std, vb.)
     row_count: int
@@ -118,6 +201,10 @@ class Dataset(SQLModel, table=True):
 class Chart(SQLModel, table=True):
     """Üretilen grafik modeli"""
     __tablename__ = "charts"
+    __table_args__ = (
+        # Keyset sayfalama: ORDER BY created_at DESC, id DESC
+        Index("ix_charts_created_at_id", "created_at", "id"),
+    )
     
     id: Optional[int] = Field(default=None, primary_key=True)
     dataset_id: int = Field(foreign_key="datasets.id", index=True)
@@ -126,6 +213,10 @@ class Chart(SQLModel, table=True):
     y_column: str
     title: Optional[str] = None
     image_path: str  # PNG dosya yolu
+    file_size: Optional[int] = None  # PNG boyutu (bytes)
+    point_count: Optional[int] = None  # veri setindeki nokta sayısı
+    rendered_point_count: Optional[int] = None  # azaltma sonrası çizilen
+    cache_key: Optional[str] = Field(default=None, index=True)  # içerik + ayar hash'i
     config_json: dict = Field(sa_column=Column(JSON))  # Grafik ayarları
     created_at: datetime = Field(default_factory=datetime.utcnow)
     
@@ -133,6 +224,32 @@ class Chart(SQLModel, table=True):
     dataset: Optional[Dataset] = Relationship(back_populates="charts")
 
 
+class UploadSession(SQLModel, table=True):
+    """Devam ettirilebilir (parçalı) yükleme oturumu"""
+    __tablename__ = "upload_sessions"
+    
+    id: str = Field(primary_key=True)  # uuid hex
+    entry_id: int = Field(foreign_key="entries.id", index=True)
+    filename: str
+    caption: Optional[str] = None
+    total_size: int  # bytes
+    chunk_size: int  # son parça hariç tüm parçalar bu boyutta
+    sha256: Optional[str] = None  # İstemcinin bildirdiği hash (tamamlamada doğrulanır)
+    status: str = Field(default="open")  # open, completing, completed
+    attachment_id: Optional[int] = Field(default=None, foreign_key="attachments.id")
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+
+class UploadChunk(SQLModel, table=True):
+    """Yükleme oturumunda diske yazılmış parça"""
+    __tablename__ = "upload_chunks"
+    
+    session_id: str = Field(foreign_key="upload_sessions.id", primary_key=True)
+    offset: int = Field(primary_key=True)
+    size: int
+
+
 class AuditLog(SQLModel, table=True):
     """Değişiklik kaydı"""
     __tablename__ = "audit_logs"
@@ -157,3 +274,15 @@ class Template(SQLModel, table=True):
     file_path: str  # templates/ altında
     is_default: bool = Field(default=False)
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    # Çöp kutusunda (gc kalıcı siler)
+    deleted_at: Optional[datetime] = Field(default=None, index=True)
+
+
+class StatCounter(SQLModel, table=True):
+    """Dashboard sayaçları (yazma işlemlerinde artımlı güncellenir)"""
+    __tablename__ = "stat_counters"
+    
+    scope: str = Field(primary_key=True)  # global, project
+    scope_id: int = Field(default=0, primary_key=True)  # global için 0
+    metric: str = Field(primary_key=True)  # projects, entries, attachment_bytes, ...
+    value: int = Field(default=0)
@@ -0,0 +1,76 @@
+"""
+Keyset (cursor) sayfalama
+
+Listeler (sıralama kolonu, id) çiftine göre azalan sırada döner. Sonraki
+sayfa için opak cursor `X-Next-Cursor` yanıt başlığında verilir; cursor
+ile gelen istek atlanan satırları taramadan, composite indeks üzerinden
+devam eder. `offset` geriye dönük uyumluluk için desteklenir.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, Response
+from sqlalchemy import func, tuple_
+from sqlmodel import Session, select
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_ESTIMATE_HEADER = "X-Total-Estimate"
+
+# Tahmini toplam için en fazla sayılacak satır
+ESTIMATE_CAP = 10000
+
+
+def encode_cursor(sort_value: datetime, row_id: int) -> str:
+    """(sıralama değeri, id) çiftini opak cursor'a çevir"""
+    payload = json.dumps([sort_value.isoformat(), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Cursor'ı çöz, bozuksa 422 döndür"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(sort_value), int(row_id)
+    except Exception:
+        raise HTTPException(status_code=422, detail="Geçersiz cursor")
+
+
+def estimate_total(session: Session, statement, cap: int = ESTIMATE_CAP) -> str:
+    """Filtrelenmiş sorgu için sınırlı maliyetli toplam (cap üstü 'N+')"""
+    limited = statement.order_by(None).limit(cap + 1).subquery()
+    count = session.exec(select(func.count()).select_from(limited)).one()
+    return f"{cap}+" if count > cap else str(count)
+
+
+def paginate(
+    session: Session,
+    statement,
+    response: Response,
+    sort_column,
+    id_column,
+    limit: int,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    estimate: bool = False,
+):
+    """Sorguyu (sort_column, id) azalan sırada sayfala ve başlıkları yaz"""
+    if estimate:
+        response.headers[TOTAL_ESTIMATE_HEADER] = estimate_total(session, statement)
+
+    if cursor:
+        statement = statement.where(tuple_(sort_column, id_column) < decode_cursor(cursor))
+
+    statement = statement.order_by(sort_column.desc(), id_column.desc())
+    if offset:
+        statement = statement.offset(offset)
+    items = session.exec(statement.limit(limit)).all()
+
+    if len(items) == limit:
+        last = items[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            getattr(last, sort_column.key), getattr(last, id_column.key)
+        )
+    return items
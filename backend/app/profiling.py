@@ -0,0 +1,210 @@
+"""
+Parça parça dataset profili
+
+Import sırasında her parça (DataFrame) geldikçe kolon istatistikleri
+güncellenir; bellek kullanımı satır sayısından bağımsızdır:
+- count, mean, varyans: Welford/Chan birleştirmesi (parça başına
+  vektörel hesaplanıp toplam ile birleştirilir)
+- min/max: kesin
+- farklı değer sayısı: HyperLogLog (yaklaşık, ~%1 hata)
+- çeyrekler: sabit boyutlu rastgele örneklem (bottom-k reservoir)
+
+Sonuç mevcut columns_json / stats_json biçiminde döner.
+"""
+import math
+from typing import Dict, List, Optional
+
+# HyperLogLog hassasiyeti: 2^14 kayıt (kolon başına 16KB)
+HLL_PRECISION = 14
+# Çeyrekler için örneklem boyutu
+RESERVOIR_SIZE = 10_000
+QUANTILES = (0.25, 0.5, 0.75)
+
+
+class RunningStats:
+    """Sayı, ortalama, varyans (M2), min, max"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def update(self, values):
+        """Boş olmayan float64 değerleri ekle (Chan paralel birleştirme)"""
+        n = len(values)
+        if n == 0:
+            return
+        mean = float(values.mean())
+        m2 = float(((values - mean) ** 2).sum())
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta * delta * self.count * n / total
+        self.count = total
+        low, high = float(values.min()), float(values.max())
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+    @property
+    def std(self) -> Optional[float]:
+        """Örneklem standart sapması (pandas describe ile aynı, ddof=1)"""
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else None
+
+
+class HyperLogLog:
+    """Yaklaşık farklı değer sayısı"""
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        import numpy as np
+
+        self.p = precision
+        self.m = 1 << precision
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def update_hashes(self, hashes):
+        """64-bit hash'leri (uint64 dizisi) ekle"""
+        import numpy as np
+
+        if len(hashes) == 0:
+            return
+        index = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = hashes << np.uint64(self.p)
+        rank = np.minimum(_leading_zeros(rest) + 1, 64 - self.p + 1).astype(np.uint8)
+        np.maximum.at(self.registers, index, rank)
+
+    def update(self, series):
+        """Serinin boş olmayan değerlerini ekle"""
+        import pandas as pd
+
+        values = series.dropna()
+        self.update_hashes(pd.util.hash_pandas_object(values, index=False).to_numpy())
+
+    def estimate(self) -> int:
+        import numpy as np
+
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        harmonic = float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int64))))
+        raw = alpha * self.m * self.m / harmonic
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * self.m and zeros:
+            # Küçük kümeler: doğrusal sayım
+            raw = self.m * math.log(self.m / zeros)
+        return int(round(raw))
+
+
+def _leading_zeros(values):
+    """uint64 dizisinde baştaki sıfır bit sayısı"""
+    import numpy as np
+
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    with np.errstate(divide="ignore"):
+        # 32 bitlik değerler float64'te kesin: floor(log2) bit uzunluğu - 1
+        high_zeros = 31 - np.floor(np.log2(high))
+        low_zeros = 63 - np.floor(np.log2(low))
+    return np.where(high > 0, high_zeros, np.where(low > 0, low_zeros, 64)).astype(np.int64)
+
+
+class ReservoirSample:
+    """Sabit boyutlu düzgün rastgele örneklem (rastgele anahtarla bottom-k)"""
+
+    def __init__(self, size: int = RESERVOIR_SIZE, seed: int = 0):
+        import numpy as np
+
+        self.size = size
+        self._rng = np.random.default_rng(seed)
+        self.keys = np.empty(0)
+        self.values = np.empty(0)
+
+    def update(self, values):
+        import numpy as np
+
+        keys = np.concatenate([self.keys, self._rng.random(len(values))])
+        merged = np.concatenate([self.values, values])
+        if len(keys) > self.size:
+            keep = np.argpartition(keys, self.size)[:self.size]
+            keys, merged = keys[keep], merged[keep]
+        self.keys, self.values = keys, merged
+
+    def quantiles(self, points=QUANTILES) -> Dict[str, float]:
+        import numpy as np
+
+        if len(self.values) == 0:
+            return {}
+        return {
+            f"{int(q * 100)}%": float(v)
+            for q, v in zip(points, np.quantile(self.values, points))
+        }
+
+
+class ColumnProfile:
+    """Tek kolonun parça parça güncellenen profili"""
+
+    def __init__(self):
+        self.dtypes: List[str] = []
+        self.non_null = 0
+        self.distinct = HyperLogLog()
+        self.numeric = True  # tüm parçalarda sayısal mı (bool hariç)
+        self.stats = RunningStats()
+        self.sample = ReservoirSample()
+
+    def update(self, series):
+        dtype = str(series.dtype)
+        if dtype not in self.dtypes:
+            self.dtypes.append(dtype)
+        self.non_null += int(series.count())
+        self.distinct.update(series)
+        if series.dtype.kind not in "iuf":
+            self.numeric = False
+        if self.numeric:
+            values = series.dropna().to_numpy(dtype="float64")
+            self.stats.update(values)
+            self.sample.update(values)
+
+    @property
+    def dtype(self) -> str:
+        """Tüm parçaları kapsayan tip (int+float → float64, karışık → object)"""
+        if len(self.dtypes) == 1:
+            return self.dtypes[0]
+        if self.numeric:
+            return "float64"
+        return "object"
+
+
+class DatasetProfile:
+    """Parça parça dataset profili"""
+
+    def __init__(self):
+        self.columns: Dict[str, ColumnProfile] = {}
+        self.row_count = 0
+
+    def update(self, chunk):
+        for name in chunk.columns:
+            self.columns.setdefault(name, ColumnProfile()).update(chunk[name])
+        self.row_count += len(chunk)
+
+    def columns_json(self) -> dict:
+        return {
+            name: {
+                "dtype": column.dtype,
+                "non_null": column.non_null,
+                "unique": column.distinct.estimate(),
+            }
+            for name, column in self.columns.items()
+        }
+
+    def stats_json(self) -> dict:
+        """Sadece numerik kolonlar"""
+        return {
+            name: {
+                "mean": column.stats.mean if column.stats.count else None,
+                "std": column.stats.std,
+                "min": column.stats.min,
+                "max": column.stats.max,
+                "quantiles": column.sample.quantiles(),
+            }
+            for name, column in self.columns.items()
+            if column.numeric
+        }
@@ -0,0 +1,71 @@
+"""
+Proje depolama kullanımı ve kotaları
+
+Kullanım stat_counters'taki depolama defterinden okunur (tam tablo
+taraması yok). Kotası olan projeye yükleme, yeni dosya kotayı aşacaksa
+413 ile reddedilir; kontrol kaydı yazan transaction içinde yapılır.
+"""
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+from sqlmodel import Session, select
+
+from app.models import Entry, Experiment, Project, StatCounter
+from app.stats import EXPERIMENT_SCOPE, PROJECT_SCOPE, STORAGE_METRICS
+
+
+def usage_breakdown(session: Session, scope: str, scope_id: int) -> Dict[str, int]:
+    """Kapsamın metrik bazında depolama kullanımı ve toplamı"""
+    rows = dict(session.exec(
+        select(StatCounter.metric, StatCounter.value).where(
+            StatCounter.scope == scope,
+            StatCounter.scope_id == scope_id,
+            StatCounter.metric.in_(STORAGE_METRICS),
+        )
+    ).all())
+    breakdown = {metric: rows.get(metric, 0) for metric in STORAGE_METRICS}
+    breakdown["used_bytes"] = sum(breakdown.values())
+    return breakdown
+
+
+def project_storage(session: Session, project: Project) -> dict:
+    """Proje ve deneylerinin depolama kullanımı"""
+    usage = usage_breakdown(session, PROJECT_SCOPE, project.id)
+    experiments = session.exec(
+        select(Experiment.id, Experiment.title).where(Experiment.project_id == project.id)
+    ).all()
+    return {
+        "project_id": project.id,
+        "quota_bytes": project.storage_quota_bytes,
+        **usage,
+        "experiments": sorted(
+            (
+                {"experiment_id": experiment_id, "title": title,
+                 **usage_breakdown(session, EXPERIMENT_SCOPE, experiment_id)}
+                for experiment_id, title in experiments
+            ),
+            key=lambda item: item["used_bytes"],
+            reverse=True,
+        ),
+    }
+
+
+def entry_project(session: Session, entry: Entry) -> Optional[Project]:
+    experiment = session.get(Experiment, entry.experiment_id)
+    return session.get(Project, experiment.project_id) if experiment else None
+
+
+def check_quota(session: Session, entry: Entry, incoming_bytes: int):
+    """Entry'nin projesine incoming_bytes eklenirse kota aşılıyor mu? (aşılıyorsa 413)"""
+    project = entry_project(session, entry)
+    if project is None or project.storage_quota_bytes is None:
+        return
+    used = usage_breakdown(session, PROJECT_SCOPE, project.id)["used_bytes"]
+    if used + incoming_bytes > project.storage_quota_bytes:
+        raise HTTPException(
+            status_code=413,
+            detail=(
+                f"Proje depolama kotası aşıldı: {used + incoming_bytes} / "
+                f"{project.storage_quota_bytes} byte"
+            ),
+        )
@@ -0,0 +1,226 @@
+"""
+İçerik adresli dosyalar için HTTP yanıtları
+
+Dosyalar SHA-256 ile adreslendiği için içerik hiç değişmez: ETag
+doğrudan hash'ten üretilir (strong), yanıtlar immutable olarak
+önbelleğe alınabilir. If-None-Match ile 304, tek aralıklı Range
+istekleri için 206 (If-Range destekli) döndürülür.
+
+gzip ile saklanan dosyalar, istemci kabul ediyorsa olduğu gibi
+(Content-Encoding: gzip) gönderilir; aksi halde veya Range isteğinde
+akış halinde açılarak gönderilir.
+"""
+import mimetypes
+import os
+import re
+from pathlib import Path
+from typing import Optional, Tuple
+from urllib.parse import quote
+
+import anyio
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+from app.storage import is_compressed, iter_stored
+
+# İçerik değişmediği için bir yıl, yeniden doğrulamasız
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def guess_media_type(filename: str, fallback_ext: str = "") -> str:
+    """Dosya adından (yoksa uzantıdan) MIME tipi"""
+    media_type, _ = mimetypes.guess_type(filename)
+    if media_type is None and fallback_ext:
+        media_type, _ = mimetypes.guess_type(f"file.{fallback_ext}")
+    return media_type or "application/octet-stream"
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """If-None-Match / If-Range başlığı ETag ile eşleşiyor mu?"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return etag in candidates
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Tek aralıklı 'bytes=' başlığını (başlangıç, bitiş dahil) çiftine çevir
+
+    Başlık anlaşılmazsa veya birden fazla aralık içeriyorsa None döner
+    (tüm dosya gönderilir). Karşılanamayan aralık için ValueError.
+    """
+    match = _RANGE.match(header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        # bytes=-N: son N byte
+        length = int(end)
+        if length == 0:
+            raise ValueError("boş aralık")
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError("karşılanamayan aralık")
+    return start, end
+
+
+class FileRangeResponse(FileResponse):
+    """Dosyanın yalnızca [start, end] aralığını gönderen 206 yanıtı"""
+
+    def __init__(self, path, start: int, end: int, stat_result: os.stat_result, **kwargs):
+        super().__init__(path, status_code=206, stat_result=stat_result, **kwargs)
+        self.start = start
+        self.end = end
+        self.headers["content-range"] = f"bytes {start}-{end}/{stat_result.st_size}"
+        self.headers["content-length"] = str(end - start + 1)
+
+    async def __call__(self, scope, receive, send):
+        await send({
+            "type": "http.response.start", "status": self.status_code, "headers": self.raw_headers,
+        })
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        remaining = self.end - self.start + 1
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.start)
+            while remaining > 0:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({
+                    "type": "http.response.body", "body": chunk, "more_body": remaining > 0,
+                })
+        if remaining > 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def accepts_gzip(request: Request) -> bool:
+    """Accept-Encoding gzip içeriyor mu (q=0 hariç)?"""
+    for item in request.headers.get("accept-encoding", "").split(","):
+        coding, _, params = item.partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+def _content_disposition(filename: str, disposition_type: str) -> str:
+    """FileResponse ile aynı biçimde Content-Disposition"""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"{disposition_type}; filename*=utf-8''{quoted}"
+    return f'{disposition_type}; filename="{filename}"'
+
+
+def _compressed_response(
+    request: Request,
+    path: Path,
+    sha256: str,
+    headers: dict,
+    filename: str,
+    media_type: str,
+    content_disposition_type: str,
+    size: int,
+) -> Response:
+    """gzip ile saklanan dosya: olduğu gibi veya açılarak gönder"""
+    etag = headers["etag"]
+    headers["vary"] = "Accept-Encoding"
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    use_range = range_header and (not if_range or etag_matches(if_range, etag))
+
+    if accepts_gzip(request) and not use_range:
+        # Sıkıştırılmış temsilin ETag'i farklı olmalı
+        headers["etag"] = f'"{sha256}.gz"'
+        headers["content-encoding"] = "gzip"
+        return FileResponse(
+            path, headers=headers, media_type=media_type, filename=filename,
+            content_disposition_type=content_disposition_type,
+        )
+
+    headers["content-disposition"] = _content_disposition(filename, content_disposition_type)
+    start, length, status_code = 0, size, 200
+    if use_range:
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            headers["content-range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+        if byte_range is not None:
+            start, end = byte_range
+            length, status_code = end - start + 1, 206
+            headers["content-range"] = f"bytes {start}-{end}/{size}"
+    headers["content-length"] = str(length)
+    if request.method.upper() == "HEAD":
+        return Response(status_code=status_code, headers=headers, media_type=media_type)
+    return StreamingResponse(
+        iter_stored(path, start, length),
+        status_code=status_code,
+        headers=headers,
+        media_type=media_type,
+    )
+
+
+def content_response(
+    request: Request,
+    path: Path,
+    sha256: str,
+    filename: str,
+    media_type: Optional[str] = None,
+    content_disposition_type: str = "attachment",
+    size: Optional[int] = None,
+) -> Response:
+    """Hash'li dosya için 200/206/304/416 yanıtı
+
+    size: açılmış içeriğin boyutu (gzip ile saklanan dosyalar için gerekli)
+    """
+    etag = f'"{sha256}"'
+    headers = {
+        "etag": etag,
+        "cache-control": IMMUTABLE_CACHE_CONTROL,
+        "accept-ranges": "bytes",
+    }
+
+    compressed = is_compressed(path)
+    if etag_matches(request.headers.get("if-none-match"), etag) or (
+        compressed and etag_matches(request.headers.get("if-none-match"), f'"{sha256}.gz"')
+    ):
+        if compressed:
+            headers["vary"] = "Accept-Encoding"
+        return Response(status_code=304, headers=headers)
+
+    media_type = media_type or guess_media_type(filename)
+    if compressed:
+        return _compressed_response(
+            request, path, sha256, headers, filename, media_type, content_disposition_type,
+            size if size is not None else sum(len(chunk) for chunk in iter_stored(path)),
+        )
+    stat_result = os.stat(path)
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or etag_matches(if_range, etag)):
+        try:
+            byte_range = parse_range(range_header, stat_result.st_size)
+        except ValueError:
+            headers["content-range"] = f"bytes */{stat_result.st_size}"
+            return Response(status_code=416, headers=headers)
+        if byte_range is not None:
+            return FileRangeResponse(
+                path, *byte_range, stat_result,
+                headers=headers, media_type=media_type, filename=filename,
+                content_disposition_type=content_disposition_type,
+            )
+
+    return FileResponse(
+        path, headers=headers, media_type=media_type, filename=filename,
+        stat_result=stat_result, content_disposition_type=content_disposition_type,
+    )
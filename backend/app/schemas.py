@@ -30,12 +30,17 @@ class ProjectBase(BaseModel):
     name: str = Field(min_length=1, max_length=200)
     description: Optional[str] = None
     tags: List[str] = Field(default_factory=list)
+    storage_quota_bytes: Optional[int] = Field(default=None, ge=0)
 
 
 class ProjectCreate(ProjectBase):
     created_by: int
 
 
+class ProjectQuotaUpdate(BaseModel):
+    storage_quota_bytes: Optional[int] = Field(default=None, ge=0)  # None: sınırsız
+
+
 class ProjectRead(ProjectBase):
     id: int
     created_by: int
@@ -92,6 +97,8 @@ class EntryRead(EntryBase):
     author_id: int
     version: int
     parent_version_id: Optional[int] = None
+    root_id: Optional[int] = None
+    is_head: bool = True
     created_at: datetime
     updated_at: datetime
     
@@ -113,11 +120,52 @@ class AttachmentRead(AttachmentBase):
     original_name: str
     sha256: str
     created_at: datetime
+    deleted_at: Optional[datetime] = None
     
     class Config:
         from_attributes = True
 
 
+class BatchUploadItem(BaseModel):
+    filename: str
+    status: str  # created, duplicate, error
+    attachment_id: Optional[int] = None
+    sha256: Optional[str] = None
+    detail: Optional[str] = None
+
+
+class BatchUploadResult(BaseModel):
+    entry_id: int
+    created: int
+    duplicates: int
+    failed: int
+    results: List[BatchUploadItem]
+
+
+# ========== Upload Session Schemas ==========
+class UploadSessionCreate(BaseModel):
+    entry_id: int
+    filename: str
+    total_size: int = Field(..., gt=0)
+    chunk_size: Optional[int] = None
+    sha256: Optional[str] = Field(None, min_length=64, max_length=64)
+    caption: Optional[str] = None
+
+
+class UploadSessionRead(BaseModel):
+    id: str
+    entry_id: int
+    filename: str
+    total_size: int
+    chunk_size: int
+    status: str
+    received_bytes: int
+    missing: List[List[int]]  # [ofset, boyut] çiftleri
+    attachment_id: Optional[int] = None
+    created_at: datetime
+    updated_at: datetime
+
+
 # ========== Dataset Schemas ==========
 class DatasetImportRequest(BaseModel):
     entry_id: int
@@ -130,6 +178,12 @@ class DatasetRead(BaseModel):
     entry_id: int
     name: str
     source_file: str
+    file_size: Optional[int] = None
+    stored_size: Optional[int] = None
+    encoding: Optional[str] = None
+    sha256: Optional[str] = None
+    columnar_path: Optional[str] = None
+    columnar_size: Optional[int] = None
     columns_json: dict
     stats_json: dict
     row_count: int
@@ -157,6 +211,9 @@ class ChartRead(BaseModel):
     y_column: str
     title: Optional[str] = None
     image_path: str
+    file_size: Optional[int] = None
+    point_count: Optional[int] = None
+    rendered_point_count: Optional[int] = None
     created_at: datetime
     
     class Config:
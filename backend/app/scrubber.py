@@ -0,0 +1,272 @@
+"""
+Depolama bütünlük denetimi
+
+Diskteki dosyaları veritabanı kayıtlarıyla karşılaştırır:
+- Blob dosyaları hash'lenir ve sha256 ile doğrulanır (paralel, I/O hız
+  sınırlı); uyuşmayanlar "corrupt" olarak raporlanır.
+- Dosyası olmayan kayıtlar (attachment, blob, dataset, kolon önbelleği,
+  chart, template)
+  "missing" olarak raporlanır.
+- Hiçbir kayda ait olmayan dosyalar "orphans" olarak raporlanır. Rapor
+  dosyaları veritabanında tutulmadığından çöp toplayıcının saklama
+  süresinden (REPORT_TTL) eskiyse sahipsiz sayılır.
+
+Denetim salt okunurdur; onarım yapmaz. Satırlar başta kısa bir sorguyla
+okunur, hash'leme sırasında veritabanı bağlantısı tutulmaz.
+"""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from sqlmodel import Session, select
+from starlette.concurrency import run_in_threadpool
+
+from app.columnar import MANIFEST_NAME
+from app.database import DATA_DIR
+from app.gc import ORPHAN_GRACE, REPORT_TTL
+from app.models import Attachment, Blob, Chart, Dataset, Template, UploadSession
+from app.stats import REPORT_DIR
+from app.storage import open_stored
+from app.thumbnails import THUMBNAIL_SIZES, derivative_path
+from app.uploads import part_path
+
+# Hash okuma hızı sınırı (MB/s) ve paralel iş parçacığı sayısı
+SCRUB_RATE_MB_S = float(os.getenv("SCRUB_RATE_MB_S", "50"))
+SCRUB_WORKERS = int(os.getenv("SCRUB_WORKERS", "4"))
+# 0: periyodik denetim kapalı
+SCRUB_INTERVAL_HOURS = float(os.getenv("SCRUB_INTERVAL_HOURS", "0"))
+
+# Taranan dizinler
+SCAN_ROOTS = [DATA_DIR / "storage", DATA_DIR / "templates"]
+TRANSIENT_DIRS = [DATA_DIR / "storage" / "tmp", DATA_DIR / "storage" / "uploads"]
+
+_READ_SIZE = 1024 * 1024
+
+
+class TokenBucket:
+    """Byte/saniye hız sınırı (iş parçacıkları arasında paylaşılır)"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: int):
+        """amount kadar token birikene kadar bekle (rate <= 0: sınırsız)"""
+        if self.rate <= 0:
+            return
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                wait = (amount - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def hash_limited(path: Path, bucket: TokenBucket) -> str:
+    """Dosyayı hız sınırı altında hash'le (gzip'li ise açılmış içeriği)"""
+    digest = hashlib.sha256()
+    with open_stored(path) as f:
+        while True:
+            bucket.acquire(_READ_SIZE)
+            chunk = f.read(_READ_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@dataclass
+class ScrubReport:
+    """Denetim sonucu"""
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    files_verified: int = 0
+    bytes_verified: int = 0
+    corrupt: List[dict] = field(default_factory=list)  # hash uyuşmayan blob'lar
+    missing: List[dict] = field(default_factory=list)  # dosyası olmayan kayıtlar
+    orphans: List[dict] = field(default_factory=list)  # kaydı olmayan dosyalar
+    orphan_bytes: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return not (self.corrupt or self.missing or self.orphans)
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data["ok"] = self.ok
+        return data
+
+
+def _load_references(session: Session) -> Dict[str, List[tuple]]:
+    """Dosya yolu tutan tüm kayıtlar (kısa, tek seferlik sorgular)"""
+    return {
+        "attachment": session.exec(
+            select(Attachment.id, Attachment.file_path, Attachment.sha256)
+        ).all(),
+        "blob": session.exec(select(Blob.sha256, Blob.file_path, Blob.size)).all(),
+        "dataset": session.exec(select(Dataset.id, Dataset.source_file)).all(),
+        "columnar": session.exec(
+            select(Dataset.id, Dataset.columnar_path).where(Dataset.columnar_path.is_not(None))
+        ).all(),
+        "chart": session.exec(select(Chart.id, Chart.image_path)).all(),
+        "template": session.exec(select(Template.id, Template.file_path)).all(),
+        "upload": session.exec(select(UploadSession.id)).all(),
+    }
+
+
+def _is_recent(path: Path, now: float, grace: timedelta) -> bool:
+    return now - path.stat().st_mtime < grace.total_seconds()
+
+
+def scrub(engine, rate_mb_s: float = SCRUB_RATE_MB_S, workers: int = SCRUB_WORKERS) -> ScrubReport:
+    """Tam denetim çalıştır"""
+    report = ScrubReport(started_at=datetime.utcnow())
+    with Session(engine) as session:
+        refs = _load_references(session)
+
+    blob_shas = {sha for sha, _, _ in refs["blob"]}
+    referenced: Set[Path] = set()
+
+    # Dosyası olmayan kayıtlar
+    for kind in ("dataset", "chart", "template"):
+        for row_id, rel in refs[kind]:
+            path = DATA_DIR / rel
+            referenced.add(path)
+            if not path.exists():
+                report.missing.append({"kind": kind, "id": row_id, "path": rel})
+    for dataset_id, rel in refs["columnar"]:
+        directory = DATA_DIR / rel
+        if not (directory / MANIFEST_NAME).exists():
+            report.missing.append({"kind": "columnar", "id": dataset_id, "path": rel})
+        elif directory.is_dir():
+            referenced.update(directory.iterdir())
+    for attachment_id, rel, sha in refs["attachment"]:
+        referenced.add(DATA_DIR / rel)
+        if sha not in blob_shas:
+            report.missing.append({
+                "kind": "attachment", "id": attachment_id, "path": rel, "detail": "blob kaydı yok",
+            })
+        elif not (DATA_DIR / rel).exists():
+            report.missing.append({"kind": "attachment", "id": attachment_id, "path": rel})
+
+    to_verify = []
+    for sha, rel, size in refs["blob"]:
+        path = DATA_DIR / rel
+        referenced.add(path)
+        referenced.update(derivative_path(sha, name) for name in THUMBNAIL_SIZES)
+        if path.exists():
+            to_verify.append((sha, rel, path))
+        else:
+            report.missing.append({"kind": "blob", "id": sha, "path": rel})
+    referenced.update(part_path(upload_id) for upload_id in refs["upload"])
+
+    # Blob içeriklerini paralel ve hız sınırlı doğrula
+    bucket = TokenBucket(rate_mb_s * 1024 * 1024)
+
+    def verify(item):
+        sha, rel, path = item
+        try:
+            return sha, rel, hash_limited(path, bucket), path.stat().st_size
+        except OSError as e:
+            return sha, rel, f"okunamadı: {e}", 0
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        for sha, rel, actual, size in pool.map(verify, to_verify):
+            report.files_verified += 1
+            report.bytes_verified += size
+            if actual != sha:
+                report.corrupt.append({"kind": "blob", "id": sha, "path": rel, "actual": actual})
+
+    # Kaydı olmayan dosyalar
+    now = time.time()
+    for root in SCAN_ROOTS:
+        if not root.exists():
+            continue
+        for path in root.rglob("*"):
+            if not path.is_file() or path in referenced:
+                continue
+            # Raporlar çöp toplayıcı silene kadar (REPORT_TTL) beklenen dosyalardır
+            if REPORT_DIR in path.parents and _is_recent(path, now, REPORT_TTL):
+                continue
+            transient = any(d in path.parents for d in TRANSIENT_DIRS)
+            if transient and _is_recent(path, now, ORPHAN_GRACE):
+                continue
+            size = path.stat().st_size
+            report.orphans.append({"path": str(path.relative_to(DATA_DIR)), "size": size})
+            report.orphan_bytes += size
+
+    report.finished_at = datetime.utcnow()
+    return report
+
+
+class Scrubber:
+    """Arka planda tek seferde bir denetim çalıştırır, son raporu tutar"""
+
+    def __init__(self):
+        self.last_report: Optional[ScrubReport] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def run(self, engine, **kwargs) -> ScrubReport:
+        """Denetimi bu iş parçacığında çalıştır"""
+        report = scrub(engine, **kwargs)
+        self.last_report = report
+        return report
+
+    def start(self, engine, **kwargs) -> bool:
+        """Arka planda başlat; zaten çalışıyorsa False"""
+        with self._lock:
+            if self.running:
+                return False
+            self._thread = threading.Thread(
+                target=self.run,
+                args=(engine,),
+                kwargs=kwargs,
+                name="storage-scrubber",
+                daemon=True,
+            )
+            self._thread.start()
+            return True
+
+    def status(self) -> dict:
+        return {
+            "running": self.running,
+            "last_report": self.last_report.to_dict() if self.last_report else None,
+        }
+
+
+scrubber = Scrubber()
+
+
+async def scrub_loop(engine):
+    """Periyodik denetim (SCRUB_INTERVAL_HOURS > 0 ise lifespan'de çalışır)"""
+    while True:
+        await asyncio.sleep(SCRUB_INTERVAL_HOURS * 3600)
+        try:
+            report = await run_in_threadpool(scrubber.run, engine)
+            if not report.ok:
+                print(
+                    f"⚠️ Depolama denetimi: {len(report.corrupt)} bozuk, "
+                    f"{len(report.missing)} eksik, {len(report.orphans)} sahipsiz dosya"
+                )
+        except Exception as e:
+            print(f"⚠️ Depolama denetimi başarısız: {e}")
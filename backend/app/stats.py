@@ -0,0 +1,349 @@
+"""
+Dashboard istatistik sayaçları ve depolama defteri
+
+Sayaçlar stat_counters tablosunda global, proje ve deney kapsamında
+tutulur ve her flush sonrasında eklenen/silinen kayıtlara göre aynı
+transaction içinde artırılır; dashboard ve depolama kullanımı tam tablo
+taraması yapmadan okunur. *_bytes metrikleri depolama defteridir
+(attachment, dataset, grafik ve rapor dosyaları). Veritabanında kaydı
+olmayan rapor dosyaları charge_report ile elle işlenir.
+
+Sayaç tablosu boşsa veya sayaç şeması değiştiyse rebuild_counters
+mevcut verilerden bir kez hesaplar.
+"""
+import re
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event, inspect, text, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select, func
+
+from app.database import DATA_DIR
+from app.models import (
+    Project, Experiment, Entry, Attachment, Blob, Dataset, Chart, AuditLog, StatCounter,
+)
+
+GLOBAL_SCOPE = "global"
+PROJECT_SCOPE = "project"
+EXPERIMENT_SCOPE = "experiment"
+META_SCOPE = "meta"
+
+# Metrikler veya kapsamlar değiştiğinde artırılır: sayaçlar yeniden hesaplanır
+COUNTERS_VERSION = 2
+
+# Proje kullanımına giren depolama metrikleri
+STORAGE_METRICS = ("attachment_bytes", "dataset_bytes", "chart_bytes", "report_bytes")
+
+REPORT_DIR = DATA_DIR / "storage" / "reports"
+_REPORT_NAME = re.compile(r"^report_entry_(\d+)_")
+
+_ENTRY_SCOPE_SQL = (
+    "SELECT x.project_id, x.id FROM entries e JOIN experiments x ON x.id = e.experiment_id "
+    "WHERE e.id = :id"
+)
+
+# Entity → (proje id, deney id) sorgusu (parent kolon değeri ile)
+_SCOPE_LOOKUP = {
+    Entry: (
+        "experiment_id",
+        "SELECT project_id, id FROM experiments WHERE id = :id",
+    ),
+    Attachment: ("entry_id", _ENTRY_SCOPE_SQL),
+    Dataset: ("entry_id", _ENTRY_SCOPE_SQL),
+    Chart: (
+        "dataset_id",
+        "SELECT x.project_id, x.id FROM datasets d JOIN entries e ON e.id = d.entry_id "
+        "JOIN experiments x ON x.id = e.experiment_id WHERE d.id = :id",
+    ),
+}
+
+# Son aktivite pencereleri
+ACTIVITY_WINDOWS = {"last_24h": timedelta(hours=24), "last_7d": timedelta(days=7)}
+
+
+def _metrics(obj) -> List[Tuple[str, int]]:
+    """Kaydın katkı yaptığı sayaçlar (metrik, miktar)"""
+    if isinstance(obj, Project):
+        return [("projects", 1)]
+    if isinstance(obj, Experiment):
+        return [("experiments", 1)]
+    if isinstance(obj, Entry):
+        # Mantıksal entry: sadece zincirin ilk versiyonu sayılır
+        return [("entries", 1)] if obj.parent_version_id is None else []
+    if isinstance(obj, Attachment):
+        return [("attachments", 1), ("attachment_bytes", obj.file_size or 0)]
+    if isinstance(obj, Blob):
+        stored = obj.stored_size if obj.stored_size is not None else obj.size
+        return [("blobs", 1), ("blob_bytes", stored or 0)]
+    if isinstance(obj, Dataset):
+        stored = obj.stored_size if obj.stored_size is not None else obj.file_size
+        return [("datasets", 1), ("dataset_bytes", (stored or 0) + (obj.columnar_size or 0))]
+    if isinstance(obj, Chart):
+        return [("charts", 1), ("chart_bytes", obj.file_size or 0)]
+    return []
+
+
+def _scope_ids(connection, obj, cache: Dict) -> Tuple[Optional[int], Optional[int]]:
+    """Kaydın ait olduğu (proje, deney)"""
+    if isinstance(obj, Project):
+        return obj.id, None
+    if isinstance(obj, Experiment):
+        return obj.project_id, None
+    if isinstance(obj, Blob):
+        return None, None  # blob'lar projeler arasında paylaşılır
+    column, sql = _SCOPE_LOOKUP[type(obj)]
+    parent_id = getattr(obj, column)
+    key = (column, parent_id)
+    if key not in cache:
+        cache[key] = tuple(connection.execute(text(sql), {"id": parent_id}).first() or (None, None))
+    return cache[key]
+
+
+def _add_deltas(
+    deltas: Dict,
+    project_id: Optional[int],
+    experiment_id: Optional[int],
+    metric: str,
+    amount: int,
+):
+    deltas[(GLOBAL_SCOPE, 0, metric)] += amount
+    if project_id is not None:
+        deltas[(PROJECT_SCOPE, project_id, metric)] += amount
+    if experiment_id is not None:
+        deltas[(EXPERIMENT_SCOPE, experiment_id, metric)] += amount
+
+
+def bump_counters(connection, deltas: Dict[Tuple[str, int, str], int]):
+    """Sayaçlara farkları uygula (upsert)"""
+    rows = [
+        {"scope": scope, "scope_id": scope_id, "metric": metric, "value": value}
+        for (scope, scope_id, metric), value in deltas.items()
+        if value
+    ]
+    if not rows:
+        return
+    statement = sqlite_insert(StatCounter)
+    statement = statement.on_conflict_do_update(
+        index_elements=["scope", "scope_id", "metric"],
+        set_={"value": StatCounter.value + statement.excluded.value},
+    )
+    connection.execute(statement, rows)
+
+
+def _trash_change(obj) -> int:
+    """Çöp kutusuna taşındıysa -1, geri alındıysa +1, değişmediyse 0"""
+    history = inspect(obj).attrs.deleted_at.history
+    if not history.has_changes():
+        return 0
+    was_trashed = bool(history.deleted and history.deleted[0] is not None)
+    is_trashed = obj.deleted_at is not None
+    if was_trashed == is_trashed:
+        return 0
+    return -1 if is_trashed else 1
+
+
+@event.listens_for(Session, "after_flush")
+def _count_after_flush(session, flush_context):
+    """Eklenen/silinen kayıtlar için sayaçları aynı transaction'da güncelle
+
+    Çöp kutusundaki attachment'lar sayılmaz: çöpe atma sayaçtan düşer,
+    geri alma ekler, kalıcı silme (gc) tekrar düşmez.
+    """
+    changes = [(obj, 1) for obj in session.new if getattr(obj, "deleted_at", None) is None]
+    changes += [(obj, -1) for obj in session.deleted if getattr(obj, "deleted_at", None) is None]
+    changes += [
+        (obj, sign) for obj in session.dirty
+        if isinstance(obj, Attachment) and (sign := _trash_change(obj))
+    ]
+    changes = [(obj, sign) for obj, sign in changes if _metrics(obj)]
+    if not changes:
+        return
+
+    connection = session.connection()
+    deltas: Dict[Tuple[str, int, str], int] = defaultdict(int)
+    cache: Dict = {}
+    for obj, sign in changes:
+        project_id, experiment_id = _scope_ids(connection, obj, cache)
+        for metric, amount in _metrics(obj):
+            _add_deltas(deltas, project_id, experiment_id, metric, sign * amount)
+    bump_counters(connection, deltas)
+
+
+def report_entry_id(filename: str) -> Optional[int]:
+    """Rapor dosya adındaki entry id (report_entry_<id>_...)"""
+    match = _REPORT_NAME.match(filename)
+    return int(match.group(1)) if match else None
+
+
+def _entry_scope(connection, entry_id: int) -> Tuple[Optional[int], Optional[int]]:
+    """Entry'nin (proje id, deney id) ikilisi"""
+    row = connection.execute(text(_ENTRY_SCOPE_SQL), {"id": entry_id}).first()
+    return row or (None, None)
+
+
+def charge_report(session: Session, entry_id: int, size: int):
+    """Rapor dosyasını deftere işle (silinirken negatif size); commit çağırana aittir"""
+    connection = session.connection()
+    project_id, experiment_id = _entry_scope(connection, entry_id)
+    deltas: Dict[Tuple[str, int, str], int] = defaultdict(int)
+    _add_deltas(deltas, project_id, experiment_id, "report_bytes", size)
+    bump_counters(connection, deltas)
+
+
+# Tam yeniden hesaplama sorguları:
+# (metrik, global sorgu, (proje id, deney id, değer) döndüren sorgu veya None)
+_ENTRY_JOIN = (
+    "JOIN entries e ON e.id = {alias}.entry_id JOIN experiments x ON x.id = e.experiment_id"
+)
+_REBUILD_QUERIES = [
+    ("projects", "SELECT COUNT(*) FROM projects",
+     "SELECT id, NULL, 1 FROM projects"),
+    ("experiments", "SELECT COUNT(*) FROM experiments",
+     "SELECT project_id, NULL, COUNT(*) FROM experiments GROUP BY project_id"),
+    ("entries", "SELECT COUNT(*) FROM entries WHERE parent_version_id IS NULL",
+     "SELECT x.project_id, x.id, COUNT(*) FROM entries e "
+     "JOIN experiments x ON x.id = e.experiment_id "
+     "WHERE e.parent_version_id IS NULL GROUP BY x.id"),
+    ("attachments", "SELECT COUNT(*) FROM attachments WHERE deleted_at IS NULL",
+     "SELECT x.project_id, x.id, COUNT(*) FROM attachments a "
+     + _ENTRY_JOIN.format(alias="a") + " WHERE a.deleted_at IS NULL GROUP BY x.id"),
+    ("attachment_bytes",
+     "SELECT COALESCE(SUM(file_size), 0) FROM attachments WHERE deleted_at IS NULL",
+     "SELECT x.project_id, x.id, SUM(a.file_size) FROM attachments a "
+     + _ENTRY_JOIN.format(alias="a") + " WHERE a.deleted_at IS NULL GROUP BY x.id"),
+    ("blobs", "SELECT COUNT(*) FROM blobs", None),
+    ("blob_bytes", "SELECT COALESCE(SUM(COALESCE(stored_size, size)), 0) FROM blobs", None),
+    ("datasets", "SELECT COUNT(*) FROM datasets",
+     "SELECT x.project_id, x.id, COUNT(*) FROM datasets d " + _ENTRY_JOIN.format(alias="d") +
+     " GROUP BY x.id"),
+    ("dataset_bytes",
+     "SELECT COALESCE(SUM("
+     "COALESCE(stored_size, file_size, 0) + COALESCE(columnar_size, 0)), 0) FROM datasets",
+     "SELECT x.project_id, x.id, SUM("
+     "COALESCE(d.stored_size, d.file_size, 0) + COALESCE(d.columnar_size, 0)) FROM datasets d "
+     + _ENTRY_JOIN.format(alias="d") + " GROUP BY x.id"),
+    ("charts", "SELECT COUNT(*) FROM charts",
+     "SELECT x.project_id, x.id, COUNT(*) FROM charts c JOIN datasets d ON d.id = c.dataset_id " +
+     _ENTRY_JOIN.format(alias="d") + " GROUP BY x.id"),
+    ("chart_bytes", "SELECT COALESCE(SUM(COALESCE(file_size, 0)), 0) FROM charts",
+     "SELECT x.project_id, x.id, SUM(COALESCE(c.file_size, 0)) FROM charts c "
+     "JOIN datasets d ON d.id = c.dataset_id " + _ENTRY_JOIN.format(alias="d") + " GROUP BY x.id"),
+]
+
+
+def _report_sizes() -> Dict[int, int]:
+    """Diskteki rapor dosyaları: entry id → toplam byte"""
+    sizes: Dict[int, int] = defaultdict(int)
+    if REPORT_DIR.exists():
+        for path in REPORT_DIR.iterdir():
+            entry_id = report_entry_id(path.name)
+            if entry_id is not None and path.is_file():
+                sizes[entry_id] += path.stat().st_size
+    return sizes
+
+
+def recompute_counters(connection):
+    """Tüm sayaçları mevcut verilerden yeniden hesapla (commit çağırana aittir)"""
+    connection.execute(delete(StatCounter))
+    deltas: Dict[Tuple[str, int, str], int] = defaultdict(int)
+    for metric, global_sql, scoped_sql in _REBUILD_QUERIES:
+        deltas[(GLOBAL_SCOPE, 0, metric)] = connection.execute(text(global_sql)).scalar() or 0
+        if scoped_sql is None:
+            continue
+        for project_id, experiment_id, value in connection.execute(text(scoped_sql)).all():
+            deltas[(PROJECT_SCOPE, project_id, metric)] += value or 0
+            if experiment_id is not None:
+                deltas[(EXPERIMENT_SCOPE, experiment_id, metric)] += value or 0
+    # Rapor dosyalarının kaydı yok: diskten
+    for entry_id, size in _report_sizes().items():
+        project_id, experiment_id = _entry_scope(connection, entry_id)
+        _add_deltas(deltas, project_id, experiment_id, "report_bytes", size)
+    deltas[(META_SCOPE, 0, "version")] = COUNTERS_VERSION
+    bump_counters(connection, deltas)
+
+
+def rebuild_counters(engine, force: bool = False) -> bool:
+    """Sayaçlar yoksa veya eski şemadaysa mevcut verilerden hesapla, hesapladıysa True"""
+    with engine.begin() as connection:
+        version = connection.execute(
+            select(StatCounter.value).where(
+                StatCounter.scope == META_SCOPE, StatCounter.metric == "version"
+            )
+        ).scalar()
+        if version == COUNTERS_VERSION and not force:
+            return False
+        recompute_counters(connection)
+        return True
+
+
+def backfill_file_sizes(engine) -> int:
+    """Boyutu kaydedilmemiş eski dataset ve grafik dosyalarını ölç, güncellenen sayısını döndür"""
+    updated = 0
+    with engine.begin() as connection:
+        for table, path_column, size_column in (
+            ("datasets", "source_file", "stored_size"),
+            ("charts", "image_path", "file_size"),
+        ):
+            rows = connection.execute(
+                text(f"SELECT id, {path_column} FROM {table} WHERE {size_column} IS NULL")
+            ).all()
+            for row_id, relative in rows:
+                path = DATA_DIR / relative
+                size = path.stat().st_size if path.exists() else 0
+                connection.execute(
+                    text(f"UPDATE {table} SET {size_column} = :size WHERE id = :id"),
+                    {"size": size, "id": row_id},
+                )
+            updated += len(rows)
+    return updated
+
+
+def read_stats(session: Session, now: Optional[datetime] = None) -> dict:
+    """Dashboard için sayaçlar, proje dökümü ve son aktivite"""
+    now = now or datetime.utcnow()
+    counters = session.exec(select(StatCounter)).all()
+
+    totals: Dict[str, int] = {}
+    per_project: Dict[int, Dict[str, int]] = defaultdict(dict)
+    for counter in counters:
+        if counter.scope == GLOBAL_SCOPE:
+            totals[counter.metric] = counter.value
+        elif counter.scope == PROJECT_SCOPE:
+            per_project[counter.scope_id][counter.metric] = counter.value
+
+    names = dict(session.exec(select(Project.id, Project.name)).all()) if per_project else {}
+    projects = [
+        {"project_id": project_id, "name": names.get(project_id), **metrics}
+        for project_id, metrics in sorted(per_project.items())
+        if project_id in names
+    ]
+
+    # Son aktivite: audit_logs.ts indeksi üzerinden aralık sayımı
+    activity = {}
+    for label, window in ACTIVITY_WINDOWS.items():
+        rows = session.exec(
+            select(AuditLog.entity, func.count())
+            .where(AuditLog.ts >= now - window)
+            .group_by(AuditLog.entity)
+        ).all()
+        activity[label] = {entity: count for entity, count in rows}
+
+    return {
+        "counts": {
+            metric: totals.get(metric, 0)
+            for metric in (
+                "projects", "experiments", "entries", "attachments", "datasets", "charts",
+            )
+        },
+        "storage": {
+            "attachment_bytes": totals.get("attachment_bytes", 0),  # mantıksal
+            "physical_bytes": totals.get("blob_bytes", 0),  # benzersiz blob'lar
+            "dataset_bytes": totals.get("dataset_bytes", 0),
+            "chart_bytes": totals.get("chart_bytes", 0),
+            "report_bytes": totals.get("report_bytes", 0),
+        },
+        "projects": projects,
+        "recent_activity": activity,
+    }
@@ -0,0 +1,316 @@
+"""
+Akışlı dosya depolama
+
+Yüklenen dosyalar parça parça storage altındaki geçici dizine yazılır;
+SHA-256 ve boyut yazarken hesaplanır, limit aşıldığında yükleme hemen
+kesilir. multipart gövdeler istek akışından doğrudan parse edilir
+(Starlette'in ara kopyası olmadan). Dosya yerine atomik os.replace ile taşınır, böylece yarım
+yazılmış dosya hiçbir zaman nihai yolda görünmez. Bellek kullanımı dosya
+boyutundan bağımsız olarak bir parça kadardır.
+
+Metin ağırlıklı tipler (csv, html) diske gzip ile sıkıştırılarak yazılır
+ve dosya adına .gz eki alır. Okuyucular open_stored/iter_stored ile akış
+halinde açar; pandas .gz ekinden sıkıştırmayı kendisi tanır.
+"""
+import gzip
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterator, Optional, Tuple
+
+from fastapi import HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+
+from app.database import DATA_DIR
+
+# Okuma/yazma parça boyutu
+CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+# multipart gövdesinde dosya dışı alanlar ve sınırlar için pay (Content-Length kontrolü)
+MULTIPART_OVERHEAD = 64 * 1024
+
+# Sıkıştırma: gzip veya none
+STORAGE_COMPRESSION = os.getenv("STORAGE_COMPRESSION", "gzip")
+COMPRESSIBLE_TYPES = {"csv", "html"}
+# Sıkıştırılmış boyut orijinalin bu oranından büyükse ham saklanır
+MAX_COMPRESSED_RATIO = 0.9
+GZIP_LEVEL = 6
+
+# Geçici dosyalar nihai dosyalarla aynı dosya sisteminde (atomik rename için)
+TMP_DIR = DATA_DIR / "storage" / "tmp"
+
+
+@dataclass
+class StagedFile:
+    """Geçici dizine yazılmış, henüz yerine taşınmamış dosya"""
+    path: Path
+    size: int
+    sha256: str
+
+    def discard(self):
+        """Geçici dosyayı sil"""
+        self.path.unlink(missing_ok=True)
+
+
+def _open_temp():
+    TMP_DIR.mkdir(parents=True, exist_ok=True)
+    fd, name = tempfile.mkstemp(dir=TMP_DIR, suffix=".part")
+    return os.fdopen(fd, "wb"), Path(name)
+
+
+def _too_large(max_size: int) -> HTTPException:
+    return HTTPException(
+        status_code=422,
+        detail=f"Dosya çok büyük. Maksimum boyut: {max_size / (1024*1024):.1f}MB",
+    )
+
+
+class _MultipartStager:
+    """multipart gövdesindeki tek dosya alanını geçici dosyaya yazan parser geri çağrıları
+
+    Diğer alanlar ve fazladan dosyalar atlanır. Dosya adı başlıklardan
+    okununca limit_for ile doğrulanır ve boyut limiti belirlenir.
+    """
+
+    def __init__(self, field: str, limit_for: Callable[[str], int]):
+        self.field = field.encode()
+        self.limit_for = limit_for
+        self.filename: Optional[str] = None
+        self.staged: Optional[StagedFile] = None
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._out = None
+        self._path: Optional[Path] = None
+        self._digest = None
+        self._size = 0
+        self._limit = 0
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_part_begin(self):
+        self._headers = {}
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = self._header_value = b""
+
+    def on_headers_finished(self):
+        from multipart.multipart import parse_options_header
+
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        filename = options.get(b"filename")
+        if options.get(b"name") != self.field or not filename or self.staged is not None:
+            return
+        self.filename = filename.decode("utf-8")
+        self._limit = self.limit_for(self.filename)
+        self._out, self._path = _open_temp()
+        self._digest = hashlib.sha256()
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._out is None:
+            return
+        self._size += end - start
+        if self._size > self._limit:
+            raise _too_large(self._limit)
+        chunk = data[start:end]
+        self._digest.update(chunk)
+        self._out.write(chunk)
+
+    def on_part_end(self):
+        if self._out is None:
+            return
+        self._out.close()
+        self._out = None
+        self.staged = StagedFile(path=self._path, size=self._size, sha256=self._digest.hexdigest())
+
+    def abort(self):
+        if self._out is not None:
+            self._out.close()
+        if self._path is not None:
+            self._path.unlink(missing_ok=True)
+
+
+async def stage_multipart(
+    request: Request,
+    field: str,
+    max_size: int,
+    limit_for: Optional[Callable[[str], int]] = None,
+) -> Tuple[str, StagedFile]:
+    """multipart/form-data gövdesindeki dosyayı gelirken geçici dosyaya yaz
+
+    Gövde Starlette tarafından önceden diske alınmaz; request.stream()
+    parça parça parse edilir, hash ve boyut yazarken hesaplanır.
+    Content-Length max_size'ı açıkça aşıyorsa gövde okunmadan, dosya
+    limit_for(dosya adı) (verilmezse max_size) sınırını aştığı anda 422
+    döner. (dosya adı, StagedFile) döndürür.
+    """
+    import multipart
+    from multipart.multipart import parse_options_header
+
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=422, detail="multipart/form-data gövdesi bekleniyor")
+    content_length = request.headers.get("content-length")
+    limit = max_size + MULTIPART_OVERHEAD
+    if content_length and content_length.isdigit() and int(content_length) > limit:
+        raise _too_large(max_size)
+
+    stager = _MultipartStager(field, limit_for or (lambda filename: max_size))
+    parser = multipart.MultipartParser(params[b"boundary"], stager.callbacks())
+    buffer = bytearray()
+    try:
+        async for chunk in request.stream():
+            buffer += chunk
+            # Disk ve hash işlemleri event loop dışında, CHUNK_SIZE'lık bloklarla
+            if len(buffer) >= CHUNK_SIZE:
+                await run_in_threadpool(parser.write, bytes(buffer))
+                buffer.clear()
+        if buffer:
+            await run_in_threadpool(parser.write, bytes(buffer))
+        parser.finalize()
+    except BaseException:
+        stager.abort()
+        raise
+    if stager.staged is None:
+        stager.abort()
+        raise HTTPException(status_code=422, detail=f"Dosya alanı eksik: {field}")
+    return stager.filename, stager.staged
+
+
+def multipart_body(field: str) -> dict:
+    """stage_multipart kullanan uç noktaların OpenAPI istek gövdesi"""
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "required": [field],
+                        "properties": {field: {"type": "string", "format": "binary"}},
+                    }
+                }
+            },
+        }
+    }
+
+
+def stage_stream(stream: BinaryIO, max_size: int) -> StagedFile:
+    """Senkron dosya nesnesini parça parça geçici dosyaya yaz (iş parçacığında)"""
+    out, path = _open_temp()
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise _too_large(max_size)
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    return StagedFile(path=path, size=size, sha256=digest.hexdigest())
+
+
+def hash_file(path: Path) -> str:
+    """Diskteki dosyanın SHA-256'sını parça parça hesapla"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def commit_file(staged: StagedFile, destination: Path) -> Path:
+    """Geçici dosyayı atomik olarak nihai yoluna taşı"""
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(staged.path, destination)
+    return destination
+
+
+def should_compress(file_type: str) -> bool:
+    """Bu tip diske sıkıştırılarak mı yazılmalı?"""
+    return STORAGE_COMPRESSION == "gzip" and file_type.lower() in COMPRESSIBLE_TYPES
+
+
+def is_compressed(path: Path) -> bool:
+    return path.suffix == ".gz"
+
+
+def _write_gzip(source: BinaryIO, destination: Path) -> int:
+    """Akışı gzip olarak atomik yaz, diskteki boyutu döndür"""
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=destination.parent, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as raw:
+            # mtime=0: aynı içerik için aynı byte'lar
+            with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=GZIP_LEVEL, mtime=0) as out:
+                for chunk in iter(lambda: source.read(CHUNK_SIZE), b""):
+                    out.write(chunk)
+        os.replace(tmp, destination)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    return destination.stat().st_size
+
+
+def store_file(source: Path, destination: Path, compress: bool) -> Tuple[Path, int, Optional[str]]:
+    """Geçici dosyayı yerine koy, uygunsa gzip'le
+
+    (nihai yol, diskteki boyut, encoding) döndürür. Sıkıştırma yeterli
+    kazanç sağlamazsa dosya ham olarak taşınır.
+    """
+    size = source.stat().st_size
+    if compress and size > 0:
+        target = destination.with_name(destination.name + ".gz")
+        with open(source, "rb") as src:
+            stored = _write_gzip(src, target)
+        if stored <= size * MAX_COMPRESSED_RATIO:
+            source.unlink(missing_ok=True)
+            return target, stored, "gzip"
+        target.unlink(missing_ok=True)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(source, destination)
+    return destination, size, None
+
+
+def open_stored(path: Path) -> BinaryIO:
+    """Saklanan dosyayı (gerekirse açarak) okuma için aç"""
+    return gzip.open(path, "rb") if is_compressed(path) else open(path, "rb")
+
+
+def iter_stored(path: Path, start: int = 0, length: Optional[int] = None) -> Iterator[bytes]:
+    """Açılmış içeriğin [start, start+length) aralığını parça parça üret"""
+    with open_stored(path) as f:
+        if start:
+            f.seek(start)  # gzip'te ileri sarma açarak atlar
+        remaining = length
+        while remaining is None or remaining > 0:
+            chunk = f.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
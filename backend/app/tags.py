@@ -0,0 +1,173 @@
+"""
+Normalize etiket indeksi
+
+Project/Experiment/Entry üzerindeki JSON `tags` kolonu yanıtlar için
+korunur; filtreleme ve sayım `tags` + bağlantı tabloları üzerinden,
+indeksli olarak yapılır. Bağlantılar her flush sonrasında otomatik
+senkronize edilir.
+"""
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import event, func, inspect, delete, insert, true
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select
+
+from app.models import Project, Experiment, Entry, Tag, ProjectTag, ExperimentTag, EntryTag
+
+# Entity modeli → (bağlantı tablosu, entity kolon adı)
+TAG_LINKS = {
+    Project: (ProjectTag, "project_id"),
+    Experiment: (ExperimentTag, "experiment_id"),
+    Entry: (EntryTag, "entry_id"),
+}
+
+# API'deki entity adları
+TAG_ENTITIES = {
+    "project": Project,
+    "experiment": Experiment,
+    "entry": Entry,
+}
+
+
+def normalize_tags(tags: Iterable[str]) -> List[str]:
+    """Boşlukları temizle, boşları ve tekrarları at (sırayı koru)"""
+    seen = {}
+    for tag in tags or []:
+        name = str(tag).strip()
+        if name:
+            seen.setdefault(name, None)
+    return list(seen)
+
+
+def sync_tag_links(connection, model, items: List[Tuple[int, List[str]]], replace: bool = True):
+    """Verilen entity'lerin etiket bağlantılarını yaz
+
+    items: (entity_id, tags) listesi. replace=True ise mevcut bağlantılar
+    önce silinir (update), yeni kayıtlar için False verilebilir.
+    """
+    if not items:
+        return
+    link, fk = TAG_LINKS[model]
+    fk_col = getattr(link, fk)
+    items = [(entity_id, normalize_tags(tags)) for entity_id, tags in items]
+
+    if replace:
+        connection.execute(delete(link).where(fk_col.in_([entity_id for entity_id, _ in items])))
+
+    names = sorted({name for _, tags in items for name in tags})
+    if not names:
+        return
+
+    connection.execute(
+        sqlite_insert(Tag).on_conflict_do_nothing(index_elements=["name"]),
+        [{"name": name} for name in names],
+    )
+    tag_ids: Dict[str, int] = dict(
+        connection.execute(select(Tag.name, Tag.id).where(Tag.name.in_(names))).all()
+    )
+    rows = [
+        {"tag_id": tag_ids[name], fk: entity_id}
+        for entity_id, tags in items
+        for name in tags
+    ]
+    connection.execute(insert(link), rows)
+
+
+@event.listens_for(Session, "after_flush")
+def _sync_tags_after_flush(session, flush_context):
+    """Yeni/değişen/silinen entity'lerin bağlantılarını aynı transaction'da güncelle"""
+    created: Dict[type, list] = {}
+    updated: Dict[type, list] = {}
+    removed: Dict[type, list] = {}
+
+    for obj in session.new:
+        if type(obj) in TAG_LINKS:
+            created.setdefault(type(obj), []).append((obj.id, obj.tags))
+    for obj in session.dirty:
+        if type(obj) in TAG_LINKS and inspect(obj).attrs.tags.history.has_changes():
+            updated.setdefault(type(obj), []).append((obj.id, obj.tags))
+    for obj in session.deleted:
+        if type(obj) in TAG_LINKS:
+            removed.setdefault(type(obj), []).append(obj.id)
+
+    if not (created or updated or removed):
+        return
+
+    connection = session.connection()
+    for model, items in created.items():
+        sync_tag_links(connection, model, items, replace=False)
+    for model, items in updated.items():
+        sync_tag_links(connection, model, items)
+    for model, ids in removed.items():
+        link, fk = TAG_LINKS[model]
+        connection.execute(delete(link).where(getattr(link, fk).in_(ids)))
+
+
+def tag_filter(model, tags: Iterable[str]):
+    """Tüm etiketlere sahip entity'ler için WHERE koşulu (AND, tam eşleşme)"""
+    names = normalize_tags(tags)
+    if not names:
+        return true()
+    link, fk = TAG_LINKS[model]
+    fk_col = getattr(link, fk)
+    matching = (
+        select(fk_col)
+        .join(Tag, Tag.id == link.tag_id)
+        .where(Tag.name.in_(names))
+        .group_by(fk_col)
+        .having(func.count() == len(names))
+    )
+    return model.id.in_(matching)
+
+
+def tag_counts(session: Session, model, limit: int = 100) -> List[dict]:
+    """Etiket başına entity sayısı (en çok kullanılan önce)
+
+    Entry'lerde yalnızca güncel versiyonlar (head) sayılır.
+    """
+    link, fk = TAG_LINKS[model]
+    statement = (
+        select(Tag.name, func.count().label("count"))
+        .join(link, link.tag_id == Tag.id)
+    )
+    if model is Entry:
+        statement = statement.join(Entry, Entry.id == getattr(link, fk)).where(
+            Entry.is_head.is_(True)
+        )
+    statement = (
+        statement
+        .group_by(Tag.id)
+        .order_by(func.count().desc(), Tag.name)
+        .limit(limit)
+    )
+    return [{"tag": name, "count": count} for name, count in session.exec(statement).all()]
+
+
+def backfill_tags(engine, batch_size: int = 1000) -> int:
+    """Bağlantı tablolarını mevcut JSON etiketlerinden bir kez doldur
+
+    Etiket tablosu doluysa hiçbir şey yapmaz. Yazılan entity sayısını döndürür.
+    """
+    with Session(engine) as session:
+        if session.exec(select(Tag.id).limit(1)).first() is not None:
+            return 0
+
+        total = 0
+        connection = session.connection()
+        for model in TAG_LINKS:
+            last_id = 0
+            while True:
+                rows = session.exec(
+                    select(model.id, model.tags)
+                    .where(model.id > last_id)
+                    .order_by(model.id)
+                    .limit(batch_size)
+                ).all()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                items = [(entity_id, tags) for entity_id, tags in rows if tags]
+                sync_tag_links(connection, model, items)
+                total += len(items)
+        session.commit()
+        return total
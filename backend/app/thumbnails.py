@@ -0,0 +1,154 @@
+"""
+Ek dosyaları için küçük resim ve önizleme üretimi
+
+png/jpg dosyaları ve pdf'lerin ilk sayfası için türevler bir süreç
+havuzunda üretilir ve blob'un yanında içerik hash'i ile saklanır:
+storage/blobs/ab/cd/<sha256>.<boyut>.jpg. İçerik değişmediği için türev
+bir kez üretilir; eksikse ilk istekte üretilir.
+
+PDF önizlemeleri PyMuPDF (fitz) paketini gerektirir (requirements.txt); kurulu
+değilse PDF'ler için türev üretilmez ve önizleme uç noktası bunu açıkça
+bildirir (PDF_PREVIEWS).
+"""
+import importlib.util
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+
+from app.blobs import blob_path
+
+# Boyut adı → uzun kenar (piksel)
+THUMBNAIL_SIZES: Dict[str, int] = {"thumb": 256, "preview": 1024}
+
+IMAGE_TYPES = {"png", "jpg", "jpeg"}
+PDF_TYPES = {"pdf"}
+# PyMuPDF kurulu değilse PDF önizlemesi yok
+PDF_PREVIEWS = importlib.util.find_spec("fitz") is not None
+
+# 0: türevler istek içinde üretilir (havuz yok)
+THUMBNAIL_WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "2"))
+JPEG_QUALITY = 85
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def supports_derivatives(file_type: str) -> bool:
+    """Bu dosya tipi için türev üretilebilir mi?"""
+    return file_type in IMAGE_TYPES or (file_type in PDF_TYPES and PDF_PREVIEWS)
+
+
+def derivative_path(sha256: str, size: str) -> Path:
+    """Türev dosyasının yolu (blob ile aynı dizinde)"""
+    return blob_path(sha256).with_name(f"{sha256}.{size}.jpg")
+
+
+def _load_image(source: str, file_type: str, max_edge: int):
+    """Kaynaktan RGB PIL görüntüsü (pdf için ilk sayfa)"""
+    from PIL import Image
+
+    if file_type in PDF_TYPES:
+        try:
+            import fitz  # PyMuPDF
+        except ImportError:
+            return None
+        with fitz.open(source) as document:
+            page = document[0]
+            zoom = max_edge / max(page.rect.width, page.rect.height)
+            pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            return Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+
+    image = Image.open(source)
+    # JPEG'de hedef boyuta yakın ölçekte çöz (tam çözünürlük belleğe alınmaz)
+    image.draft("RGB", (max_edge, max_edge))
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def render_derivatives(source: str, file_type: str, sha256: str) -> Dict[str, str]:
+    """Tüm boyutları üret (süreç havuzunda çalışır), boyut → yol döndür"""
+    sizes = sorted(THUMBNAIL_SIZES.items(), key=lambda item: -item[1])
+    image = _load_image(source, file_type, sizes[0][1])
+    if image is None:
+        return {}
+
+    rendered = {}
+    for name, edge in sizes:  # büyükten küçüğe: her adım bir öncekinden küçültür
+        image.thumbnail((edge, edge))
+        target = derivative_path(sha256, name)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=target.parent, suffix=".part")
+        with os.fdopen(fd, "wb") as out:
+            image.save(out, "JPEG", quality=JPEG_QUALITY, optimize=True)
+        os.replace(tmp, target)
+        rendered[name] = str(target)
+    return rendered
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: çok iş parçacıklı sunucudan fork güvenli değil
+        _pool = ProcessPoolExecutor(
+            max_workers=THUMBNAIL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def schedule_derivatives(source: Path, file_type: str, sha256: str) -> Optional[Future]:
+    """Türev üretimini arka planda başlat (destekleniyorsa)"""
+    if not supports_derivatives(file_type):
+        return None
+    if all(derivative_path(sha256, name).exists() for name in THUMBNAIL_SIZES):
+        return None
+    if THUMBNAIL_WORKERS <= 0:
+        future: Future = Future()
+        try:
+            future.set_result(render_derivatives(str(source), file_type, sha256))
+        except Exception as exc:
+            future.set_exception(exc)
+        return future
+    future = _get_pool().submit(render_derivatives, str(source), file_type, sha256)
+    future.add_done_callback(_log_failure)
+    return future
+
+
+def _log_failure(future: Future):
+    if not future.cancelled() and future.exception() is not None:
+        print(f"⚠️ Türev üretilemedi: {future.exception()}")
+
+
+def ensure_derivative(source: Path, file_type: str, sha256: str, size: str) -> Optional[Path]:
+    """Türevi döndür; yoksa üretip bekle. Üretilemiyorsa None."""
+    target = derivative_path(sha256, size)
+    if target.exists():
+        return target
+    future = schedule_derivatives(source, file_type, sha256)
+    if future is None:
+        return None
+    try:
+        rendered = future.result()
+    except Exception:
+        return None
+    return Path(rendered[size]) if size in rendered else None
+
+
+def remove_derivatives(sha256: str):
+    """Blob silindiğinde türevlerini de sil"""
+    for name in THUMBNAIL_SIZES:
+        derivative_path(sha256, name).unlink(missing_ok=True)
+
+
+def shutdown_pool():
+    """Süreç havuzunu kapat"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,144 @@
+"""
+Devam ettirilebilir parçalı yüklemeler
+
+Oturum açılırken dosya için storage/uploads/<id>.part tam boyutta
+(seyrek) oluşturulur. Her parça kendi ofsetine pwrite ile yazılır, bu
+yüzden parçalar paralel ve herhangi bir sırada gönderilebilir; yazılan
+parçalar upload_chunks tablosunda tutulur. Kesilen bir yükleme eksik
+parçalar gönderilerek tamamlanır. Uzun süre dokunulmayan oturumlar ve
+kısmi dosyaları periyodik olarak temizlenir.
+"""
+import asyncio
+import math
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import AsyncIterator, List, Tuple
+
+from fastapi import HTTPException
+from sqlmodel import Session, select, delete
+from starlette.concurrency import run_in_threadpool
+
+from app.database import DATA_DIR
+from app.models import UploadChunk, UploadSession
+
+UPLOAD_DIR = DATA_DIR / "storage" / "uploads"
+
+# Parça boyutu sınırları ve varsayılanı
+MIN_CHUNK_SIZE = 256 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Tek dosya için üst sınır (ham cihaz çıktıları birkaç GB olabilir)
+RESUMABLE_MAX_BYTES = int(os.getenv("RESUMABLE_UPLOAD_MAX_BYTES", str(10 * 1024**3)))
+
+# Normal eklere ek olarak parçalı yüklemede kabul edilen cihaz çıktıları
+INSTRUMENT_EXTENSIONS = {"raw", "dat", "h5", "hdf5", "tif", "tiff", "zip"}
+
+# Bu süre boyunca parça gelmeyen oturumlar silinir
+UPLOAD_SESSION_TTL = timedelta(hours=float(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24")))
+UPLOAD_CLEANUP_INTERVAL = float(os.getenv("UPLOAD_CLEANUP_INTERVAL", "3600"))
+
+# Diske yazmadan önce biriktirilen gövde miktarı
+_WRITE_BUFFER = 1024 * 1024
+
+
+def part_path(upload_id: str) -> Path:
+    """Oturumun kısmi dosyası"""
+    return UPLOAD_DIR / f"{upload_id}.part"
+
+
+def create_part_file(upload_id: str, total_size: int):
+    """Kısmi dosyayı tam boyutta (seyrek) oluştur"""
+    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    with open(part_path(upload_id), "wb") as f:
+        f.truncate(total_size)
+
+
+def expected_chunk(upload: UploadSession, offset: int) -> int:
+    """Ofsetteki parçanın beklenen boyutu; hizalı değilse 422"""
+    if offset < 0 or offset >= upload.total_size or offset % upload.chunk_size:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Geçersiz ofset: {offset} (parça boyutu {upload.chunk_size})",
+        )
+    return min(upload.chunk_size, upload.total_size - offset)
+
+
+def chunk_count(upload: UploadSession) -> int:
+    return math.ceil(upload.total_size / upload.chunk_size)
+
+
+async def write_chunk(
+    upload_id: str, offset: int, expected: int, body: AsyncIterator[bytes]
+) -> int:
+    """İstek gövdesini kısmi dosyada ofsete yaz, yazılan byte sayısını döndür
+
+    Gövde beklenen boyutu aşarsa yazma kesilir ve 422 döner. Diğer
+    parçaların bölgelerine dokunulmaz.
+    """
+    fd = await run_in_threadpool(os.open, part_path(upload_id), os.O_WRONLY)
+    written = 0
+    buffer = bytearray()
+    try:
+        async for piece in body:
+            buffer += piece
+            if written + len(buffer) > expected:
+                raise HTTPException(status_code=422, detail=f"Parça {expected} byte'tan büyük")
+            if len(buffer) >= _WRITE_BUFFER:
+                written += await run_in_threadpool(os.pwrite, fd, bytes(buffer), offset + written)
+                buffer.clear()
+        if buffer:
+            written += await run_in_threadpool(os.pwrite, fd, bytes(buffer), offset + written)
+    finally:
+        await run_in_threadpool(os.close, fd)
+    return written
+
+
+def missing_ranges(upload: UploadSession, received: List[int]) -> List[Tuple[int, int]]:
+    """Henüz gelmemiş parçalar: (ofset, boyut)"""
+    have = set(received)
+    return [
+        (offset, min(upload.chunk_size, upload.total_size - offset))
+        for offset in range(0, upload.total_size, upload.chunk_size)
+        if offset not in have
+    ]
+
+
+def discard_session(session: Session, upload_id: str):
+    """Oturumu, parçalarını ve kısmi dosyayı sil (commit çağırana aittir)"""
+    session.exec(delete(UploadChunk).where(UploadChunk.session_id == upload_id))
+    session.exec(delete(UploadSession).where(UploadSession.id == upload_id))
+    part_path(upload_id).unlink(missing_ok=True)
+
+
+def cleanup_stale_uploads(engine, ttl: timedelta = UPLOAD_SESSION_TTL) -> int:
+    """Süresi dolan oturumları ve sahipsiz kısmi dosyaları temizle"""
+    cutoff = datetime.utcnow() - ttl
+    with Session(engine) as session:
+        stale = session.exec(
+            select(UploadSession.id).where(UploadSession.updated_at < cutoff)
+        ).all()
+        for upload_id in stale:
+            discard_session(session, upload_id)
+        session.commit()
+        live = set(session.exec(select(UploadSession.id)).all())
+
+    # Oturumu olmayan kısmi dosyalar (ör. oturum açılırken çöken süreç)
+    if UPLOAD_DIR.exists():
+        for path in UPLOAD_DIR.glob("*.part"):
+            if path.stem not in live and datetime.utcfromtimestamp(path.stat().st_mtime) < cutoff:
+                path.unlink(missing_ok=True)
+    return len(stale)
+
+
+async def cleanup_loop(engine):
+    """Periyodik temizlik (lifespan içinde görev olarak çalışır)"""
+    while True:
+        await asyncio.sleep(UPLOAD_CLEANUP_INTERVAL)
+        try:
+            removed = await run_in_threadpool(cleanup_stale_uploads, engine)
+            if removed:
+                print(f"🧹 {removed} terk edilmiş yükleme oturumu silindi")
+        except Exception as e:
+            print(f"⚠️ Yükleme temizliği başarısız: {e}")
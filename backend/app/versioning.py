@@ -0,0 +1,135 @@
+"""
+Entry versiyon depolama
+
+Her entry zinciri bir kök (root_id) altında tutulur. Güncel versiyon
+(head) tam metni saklar; eski versiyonlar bir sonraki versiyona göre
+sıkıştırılmış satır bazlı ters delta olarak saklanır. Her
+SNAPSHOT_INTERVAL versiyonda bir tam metin (snapshot) korunur, böylece
+herhangi bir versiyonu yeniden kurmak için yürünen zincir sınırlı kalır.
+"""
+import json
+import os
+import zlib
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List
+
+from sqlalchemy import event, update, func
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlmodel import Session, select
+
+from app.models import Entry
+
+SNAPSHOT_INTERVAL = int(os.getenv("ENTRY_SNAPSHOT_INTERVAL", "10"))
+
+
+def encode_delta(target: str, base: str) -> bytes:
+    """base metninden target metnini kuran sıkıştırılmış delta"""
+    base_lines = base.splitlines(keepends=True)
+    target_lines = target.splitlines(keepends=True)
+    ops = []
+    matcher = SequenceMatcher(None, base_lines, target_lines)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])  # base[i1:i2] kopyala
+        elif tag in ("replace", "insert"):
+            ops.append("".join(target_lines[j1:j2]))  # yeni metin
+        # delete: base satırları atlanır
+    return zlib.compress(json.dumps(ops, ensure_ascii=False).encode("utf-8"), 9)
+
+
+def apply_delta(base: str, delta: bytes) -> str:
+    """encode_delta çıktısını base metnine uygula"""
+    base_lines = base.splitlines(keepends=True)
+    parts = []
+    for op in json.loads(zlib.decompress(delta).decode("utf-8")):
+        if isinstance(op, str):
+            parts.append(op)
+        else:
+            parts.extend(base_lines[op[0]:op[1]])
+    return "".join(parts)
+
+
+def store_previous_version(old_entry: Entry, new_body: str):
+    """Head'den çıkan versiyonu delta olarak sakla (snapshot değilse)"""
+    if old_entry.body_delta is not None or old_entry.version % SNAPSHOT_INTERVAL == 0:
+        return
+    old_entry.body_delta = encode_delta(old_entry.body_md, new_body)
+    old_entry.body_md = ""
+
+
+def lineage_root(entry: Entry) -> int:
+    """Entry'nin ait olduğu zincirin kök id'si"""
+    return entry.root_id or entry.id
+
+
+def hydrate_bodies(session: Session, entries: Iterable[Entry]) -> List[Entry]:
+    """Delta olarak saklanan entry'lerin body_md alanını yeniden kur
+
+    Değer set_committed_value ile yazılır; nesne değişmiş sayılmaz ve
+    veritabanına geri yazılmaz.
+    """
+    entries = list(entries)
+    by_root: Dict[int, List[Entry]] = {}
+    for entry in entries:
+        if entry.body_delta is not None:
+            by_root.setdefault(lineage_root(entry), []).append(entry)
+
+    for root, items in by_root.items():
+        low = min(e.version for e in items)
+        high = max(e.version for e in items)
+        # Gereken en yüksek versiyonun üstündeki ilk tam metin (snapshot veya head)
+        anchor = session.exec(
+            select(func.min(Entry.version)).where(
+                Entry.root_id == root,
+                Entry.version > high,
+                Entry.body_delta.is_(None),
+            )
+        ).one()
+        if anchor is None:
+            continue  # zincir bozuk: tam metinli üst versiyon yok
+        chain = session.exec(
+            select(Entry.version, Entry.body_md, Entry.body_delta)
+            .where(Entry.root_id == root, Entry.version >= low, Entry.version <= anchor)
+            .order_by(Entry.version.desc())
+        ).all()
+
+        bodies = {}
+        current = ""
+        for version, body, delta in chain:
+            current = body if delta is None else apply_delta(current, delta)
+            bodies[version] = current
+        for entry in items:
+            set_committed_value(entry, "body_md", bodies[entry.version])
+    return entries
+
+
+def compact_lineage(session: Session, root: int) -> int:
+    """Zincirdeki tam metinli eski versiyonları deltaya çevir
+
+    Bu değişiklikten önce oluşturulmuş versiyonlar için kullanılır.
+    Dönüştürülen versiyon sayısını döndürür; commit çağırana aittir.
+    """
+    chain = session.exec(
+        select(Entry).where(Entry.root_id == root).order_by(Entry.version.desc())
+    ).all()
+    hydrate_bodies(session, chain)
+    bodies = [entry.body_md for entry in chain]
+    compacted = 0
+    for newer_body, older in zip(bodies, chain[1:]):
+        if older.body_delta is None and older.version % SNAPSHOT_INTERVAL != 0:
+            older.body_delta = encode_delta(older.body_md, newer_body)
+            older.body_md = ""
+            session.add(older)
+            compacted += 1
+    return compacted
+
+
+@event.listens_for(Entry, "after_insert")
+def _assign_root_id(mapper, connection, target):
+    """İlk versiyon kendi zincirinin köküdür"""
+    if target.root_id is None:
+        table = Entry.__table__
+        connection.execute(
+            update(table).where(table.c.id == target.id).values(root_id=target.id)
+        )
+        set_committed_value(target, "root_id", target.id)
@@ -0,0 +1,109 @@
+"""
+Eşzamanlı istek benchmark scripti
+
+Geçici bir veri dizininde örnek veri oluşturur, ardından liste/arama
+istekleri ile /health isteklerini aynı anda gönderip throughput ve
+health gecikmesini ölçer. Event loop bloklanıyorsa health gecikmesi
+liste isteklerinin süresine yaklaşır.
+
+Kullanım:
+    python scripts/bench_concurrency.py --requests 400 --concurrency 32
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Benchmark gerçek veritabanına dokunmasın
+os.environ["APPDATA"] = tempfile.mkdtemp(prefix="lab-bench-")
+
+# Backend dizinini Python path'ine ekle
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+import httpx
+from sqlmodel import Session
+
+from app.database import create_db_and_tables, engine
+from app.main import app
+from app.models import User, Project, Experiment, Entry
+
+
+def seed(n_entries: int):
+    """Benchmark için örnek veri yükle"""
+    create_db_and_tables()
+    with Session(engine) as session:
+        user = User(name="Bench", email="bench@example.com")
+        session.add(user)
+        session.commit()
+
+        project = Project(name="Bench Project", tags=["bench"], created_by=user.id)
+        session.add(project)
+        session.commit()
+
+        experiment = Experiment(project_id=project.id, title="Bench Experiment")
+        session.add(experiment)
+        session.commit()
+
+        for i in range(n_entries):
+            session.add(Entry(
+                experiment_id=experiment.id,
+                author_id=user.id,
+                title=f"Entry {i}",
+                body_md=f"## Ölçüm {i}\n" + "T=77K B=0.5T direnç ölçümü\n" * 50,
+                tags=["bench", f"t{i % 10}"],
+            ))
+        session.commit()
+
+
+async def run(total: int, concurrency: int):
+    """Liste/arama yükü altında health gecikmesini ölç"""
+    transport = httpx.ASGITransport(app=app)
+    paths = ["/api/entries/?limit=200", "/api/search/entries?text=direnç", "/api/projects/"]
+    semaphore = asyncio.Semaphore(concurrency)
+    health_latencies = []
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def heavy(i: int):
+            async with semaphore:
+                response = await client.get(paths[i % len(paths)])
+                response.raise_for_status()
+
+        async def probe():
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/health")
+                health_latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.01)
+
+        done = asyncio.Event()
+        probe_task = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(heavy(i) for i in range(total)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe_task
+
+    print(f"İstek sayısı      : {total} (eşzamanlılık {concurrency})")
+    print(f"Toplam süre       : {elapsed:.2f} s")
+    print(f"Throughput        : {total / elapsed:.1f} istek/s")
+    if health_latencies:
+        ordered = sorted(health_latencies)
+        p95 = ordered[int(len(ordered) * 0.95) - 1] if len(ordered) > 1 else ordered[0]
+        print(f"/health p50       : {statistics.median(ordered) * 1000:.1f} ms")
+        print(f"/health p95       : {p95 * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Eşzamanlı istek benchmark'ı")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--entries", type=int, default=2000)
+    args = parser.parse_args()
+
+    seed(args.entries)
+    asyncio.run(run(args.requests, args.concurrency))
@@ -0,0 +1,44 @@
+"""
+Eski entry versiyonlarını delta formatına çevirme scripti
+
+Delta depolamadan önce oluşturulmuş, tam metin saklayan eski
+versiyonları zincir bazında sıkıştırır.
+
+Kullanım:
+    python scripts/compact_versions.py
+"""
+import sys
+from pathlib import Path
+
+# Backend dizinini Python path'ine ekle
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from sqlmodel import Session, select, func
+
+from app.database import create_db_and_tables, engine
+from app.models import Entry
+from app.versioning import compact_lineage
+
+
+def compact_all():
+    """Birden fazla versiyonu olan tüm zincirleri sıkıştır"""
+    create_db_and_tables()
+
+    with Session(engine) as session:
+        roots = session.exec(
+            select(Entry.root_id)
+            .group_by(Entry.root_id)
+            .having(func.count() > 1)
+        ).all()
+
+        total = 0
+        for root in roots:
+            total += compact_lineage(session, root)
+            session.commit()
+
+    print(f"✅ {len(roots)} zincirde {total} versiyon delta olarak saklandı")
+
+
+if __name__ == "__main__":
+    compact_all()
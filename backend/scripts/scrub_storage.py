@@ -0,0 +1,54 @@
+"""
+Depolama bütünlük denetimi scripti
+
+Blob dosyalarını hash'leyerek doğrular, dosyası olmayan kayıtları ve
+kaydı olmayan dosyaları raporlar. Sorun bulunursa çıkış kodu 1'dir.
+
+Kullanım:
+    python scripts/scrub_storage.py [--rate 50] [--workers 4] [--json]
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+# Backend dizinini Python path'ine ekle
+backend_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(backend_dir))
+
+from app.database import create_db_and_tables, read_engine
+from app.scrubber import SCRUB_RATE_MB_S, SCRUB_WORKERS, scrub
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Depolama bütünlük denetimi")
+    parser.add_argument("--rate", type=float, default=SCRUB_RATE_MB_S, help="Okuma hızı sınırı (MB/s, 0: sınırsız)")
+    parser.add_argument("--workers", type=int, default=SCRUB_WORKERS, help="Paralel hash iş parçacığı")
+    parser.add_argument("--json", action="store_true", help="Raporu JSON olarak yazdır")
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    report = scrub(read_engine, rate_mb_s=args.rate, workers=args.workers)
+
+    if args.json:
+        print(json.dumps(report.to_dict(), default=str, ensure_ascii=False, indent=2))
+    else:
+        print(f"🔍 {report.files_verified} dosya doğrulandı ({report.bytes_verified / 1024**2:.1f} MB)")
+        for item in report.corrupt:
+            print(f"❌ Bozuk: {item['path']} (beklenen {item['id'][:12]}…)")
+        for item in report.missing:
+            print(f"❓ Dosyası yok: {item['kind']} #{item['id']} → {item['path']}")
+        for item in report.orphans:
+            print(f"🗑️ Sahipsiz: {item['path']} ({item['size']} byte)")
+        if report.ok:
+            print("✅ Depolama tutarlı")
+        else:
+            print(
+                f"⚠️ {len(report.corrupt)} bozuk, {len(report.missing)} eksik, "
+                f"{len(report.orphans)} sahipsiz ({report.orphan_bytes / 1024**2:.1f} MB)"
+            )
+    sys.exit(0 if report.ok else 1)
+
+
+if __name__ == "__main__":
+    main()
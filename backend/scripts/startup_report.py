@@ -0,0 +1,81 @@
+"""
+Başlangıç süresi raporu
+
+`python -X importtime` ile app.main'i ayrı bir process'te import eder,
+toplam süreyi, en pahalı modülleri ve ağır bağımlılıkların (pandas,
+matplotlib, python-docx, openpyxl) yüklenip yüklenmediğini raporlar.
+
+Kullanım:
+    python scripts/startup_report.py --top 20
+"""
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+
+backend_dir = Path(__file__).parent.parent
+
+# İlk istekte yüklenmesi gereken ağır bağımlılıklar
+HEAVY_MODULES = ("pandas", "numpy", "matplotlib", "docx", "openpyxl")
+
+PROBE = (
+    "import sys, time\n"
+    "start = time.perf_counter()\n"
+    "import app.main\n"
+    "elapsed = time.perf_counter() - start\n"
+    "print('ELAPSED', elapsed)\n"
+    f"print('HEAVY', ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+)
+
+
+def measure() -> dict:
+    """app.main import süresini ve modül bazlı dökümü ölç"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=backend_dir,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        try:
+            cumulative = int(parts[1])
+        except ValueError:
+            continue  # başlık satırı
+        modules.append((cumulative, parts[2].strip()))
+
+    elapsed = 0.0
+    heavy = []
+    for line in result.stdout.splitlines():
+        if line.startswith("ELAPSED"):
+            elapsed = float(line.split()[1])
+        elif line.startswith("HEAVY"):
+            heavy = [m for m in line[len("HEAVY"):].strip().split(",") if m]
+
+    return {
+        "elapsed": elapsed,
+        "heavy_loaded": heavy,
+        "modules": sorted(modules, reverse=True),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="app.main import süresi raporu")
+    parser.add_argument("--top", type=int, default=15, help="Gösterilecek modül sayısı")
+    args = parser.parse_args()
+
+    report = measure()
+    print(f"app.main import süresi: {report['elapsed'] * 1000:.0f} ms")
+    if report["heavy_loaded"]:
+        print(f"⚠️ Başlangıçta yüklenen ağır modüller: {', '.join(report['heavy_loaded'])}")
+    else:
+        print("✅ Ağır modüller başlangıçta yüklenmiyor")
+
+    print(f"\nEn pahalı {args.top} modül (kümülatif):")
+    for cumulative, name in report["modules"][:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
@@ -1,16 +1,36 @@
 """
 Pytest tests for Lab Report API
 """
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+# Testler gerçek veri dizinine dokunmasın: app import edilmeden önce
+# APPDATA geçici dizine çevrilir; DATA_DIR ve ondan türeyen tüm dizinler
+# (storage, blobs, charts, datasets, columnar, templates, tmp, uploads)
+# ve gerçek engine'lerin veritabanı dosyası bu dizinde oluşur.
+TEST_APPDATA = Path(tempfile.mkdtemp(prefix="lab-test-"))
+os.environ["APPDATA"] = str(TEST_APPDATA)
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import Session, create_engine, SQLModel
 from sqlalchemy.pool import StaticPool
 
 from app.main import app
-from app.database import get_session
+from app.database import DATA_DIR, DB_MODE, get_read_session, get_session
 from app.models import User, Project, Experiment, Entry
 
 
+@pytest.fixture(autouse=True, scope="session")
+def isolated_data_dir():
+    """Tüm testler geçici veri dizininde çalışır; sonunda silinir"""
+    assert TEST_APPDATA in DATA_DIR.parents, f"DATA_DIR gerçek dizini gösteriyor: {DATA_DIR}"
+    yield DATA_DIR
+    shutil.rmtree(TEST_APPDATA, ignore_errors=True)
+
+
 # Test veritabanı
 @pytest.fixture(name="session")
 def session_fixture():
@@ -32,6 +52,7 @@ def client_fixture(session: Session):
         return session
     
     app.dependency_overrides[get_session] = get_session_override
+    app.dependency_overrides[get_read_session] = get_session_override
     client = TestClient(app)
     yield client
     app.dependency_overrides.clear()
@@ -312,3 +333,1442 @@ def test_list_templates(client: TestClient):
     assert response.status_code == 200
     data = response.json()
     assert isinstance(data, list)
+
+
+def test_production_engine_pragmas():
+    """WAL engine: okuma bağlantıları salt okunur, yazıcı WAL modunda"""
+    from app.database import engine, read_engine, DB_MODE
+    if DB_MODE == "simple":
+        pytest.skip("simple mod")
+    
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA query_only").scalar() == 0
+    
+    with read_engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA query_only").scalar() == 1
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() > 0
+
+
+@pytest.fixture(name="test_entry")
+def test_entry_fixture(session: Session, test_user: User, test_project: Project):
+    """Test entry'si"""
+    experiment = Experiment(
+        project_id=test_project.id,
+        title="Upload Experiment",
+        tags=["upload"]
+    )
+    session.add(experiment)
+    session.commit()
+    session.refresh(experiment)
+    
+    entry = Entry(
+        experiment_id=experiment.id,
+        author_id=test_user.id,
+        title="Upload Entry",
+        body_md="Ekler",
+        tags=[]
+    )
+    session.add(entry)
+    session.commit()
+    session.refresh(entry)
+    return entry
+
+
+def test_upload_attachment(client: TestClient, test_entry: Entry):
+    """Dosya yükleme testi"""
+    import uuid
+    content = f"x,y\n1,2\n{uuid.uuid4()}\n".encode()
+    response = client.post(
+        f"/api/attachments/?entry_id={test_entry.id}",
+        files={"file": ("olcum.csv", content, "text/csv")},
+    )
+    assert response.status_code == 201
+    data = response.json()
+    assert data["file_size"] == len(content)
+    assert data["entry_id"] == test_entry.id
+    
+    response = client.get(f"/api/attachments/{data['id']}/download")
+    assert response.status_code == 200
+    assert response.content == content
+
+
+def test_create_writes_audit_in_same_transaction(
+    client: TestClient, session: Session, test_user: User,
+):
+    """Entity ve audit kaydı tek commit'te yazılır"""
+    from sqlmodel import select
+    from app.models import AuditLog
+    
+    response = client.post(
+        "/api/projects/",
+        json={"name": "Audit Project", "tags": [], "created_by": test_user.id},
+    )
+    assert response.status_code == 201
+    project_id = response.json()["id"]
+    
+    audits = session.exec(
+        select(AuditLog).where(AuditLog.entity == "project", AuditLog.entity_id == project_id)
+    ).all()
+    assert len(audits) == 1
+    assert audits[0].action == "create"
+
+
+def test_write_behind_audit_buffers_after_commit(monkeypatch, session: Session, test_user: User):
+    """Write-behind modunda audit commit sonrası arabelleğe alınır, rollback'te atılır"""
+    import app.audit as audit_module
+    
+    buffer = audit_module.AuditBuffer(batch_size=10, flush_interval=60)
+    monkeypatch.setattr(audit_module, "AUDIT_WRITE_BEHIND", True)
+    monkeypatch.setattr(audit_module, "audit_buffer", buffer)
+    
+    audit_module.record_audit(session, "project", 1, test_user.id, "create")
+    session.rollback()
+    assert buffer._items == []
+    
+    audit_module.record_audit(session, "project", 1, test_user.id, "create")
+    session.commit()
+    assert len(buffer._items) == 1
+    assert buffer._items[0].action == "create"
+    
+    # Yazılamazsa kayıtlar kaybolmaz, sonraki flush'ta yazılır
+    from sqlmodel import select
+    from app.models import AuditLog
+    monkeypatch.setattr(audit_module, "engine", create_engine("sqlite://"))  # tablo yok
+    with pytest.raises(Exception):
+        buffer.flush()
+    assert len(buffer._items) == 1
+    monkeypatch.setattr(audit_module, "engine", session.get_bind())
+    assert buffer.flush() == 1
+    assert buffer._items == []
+    assert session.exec(select(AuditLog).where(AuditLog.who == test_user.id)).all()
+
+
+def test_import_time_budget():
+    """app.main import'u ağır bağımlılıkları yüklemez ve süre bütçesinde kalır"""
+    import subprocess
+    import sys
+    from pathlib import Path
+    
+    probe = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "import app.main\n"
+        "print(time.perf_counter() - start)\n"
+        "heavy = ('pandas', 'matplotlib', 'docx', 'openpyxl')\n"
+        "print(','.join(m for m in heavy if m in sys.modules))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", probe],
+        cwd=Path(__file__).parent.parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    elapsed, heavy = (result.stdout.splitlines() + [""])[:2]
+    assert heavy == ""
+    assert float(elapsed) < 5.0
+
+
+def test_tag_filter_exact_and_multi_tag(
+    client: TestClient, session: Session, test_user: User, test_project: Project,
+):
+    """Etiket filtresi tam eşleşir ve çoklu etiketlerde AND uygular"""
+    experiment = Experiment(project_id=test_project.id, title="Tag Experiment", tags=[])
+    session.add(experiment)
+    session.commit()
+    session.refresh(experiment)
+    
+    for title, tags in [("A", ["VDP", "77K"]), ("B", ["VDP2"]), ("C", ["VDP"])]:
+        session.add(Entry(
+            experiment_id=experiment.id,
+            author_id=test_user.id,
+            title=title,
+            body_md="-",
+            tags=tags,
+        ))
+    session.commit()
+    
+    response = client.get("/api/entries/?tag=VDP")
+    assert sorted(e["title"] for e in response.json()) == ["A", "C"]
+    
+    response = client.get("/api/search/entries?tags=VDP,77K")
+    assert [e["title"] for e in response.json()] == ["A"]
+    
+    response = client.get("/api/search/tags?entity=entry")
+    assert response.status_code == 200
+    counts = {row["tag"]: row["count"] for row in response.json()}
+    assert counts["VDP"] == 2
+    assert counts["VDP2"] == 1
+
+
+def test_tag_counts_ignore_old_versions(client: TestClient, test_entry: Entry):
+    """Etiket sayıları entry'nin eski versiyonlarını saymaz"""
+    response = client.patch(f"/api/entries/{test_entry.id}", json={"tags": ["kalibrasyon"]})
+    assert response.status_code == 200
+    response = client.patch(f"/api/entries/{response.json()['id']}", json={"body_md": "v3"})
+    assert response.status_code == 200
+    
+    rows = client.get("/api/search/tags?entity=entry").json()
+    counts = {row["tag"]: row["count"] for row in rows}
+    assert counts["kalibrasyon"] == 1
+
+
+def test_tag_links_follow_updates_and_backfill(session: Session, test_user: User):
+    """Etiket değişikliği bağlantıları günceller, backfill boş indeksi doldurur"""
+    from sqlmodel import select, delete
+    from app.models import Tag, ProjectTag
+    from app.tags import backfill_tags
+    
+    project = Project(name="Tagged", tags=["a", "b"], created_by=test_user.id)
+    session.add(project)
+    session.commit()
+    
+    project.tags = ["b", "c"]
+    session.add(project)
+    session.commit()
+    
+    linked = session.exec(
+        select(Tag.name).join(ProjectTag, ProjectTag.tag_id == Tag.id)
+        .where(ProjectTag.project_id == project.id)
+    ).all()
+    assert sorted(linked) == ["b", "c"]
+    
+    # İndeksi boşalt ve yeniden doldur
+    session.exec(delete(ProjectTag))
+    session.exec(delete(Tag))
+    session.commit()
+    assert backfill_tags(session.get_bind()) >= 1
+    linked = session.exec(
+        select(Tag.name).join(ProjectTag, ProjectTag.tag_id == Tag.id)
+        .where(ProjectTag.project_id == project.id)
+    ).all()
+    assert sorted(linked) == ["b", "c"]
+
+
+def test_search_all_fts_ranked(
+    client: TestClient, session: Session, test_user: User, test_project: Project,
+):
+    """FTS5 araması: BM25 sıralı, snippet, phrase ve prefix sorguları"""
+    experiment = Experiment(
+        project_id=test_project.id,
+        title="Manyetik ölçümler",
+        description="SQUID magnetometre",
+        tags=[]
+    )
+    session.add(experiment)
+    session.commit()
+    session.refresh(experiment)
+    
+    session.add(Entry(
+        experiment_id=experiment.id,
+        author_id=test_user.id,
+        title="Süperiletken geçiş sıcaklığı",
+        body_md="Numune soğutuldu. Kritik sıcaklık ölçümü tamamlandı, kritik akım bekleniyor.",
+        tags=[]
+    ))
+    session.add(Entry(
+        experiment_id=experiment.id,
+        author_id=test_user.id,
+        title="Günlük not",
+        body_md="Sıcaklık kontrolü yapıldı.",
+        tags=[]
+    ))
+    session.commit()
+    
+    response = client.get("/api/search/all?text=kritik")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] == 1
+    assert data["hits"][0]["type"] == "entry"
+    assert "<mark>" in data["hits"][0]["snippet"]
+    assert data["results"]["entries"][0]["title"] == "Süperiletken geçiş sıcaklığı"
+    
+    # Prefix, aksan duyarsız prefix ve phrase
+    response = client.get("/api/search/all?text=sıcak*")
+    assert response.json()["total"] == 2
+    response = client.get("/api/search/all?text=olcum*")
+    assert {hit["type"] for hit in response.json()["hits"]} == {"experiment", "entry"}
+    response = client.get('/api/search/all?text="kritik akım"')
+    assert response.json()["total"] == 1
+    
+    # Substring artık eşleşmez; özel karakterler sorguyu bozmaz
+    response = client.get("/api/search/entries?text=ritik")
+    assert response.json() == []
+    response = client.get('/api/search/all?text=NEAR(" OR')
+    assert response.status_code == 200
+
+
+def test_search_all_escapes_highlights(client: TestClient, test_entry: Entry):
+    """Vurgulu başlık ve snippet kullanıcı metnini HTML escape eder"""
+    response = client.patch(
+        f"/api/entries/{test_entry.id}",
+        json={
+            "title": "<b>numune</b>",
+            "body_md": 'numune <script>alert("x")</script> & <img src=x>',
+        },
+    )
+    assert response.status_code == 200
+    
+    hit = client.get("/api/search/all?text=numune").json()["hits"][0]
+    assert hit["title_html"] == "&lt;b&gt;<mark>numune</mark>&lt;/b&gt;"
+    assert "<script>" not in hit["snippet"] and "<img" not in hit["snippet"]
+    assert hit["snippet"].startswith("<mark>numune</mark> &lt;script&gt;")
+    assert "&amp;" in hit["snippet"]
+
+
+def test_keyset_pagination(
+    client: TestClient, session: Session, test_user: User, test_project: Project,
+):
+    """Cursor ile sayfalama: tekrar ve atlama olmadan tüm kayıtlar"""
+    from datetime import datetime
+    
+    experiment = Experiment(project_id=test_project.id, title="Paging", tags=[])
+    session.add(experiment)
+    session.commit()
+    session.refresh(experiment)
+    
+    # Aynı created_at değerine sahip kayıtlar id ile ayrışmalı
+    same_ts = datetime(2025, 1, 1, 12, 0, 0)
+    for i in range(7):
+        session.add(Entry(
+            experiment_id=experiment.id,
+            author_id=test_user.id,
+            title=f"Page {i}",
+            body_md="-",
+            tags=[],
+            created_at=same_ts if i < 4 else datetime(2025, 1, 2, i),
+        ))
+    session.commit()
+    
+    seen = []
+    url = f"/api/entries/?experiment_id={experiment.id}&limit=3&estimate=true"
+    response = client.get(url)
+    assert response.headers["X-Total-Estimate"] == "7"
+    while True:
+        seen.extend(e["id"] for e in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+        response = client.get(
+            f"/api/entries/?experiment_id={experiment.id}&limit=3&cursor={cursor}"
+        )
+    
+    assert len(seen) == 7
+    assert len(set(seen)) == 7
+    
+    response = client.get("/api/entries/?cursor=bozuk")
+    assert response.status_code == 422
+
+
+def test_lists_default_to_head_versions(client: TestClient, test_entry: Entry):
+    """Listeler sadece güncel versiyonu döndürür, eski versiyon güncellenemez"""
+    response = client.patch(f"/api/entries/{test_entry.id}", json={"body_md": "v2"})
+    assert response.status_code == 200
+    head_id = response.json()["id"]
+    
+    url = f"/api/entries/?experiment_id={test_entry.experiment_id}"
+    assert [e["id"] for e in client.get(url).json()] == [head_id]
+    history = client.get(url + "&include_history=true").json()
+    assert sorted(e["id"] for e in history) == sorted([head_id, test_entry.id])
+    
+    response = client.get("/api/search/entries?text=v2")
+    assert [e["id"] for e in response.json()] == [head_id]
+    
+    response = client.patch(f"/api/entries/{test_entry.id}", json={"body_md": "çatallanma"})
+    assert response.status_code == 409
+
+
+def test_search_history_matches_delta_versions(client: TestClient, test_entry: Entry):
+    """include_history araması delta saklanan eski versiyonların metnini bulur"""
+    first = client.patch(
+        f"/api/entries/{test_entry.id}", json={"body_md": "Kalibrasyon eğrisi çıkarıldı"}
+    )
+    second = client.patch(f"/api/entries/{first.json()['id']}", json={"body_md": "Son ölçüm"})
+    assert second.status_code == 200
+    
+    url = "/api/search/entries?text=kalibrasyon"
+    assert client.get(url).json() == []
+    history = client.get(url + "&include_history=true").json()
+    assert [e["id"] for e in history] == [first.json()["id"]]
+    assert history[0]["body_md"] == "Kalibrasyon eğrisi çıkarıldı"
+
+
+def test_fts_history_backfill(tmp_path):
+    """Eski versiyon indeksi olmayan veritabanında mevcut deltalar indekslenir"""
+    from sqlalchemy import create_engine as sa_create_engine
+    from app.fts import HISTORY_FTS, ensure_fts_indexes
+    from app.versioning import encode_delta
+    
+    old_engine = sa_create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    SQLModel.metadata.create_all(old_engine)
+    with old_engine.begin() as conn:
+        conn.exec_driver_sql(f"DROP TABLE {HISTORY_FTS}")
+        conn.exec_driver_sql(
+            "INSERT INTO entries (id, root_id, experiment_id, author_id, title, body_md, "
+            "body_delta, tags, version, is_head, created_at, updated_at) VALUES "
+            "(1, 1, 1, 1, 'a', '', ?, '[]', 1, 0, '2025-01-01', '2025-01-01'), "
+            "(2, 1, 1, 1, 'a', 'yeni metin', NULL, '[]', 2, 1, '2025-01-01', '2025-01-01')",
+            (encode_delta("eski metin", "yeni metin"),),
+        )
+    
+    assert HISTORY_FTS in ensure_fts_indexes(old_engine)
+    with old_engine.connect() as conn:
+        rows = conn.exec_driver_sql(
+            f"SELECT rowid FROM {HISTORY_FTS} WHERE {HISTORY_FTS} MATCH 'eski'"
+        ).all()
+    assert rows == [(1,)]
+
+
+def test_schema_upgrade_adds_is_head(tmp_path):
+    """Eski veritabanına is_head kolonu eklenir ve mevcut zincirden doldurulur"""
+    from sqlalchemy import create_engine as sa_create_engine
+    from app.migrations import add_missing_columns, run_data_migrations
+    
+    old_engine = sa_create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with old_engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE entries (id INTEGER PRIMARY KEY, experiment_id INTEGER, "
+            "author_id INTEGER, title VARCHAR, body_md VARCHAR, tags JSON, version INTEGER, "
+            "parent_version_id INTEGER, created_at DATETIME, updated_at DATETIME)"
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO entries (id, title, body_md, version, parent_version_id) "
+            "VALUES (1, 'a', 'v1', 1, NULL), (2, 'a', 'v2', 2, 1)"
+        )
+    
+    added = add_missing_columns(old_engine)
+    assert ("entries", "is_head") in added
+    run_data_migrations(old_engine, added)
+    
+    with old_engine.connect() as conn:
+        rows = conn.exec_driver_sql("SELECT id, is_head FROM entries ORDER BY id").all()
+    assert rows == [(1, 0), (2, 1)]
+
+
+def test_delta_versions_rebuild_and_lineage(
+    client: TestClient, session: Session, test_entry: Entry,
+):
+    """Eski versiyonlar delta saklanır, tüm zincir tek sorguda ve tam metinle döner"""
+    from app.versioning import SNAPSHOT_INTERVAL
+    
+    bodies = [test_entry.body_md]
+    current_id = test_entry.id
+    protocol = "".join(f"Adım {i}: numuneyi hazırla\n" for i in range(200))
+    for i in range(SNAPSHOT_INTERVAL + 2):
+        body = protocol + f"Revizyon {i}\n"
+        response = client.patch(f"/api/entries/{current_id}", json={"body_md": body})
+        assert response.status_code == 200
+        current_id = response.json()["id"]
+        bodies.append(body)
+    
+    stored = session.get(Entry, test_entry.id + 2)
+    session.refresh(stored)
+    assert stored.body_delta is not None
+    assert stored.body_md == ""
+    assert len(stored.body_delta) < len(protocol) // 10
+    
+    # Ortadaki bir versiyondan tüm zincir
+    response = client.get(f"/api/entries/{test_entry.id + 3}/versions")
+    versions = response.json()
+    assert [v["version"] for v in versions] == list(range(1, len(bodies) + 1))
+    assert [v["body_md"] for v in versions] == bodies
+    assert {v["root_id"] for v in versions} == {test_entry.id}
+    
+    response = client.get(f"/api/entries/{test_entry.id + 1}")
+    assert response.json()["body_md"] == bodies[1]
+
+
+def test_stats_counters_follow_writes(client: TestClient, session: Session, test_entry: Entry):
+    """Dashboard sayaçları yazma işlemleriyle artımlı güncellenir ve yeniden hesaplananla aynıdır"""
+    import uuid
+    
+    stats = client.get("/api/stats/").json()
+    assert stats["counts"]["entries"] == 1
+    assert stats["counts"]["experiments"] == 1
+    
+    # Yeni versiyon mantıksal entry sayısını değiştirmez
+    response = client.patch(f"/api/entries/{test_entry.id}", json={"body_md": "Revize"})
+    assert response.status_code == 200
+    content = f"a,b\n{uuid.uuid4()}\n".encode()
+    response = client.post(
+        f"/api/attachments/?entry_id={test_entry.id}",
+        files={"file": ("veri.csv", content, "text/csv")},
+    )
+    attachment_id = response.json()["id"]
+    
+    stats = client.get("/api/stats/").json()
+    assert stats["counts"]["entries"] == 1
+    assert stats["counts"]["attachments"] == 1
+    assert stats["storage"]["attachment_bytes"] == len(content)
+    assert stats["projects"][0]["attachments"] == 1
+    assert stats["recent_activity"]["last_24h"]["attachment"] == 1
+    
+    rebuilt = client.post("/api/stats/rebuild").json()
+    assert rebuilt["counts"] == stats["counts"]
+    assert rebuilt["projects"] == stats["projects"]
+    
+    client.delete(f"/api/attachments/{attachment_id}?user_id={test_entry.author_id}")
+    stats = client.get("/api/stats/").json()
+    assert stats["counts"]["attachments"] == 0
+    assert stats["storage"]["attachment_bytes"] == 0
+
+
+def test_streaming_upload_hashes_and_aborts_oversize(
+    client: TestClient, test_entry: Entry, monkeypatch,
+):
+    """Yükleme parça parça yazılır; limit aşılınca 422 döner ve geçici dosya kalmaz"""
+    import hashlib
+    import uuid
+    import app.storage as storage
+    from app.api import attachments as attachments_api
+    
+    monkeypatch.setattr(storage, "CHUNK_SIZE", 64)
+    monkeypatch.setitem(attachments_api.ALLOWED_EXTENSIONS, "csv", 1024)
+    
+    content = (f"{uuid.uuid4()}\n" * 20).encode()
+    response = client.post(
+        f"/api/attachments/?entry_id={test_entry.id}",
+        files={"file": ("parcali.csv", content, "text/csv")},
+    )
+    assert response.status_code == 201
+    assert response.json()["sha256"] == hashlib.sha256(content).hexdigest()
+    assert response.json()["file_size"] == len(content)
+    
+    response = client.post(
+        f"/api/attachments/?entry_id={test_entry.id}",
+        files={"file": ("buyuk.csv", b"x" * 2048, "text/csv")},
+    )
+    assert response.status_code == 422
+    assert list(storage.TMP_DIR.glob("*.part")) == []
+    
+    # Content-Length limiti açıkça aşıyorsa gövde okunmadan reddedilir
+    monkeypatch.setattr(attachments_api, "MAX_UPLOAD_SIZE", 1024)
+    def no_staging():
+        raise AssertionError("gövde okundu")
+    monkeypatch.setattr(storage, "_open_temp", no_staging)
+    response = client.post(
+        f"/api/attachments/?entry_id={test_entry.id}",
+        files={"file": ("cok_buyuk.csv", b"x" * (storage.MULTIPART_OVERHEAD + 2048), "text/csv")},
+    )
+    assert response.status_code == 422
+    assert "çok büyük" in response.json()["detail"]
+
+
+def test_blob_store_dedupes_and_refcounts(client: TestClient, session: Session, test_entry: Entry):
+    """Aynı içerik farklı entry'lere eklenebilir, diskte tek kopya tutulur"""
+    import uuid
+    from app.database import DATA_DIR
+    from app.models import Blob
+    
+    other = Entry(
+        experiment_id=test_entry.experiment_id, author_id=test_entry.author_id,
+        title="Kalibrasyon", body_md="", tags=[],
+    )
+    session.add(other)
+    session.commit()
+    
+    content = f"kalibrasyon,{uuid.uuid4()}\n".encode()
+    ids = []
+    for entry_id in (test_entry.id, other.id):
+        response = client.post(
+            f"/api/attachments/?entry_id={entry_id}",
+            files={"file": ("kalibrasyon.csv", content, "text/csv")},
+        )
+        assert response.status_code == 201
+        ids.append(response.json()["id"])
+    
+    # Aynı entry'ye ikinci kez: 409
+    response = client.post(
+        f"/api/attachments/?entry_id={other.id}",
+        files={"file": ("kalibrasyon.csv", content, "text/csv")},
+    )
+    assert response.status_code == 409
+    
+    sha = client.get(f"/api/attachments/{ids[0]}").json()["sha256"]
+    blob = session.get(Blob, sha)
+    path = DATA_DIR / blob.file_path
+    assert blob.refcount == 2
+    assert blob.file_path.endswith(f"{sha[:2]}/{sha[2:4]}/{sha}")
+    
+    usage = client.get("/api/attachments/storage").json()
+    assert usage["logical_bytes"] == 2 * len(content)
+    assert usage["physical_bytes"] == len(content)
+    
+    client.delete(f"/api/attachments/{ids[0]}?user_id={test_entry.author_id}")
+    assert path.exists()
+    assert client.get(f"/api/attachments/{ids[1]}/download").content == content
+    # Çöp kutusundaki attachment mantıksal kullanıma sayılmaz
+    usage = client.get("/api/attachments/storage").json()
+    assert usage["logical_bytes"] == len(content)
+    assert usage["trashed_bytes"] == len(content)
+    assert usage["saved_bytes"] == len(content)
+    
+    client.delete(f"/api/attachments/{ids[1]}?user_id={test_entry.author_id}")
+    assert path.exists()  # çöp kutusunda: gc kalıcı siler
+    client.post("/api/maintenance/gc?grace_hours=0")
+    session.expire_all()
+    assert session.get(Blob, sha) is None
+    assert not path.exists()
+
+
+def test_download_range_etag_and_cache_headers(client: TestClient, test_entry: Entry):
+    """İndirme: strong ETag, 304, byte aralığı ve immutable önbellek"""
+    import uuid
+    
+    content = (f"t,v\n{uuid.uuid4()}\n" + "1,2\n" * 500).encode()
+    attachment = client.post(
+        f"/api/attachments/?entry_id={test_entry.id}",
+        files={"file": ("seri.csv", content, "text/csv")},
+    ).json()
+    url = f"/api/attachments/{attachment['id']}/download"
+    
+    # CSV diskte gzip'li: ham temsili iste
+    response = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert response.content == content
+    assert response.headers["etag"] == f'"{attachment["sha256"]}"'
+    assert response.headers["content-type"].startswith("text/csv")
+    assert "immutable" in response.headers["cache-control"]
+    assert response.headers["accept-ranges"] == "bytes"
+    
+    response = client.get(url, headers={"If-None-Match": response.headers["etag"]})
+    assert response.status_code == 304
+    assert response.content == b""
+    
+    response = client.get(url, headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.content == content[10:20]
+    assert response.headers["content-range"] == f"bytes 10-19/{len(content)}"
+    
+    response = client.get(url, headers={"Range": "bytes=-5"})
+    assert response.content == content[-5:]
+    
+    # Farklı içerik için If-Range: tüm dosya
+    response = client.get(url, headers={"Range": "bytes=0-9", "If-Range": '"baska"'})
+    assert response.status_code == 200
+    assert response.content == content
+    
+    response = client.get(url, headers={"Range": f"bytes={len(content)}-"})
+    assert response.status_code == 416
+
+
+def test_attachment_thumbnails(client: TestClient, test_entry: Entry, monkeypatch):
+    """Resim eklerinden küçük resim ve önizleme üretilir, blob yanında saklanır"""
+    import io
+    import uuid
+    from PIL import Image
+    import app.thumbnails as thumbnails
+    
+    monkeypatch.setattr(thumbnails, "THUMBNAIL_WORKERS", 0)  # havuz yerine istek içinde
+    
+    image = Image.new("RGB", (2000, 1000), (uuid.uuid4().int % 256, 80, 120))
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    attachment = client.post(
+        f"/api/attachments/?entry_id={test_entry.id}",
+        files={"file": ("mikroskop.png", buffer.getvalue(), "image/png")},
+    ).json()
+    assert thumbnails.derivative_path(attachment["sha256"], "thumb").exists()
+    
+    response = client.get(f"/api/attachments/{attachment['id']}/thumbnail?size=thumb")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/jpeg"
+    assert Image.open(io.BytesIO(response.content)).size == (256, 128)
+    
+    response = client.get(f"/api/attachments/{attachment['id']}/thumbnail?size=preview")
+    assert Image.open(io.BytesIO(response.content)).size == (1024, 512)
+    
+    assert client.get(f"/api/attachments/{attachment['id']}/thumbnail?size=huge").status_code == 422
+
+
+def test_pdf_thumbnail_without_pymupdf(client: TestClient, test_entry: Entry, monkeypatch):
+    """PyMuPDF yoksa PDF önizlemesi açıkça kullanılamaz bildirilir, türev üretilmez"""
+    import uuid
+    import app.thumbnails as thumbnails
+    
+    monkeypatch.setattr(thumbnails, "PDF_PREVIEWS", False)
+    monkeypatch.setattr(thumbnails, "THUMBNAIL_WORKERS", 0)
+    
+    content = b"%PDF-1.4\n" + uuid.uuid4().hex.encode() + b"\n%%EOF\n"
+    attachment = client.post(
+        f"/api/attachments/?entry_id={test_entry.id}",
+        files={"file": ("protokol.pdf", content, "application/pdf")},
+    ).json()
+    
+    response = client.get(f"/api/attachments/{attachment['id']}/thumbnail?size=thumb")
+    assert response.status_code == 501
+    assert "PyMuPDF" in response.json()["detail"]
+    assert not thumbnails.derivative_path(attachment["sha256"], "thumb").exists()
+
+
+def test_batch_upload_files_and_zip(
+    client: TestClient, session: Session, test_entry: Entry, monkeypatch,
+):
+    """Toplu yükleme: dosya başına sonuç, tek transaction, zip arşivi desteği"""
+    import io
+    import uuid
+    import zipfile
+    from sqlmodel import select
+    from app.api import attachments as attachments_api
+    from app.models import Attachment, AuditLog
+    
+    # Dosyalar hash'lenirken yazıcı bağlantısı (transaction) tutulmamalı
+    stage_source = attachments_api._stage_source
+    def staging_without_transaction(*args):
+        assert not session.in_transaction()
+        return stage_source(*args)
+    monkeypatch.setattr(attachments_api, "_stage_source", staging_without_transaction)
+    # Sıkıştırma ve blob yoluna taşıma da transaction dışında
+    from app import blobs
+    store_file = blobs.store_file
+    def storing_without_transaction(*args):
+        assert not session.in_transaction()
+        return store_file(*args)
+    monkeypatch.setattr(blobs, "store_file", storing_without_transaction)
+    
+    contents = [f"olcum-{i},{uuid.uuid4()}\n".encode() for i in range(3)]
+    files = [("files", (f"olcum{i}.csv", c, "text/csv")) for i, c in enumerate(contents)]
+    files.append(("files", ("tekrar.csv", contents[0], "text/csv")))
+    files.append(("files", ("betik.exe", b"MZ", "application/octet-stream")))
+    response = client.post(f"/api/attachments/batch?entry_id={test_entry.id}", files=files)
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["created"], report["duplicates"], report["failed"]) == (3, 1, 1)
+    assert [r["status"] for r in report["results"]] == ["created"] * 3 + ["duplicate", "error"]
+    
+    ids = [r["attachment_id"] for r in report["results"][:3]]
+    audits = session.exec(
+        select(AuditLog).where(AuditLog.entity == "attachment", AuditLog.entity_id.in_(ids))
+    ).all()
+    assert len(audits) == 3
+    
+    # Zip: mevcut dosya tekrar olarak raporlanır, yenisi eklenir
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("run/olcum0.csv", contents[0])
+        zf.writestr("run/yeni.csv", f"yeni,{uuid.uuid4()}\n")
+    response = client.post(
+        f"/api/attachments/batch?entry_id={test_entry.id}",
+        files=[("files", ("run.zip", archive.getvalue(), "application/zip"))],
+    )
+    report = response.json()
+    assert [(r["filename"], r["status"]) for r in report["results"]] == [
+        ("olcum0.csv", "duplicate"), ("yeni.csv", "created"),
+    ]
+    assert report["results"][0]["attachment_id"] == ids[0]
+    
+    attachments = session.exec(select(Attachment).where(Attachment.entry_id == test_entry.id)).all()
+    assert len(attachments) == 4
+
+
+def test_resumable_chunked_upload(client: TestClient, session: Session, test_entry: Entry):
+    """Parçalı yükleme: sırasız parçalar, eksik listesi, hash doğrulama ve temizlik"""
+    import hashlib
+    import os
+    from datetime import timedelta
+    from app.models import UploadSession
+    from app.uploads import MIN_CHUNK_SIZE, cleanup_stale_uploads, part_path
+    
+    content = os.urandom(MIN_CHUNK_SIZE * 2 + 1000)
+    response = client.post("/api/uploads/", json={
+        "entry_id": test_entry.id, "filename": "spektrum.raw", "total_size": len(content),
+        "chunk_size": MIN_CHUNK_SIZE, "sha256": hashlib.sha256(content).hexdigest(),
+    })
+    assert response.status_code == 201
+    upload_id = response.json()["id"]
+    
+    offsets = [0, MIN_CHUNK_SIZE, MIN_CHUNK_SIZE * 2]
+    for offset in reversed(offsets[1:]):  # sırasız
+        chunk = content[offset:offset + MIN_CHUNK_SIZE]
+        response = client.put(f"/api/uploads/{upload_id}/chunks/{offset}", content=chunk)
+        assert response.status_code == 200
+    
+    # Kesinti: ilk parça eksik, tamamlama reddedilir
+    status = client.get(f"/api/uploads/{upload_id}").json()
+    assert status["missing"] == [[0, MIN_CHUNK_SIZE]]
+    assert client.post(f"/api/uploads/{upload_id}/complete").status_code == 409
+    assert client.put(f"/api/uploads/{upload_id}/chunks/5", content=b"x").status_code == 422
+    
+    client.put(f"/api/uploads/{upload_id}/chunks/0", content=content[:MIN_CHUNK_SIZE])
+    response = client.post(f"/api/uploads/{upload_id}/complete")
+    assert response.status_code == 201
+    attachment = response.json()
+    assert attachment["file_size"] == len(content)
+    assert client.get(f"/api/attachments/{attachment['id']}/download").content == content
+    assert client.get(f"/api/uploads/{upload_id}").json()["status"] == "completed"
+    assert not part_path(upload_id).exists()
+    
+    # Bildirilen hash ile uyuşmayan içerik reddedilir
+    response = client.post("/api/uploads/", json={
+        "entry_id": test_entry.id, "filename": "bozuk.raw", "total_size": 10, "sha256": "0" * 64,
+    })
+    bad_id = response.json()["id"]
+    client.put(f"/api/uploads/{bad_id}/chunks/0", content=b"0123456789")
+    assert client.post(f"/api/uploads/{bad_id}/complete").status_code == 422
+    assert client.get(f"/api/uploads/{bad_id}").json()["missing"] == [[0, 10]]
+    
+    # Terk edilmiş oturum temizlenir
+    engine = session.get_bind()
+    assert cleanup_stale_uploads(engine, ttl=timedelta(seconds=-1)) == 2
+    session.expire_all()
+    assert session.get(UploadSession, bad_id) is None
+    assert not part_path(bad_id).exists()
+
+
+def test_complete_upload_concurrent_and_repeat(client: TestClient, test_entry: Entry, monkeypatch):
+    """Tamamlanan oturuma eşzamanlı çağrı 409 alır, tekrar çağrı aynı attachment'ı döndürür"""
+    import uuid
+    from app.api import uploads as uploads_api
+    
+    content = f"tekrar,{uuid.uuid4()}\n".encode()
+    upload_id = client.post("/api/uploads/", json={
+        "entry_id": test_entry.id, "filename": "tekrar.csv", "total_size": len(content),
+    }).json()["id"]
+    client.put(f"/api/uploads/{upload_id}/chunks/0", content=content)
+    
+    hash_file = uploads_api.hash_file
+    concurrent = []
+    def hash_with_concurrent_complete(path):
+        # Birinci çağrı dosyayı işlerken ikinci çağrı gelir
+        concurrent.append(client.post(f"/api/uploads/{upload_id}/complete"))
+        return hash_file(path)
+    monkeypatch.setattr(uploads_api, "hash_file", hash_with_concurrent_complete)
+    
+    response = client.post(f"/api/uploads/{upload_id}/complete")
+    assert response.status_code == 201
+    assert concurrent[0].status_code == 409
+    attachment = response.json()
+    assert client.get(f"/api/attachments/{attachment['id']}/download").content == content
+    
+    repeat = client.post(f"/api/uploads/{upload_id}/complete")
+    assert repeat.json()["id"] == attachment["id"]
+    assert client.get(f"/api/uploads/{upload_id}").json()["status"] == "completed"
+
+
+def test_storage_scrubber_reports_problems(client: TestClient, session: Session, test_entry: Entry):
+    """Denetim bozuk blob'u, dosyası olmayan kaydı ve sahipsiz dosyayı bulur"""
+    import os
+    import time
+    import uuid
+    from app.database import DATA_DIR
+    from app.gc import REPORT_TTL
+    from app.stats import REPORT_DIR
+    from app.models import Dataset
+    from app.scrubber import TokenBucket
+    
+    content = f"a,b\n{uuid.uuid4()}\n".encode()
+    attachment = client.post(
+        f"/api/attachments/?entry_id={test_entry.id}",
+        files={"file": ("bozulacak.csv", content, "text/csv")},
+    ).json()
+    (DATA_DIR / attachment["file_path"]).write_bytes(b"bit rot")
+    
+    dataset = Dataset(
+        entry_id=test_entry.id, name="kayip", source_file="storage/datasets/yok.csv",
+        columns_json={}, stats_json={}, row_count=0,
+    )
+    session.add(dataset)
+    session.commit()
+    
+    orphan = DATA_DIR / "storage" / "charts" / f"sahipsiz_{uuid.uuid4().hex}.png"
+    orphan.parent.mkdir(parents=True, exist_ok=True)
+    orphan.write_bytes(b"png")
+    
+    # Raporlar çöp toplayıcının saklama süresi boyunca sahipsiz sayılmaz
+    REPORT_DIR.mkdir(parents=True, exist_ok=True)
+    kept_report = REPORT_DIR / f"yeni_{uuid.uuid4().hex}.docx"
+    stale_report = REPORT_DIR / f"eski_{uuid.uuid4().hex}.docx"
+    for path, age in ((kept_report, 2 * 3600), (stale_report, REPORT_TTL.total_seconds() + 3600)):
+        path.write_bytes(b"docx")
+        os.utime(path, (time.time() - age, time.time() - age))
+    
+    try:
+        response = client.post("/api/maintenance/scrub?wait=true")
+        assert response.status_code == 200
+        report = response.json()
+        assert report["ok"] is False
+        assert [c["id"] for c in report["corrupt"]] == [attachment["sha256"]]
+        missing_dataset = {"kind": "dataset", "id": dataset.id, "path": "storage/datasets/yok.csv"}
+        assert missing_dataset in report["missing"]
+        orphan_paths = [o["path"] for o in report["orphans"]]
+        assert str(orphan.relative_to(DATA_DIR)) in orphan_paths
+        assert str(stale_report.relative_to(DATA_DIR)) in orphan_paths
+        assert str(kept_report.relative_to(DATA_DIR)) not in orphan_paths
+        assert client.get("/api/maintenance/scrub").json()["last_report"]["files_verified"] >= 1
+    finally:
+        orphan.unlink()
+        kept_report.unlink()
+        stale_report.unlink()
+    
+    # Hız sınırı: kapasite tükenince bekletir
+    bucket = TokenBucket(rate=1000, capacity=1000)
+    bucket.acquire(1000)
+    start = time.monotonic()
+    bucket.acquire(200)
+    assert time.monotonic() - start >= 0.15
+
+
+def test_transparent_compression(client: TestClient, session: Session, test_entry: Entry):
+    """CSV ekler ve dataset'ler diskte gzip'li saklanır, şeffaf okunur"""
+    import uuid
+    from app.models import Blob
+    
+    content = (f"t,v\n{uuid.uuid4()},0\n" + "".join(f"{i},{i * 2}\n" for i in range(2000))).encode()
+    attachment = client.post(
+        f"/api/attachments/?entry_id={test_entry.id}",
+        files={"file": ("olcum.csv", content, "text/csv")},
+    ).json()
+    blob = session.get(Blob, attachment["sha256"])
+    assert blob.encoding == "gzip"
+    assert blob.file_path.endswith(".gz")
+    assert blob.size == len(content)
+    assert blob.stored_size < blob.size // 2
+    
+    url = f"/api/attachments/{attachment['id']}/download"
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"] == f'"{attachment["sha256"]}.gz"'
+    assert response.content == content  # istemci açar
+    
+    response = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["content-length"] == str(len(content))
+    assert response.content == content
+    
+    response = client.get(url, headers={"Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.content == content[100:200]
+    assert response.headers["content-range"] == f"bytes 100-199/{len(content)}"
+    
+    storage = client.get("/api/attachments/storage").json()
+    assert storage["physical_bytes"] < storage["unique_bytes"]
+    
+    # Dataset: .csv.gz olarak saklanır, önizleme açarak okur
+    dataset = client.post(
+        f"/api/datasets/import?entry_id={test_entry.id}&name=olcum",
+        files={"file": ("olcum.csv", content, "text/csv")},
+    ).json()
+    assert dataset["source_file"].endswith(".csv.gz")
+    assert dataset["encoding"] == "gzip"
+    assert dataset["stored_size"] < dataset["file_size"] == len(content)
+    preview = client.get(f"/api/datasets/{dataset['id']}/preview?rows=3").json()
+    assert preview["columns"] == ["t", "v"]
+    assert preview["preview_rows"] == 3
+
+
+def test_deferred_delete_restore_and_gc(client: TestClient, session: Session, test_entry: Entry):
+    """Silme çöp kutusuna taşır, geri alınabilir; gc grace sonrası dosyaları siler"""
+    import os
+    import time
+    import uuid
+    from app.database import DATA_DIR
+    from app.models import Blob, Chart
+    from app import gc
+    
+    content = f"gc,{uuid.uuid4()}\n".encode()
+    attachment = client.post(
+        f"/api/attachments/?entry_id={test_entry.id}",
+        files={"file": ("gc.csv", content, "text/csv")},
+    ).json()
+    url = f"/api/attachments/{attachment['id']}"
+    path = DATA_DIR / session.get(Blob, attachment["sha256"]).file_path
+    
+    response = client.delete(f"{url}?user_id={test_entry.author_id}")
+    assert response.json()["status"] == "deleted"
+    assert client.get(url).status_code == 404
+    assert client.get("/api/stats/").json()["counts"]["attachments"] == 0
+    trash = client.get(f"/api/attachments/trash?entry_id={test_entry.id}").json()
+    assert [item["id"] for item in trash] == [attachment["id"]]
+    
+    # Grace süresi dolmadan gc dokunmaz; geri alma çalışır
+    report = client.post("/api/maintenance/gc").json()
+    assert report["attachments"] == 0
+    assert path.exists()
+    response = client.post(f"{url}/restore?user_id={test_entry.author_id}")
+    assert response.status_code == 200
+    assert client.get(f"{url}/download").content == content
+    assert client.get("/api/stats/").json()["counts"]["attachments"] == 1
+    
+    client.delete(f"{url}?user_id={test_entry.author_id}")
+    
+    # Aynı grafik iki kez üretilirse eskisi geçersiz kalır
+    # (önbellek anahtarı olmayan eski kayıt yeniden çizime yol açar)
+    dataset = client.post(
+        f"/api/datasets/import?entry_id={test_entry.id}&name=gc",
+        files={"file": ("gc.csv", b"x,y\n1,2\n2,4\n3,6\n", "text/csv")},
+    ).json()
+    charts = []
+    for _ in range(2):
+        charts.append(client.post(
+            f"/api/datasets/{dataset['id']}/chart?user_id={test_entry.author_id}",
+            json={
+                "dataset_id": dataset["id"], "chart_type": "line", "x_column": "x", "y_column": "y",
+            },
+        ).json())
+        legacy = session.get(Chart, charts[-1]["id"])
+        legacy.cache_key = None
+        session.add(legacy)
+        session.commit()
+    old_png = DATA_DIR / session.get(Chart, charts[0]["id"]).image_path
+    
+    # Süresi dolmuş rapor dosyası
+    gc.REPORT_DIR.mkdir(parents=True, exist_ok=True)
+    stale_report = gc.REPORT_DIR / f"eski_{uuid.uuid4().hex}.html.gz"
+    stale_report.write_bytes(b"x" * 100)
+    old = time.time() - 2 * 24 * 3600
+    os.utime(stale_report, (old, old))
+    
+    report = client.post("/api/maintenance/gc?grace_hours=0").json()
+    assert report["attachments"] == 1
+    assert report["charts"] == 1
+    assert report["reports"] >= 1
+    assert report["bytes_after"] < report["bytes_before"]
+    assert not path.exists()
+    assert not old_png.exists()
+    assert not stale_report.exists()
+    session.expire_all()
+    assert session.get(Chart, charts[0]["id"]) is None
+    assert session.get(Chart, charts[1]["id"]) is not None
+    assert client.post(f"{url}/restore?user_id={test_entry.author_id}").status_code == 404
+
+
+def test_gc_orphan_sweep_ignores_trash_grace(client: TestClient):
+    """grace_hours=0 yeni yazılan sahipsiz dosyalara dokunmaz; sabit yaş sınırı geçerlidir"""
+    import os
+    import time
+    import uuid
+    from app.columnar import COLUMNAR_DIR
+    from app.gc import CHART_DIR, ORPHAN_GRACE
+    
+    CHART_DIR.mkdir(parents=True, exist_ok=True)
+    fresh = CHART_DIR / f"{uuid.uuid4().hex}.png"
+    fresh.write_bytes(b"png")
+    part = COLUMNAR_DIR / f".{uuid.uuid4().hex}.part"
+    part.mkdir(parents=True)
+    (part / "0.raw").write_bytes(b"\0" * 8)
+    stale = CHART_DIR / f"{uuid.uuid4().hex}.png"
+    stale.write_bytes(b"png")
+    old = time.time() - ORPHAN_GRACE.total_seconds() - 60
+    os.utime(stale, (old, old))
+    
+    report = client.post("/api/maintenance/gc?grace_hours=0").json()
+    assert report["orphan_files"] == 1
+    assert fresh.exists() and (part / "0.raw").exists()
+    assert not stale.exists()
+
+
+def test_reupload_survives_concurrent_blob_purge(
+    client: TestClient, session: Session, test_entry: Entry,
+):
+    """Yerine konan dosya gc tarafından silinirse kayıt sırasında yeniden konur"""
+    import io
+    import uuid
+    from app.api.attachments import save_attachment
+    from app.blobs import place_blob
+    from app.storage import stage_stream
+    
+    content = f"yaris,{uuid.uuid4()}\n".encode()
+    first = client.post(
+        f"/api/attachments/?entry_id={test_entry.id}",
+        files={"file": ("yaris.csv", content, "text/csv")},
+    ).json()
+    client.delete(f"/api/attachments/{first['id']}?user_id={test_entry.author_id}")
+    
+    # Yeniden yükleme mevcut blob dosyasını bulur, sonra gc onu kalıcı siler
+    staged = stage_stream(io.BytesIO(content), len(content))
+    placed = place_blob(staged, compress=True)
+    assert not placed.created
+    client.post("/api/maintenance/gc?grace_hours=0")
+    assert not placed.path.exists()
+    
+    try:
+        attachment = save_attachment(session, test_entry, "yaris.csv", placed, None)
+    finally:
+        staged.discard()
+    assert client.get(f"/api/attachments/{attachment.id}/download").content == content
+
+
+def test_gc_keeps_template_file_of_live_template(client: TestClient, session: Session):
+    """Aynı dosya adlı canlı şablon varken silinen şablonun dosyası kalır"""
+    from app.database import DATA_DIR
+    from app.models import Template
+    
+    old = client.post(
+        "/api/templates/?name=eski&type=html",
+        files={"file": ("ortak_sablon.html", b"<p>eski</p>", "text/html")},
+    ).json()
+    client.delete(f"/api/templates/{old['id']}")
+    new = client.post(
+        "/api/templates/?name=yeni&type=html",
+        files={"file": ("ortak_sablon.html", b"<p>yeni</p>", "text/html")},
+    ).json()
+    path = DATA_DIR / new["file_path"]
+    
+    report = client.post("/api/maintenance/gc?grace_hours=0").json()
+    assert report["templates"] == 1
+    assert path.read_bytes() == b"<p>yeni</p>"
+    session.expire_all()
+    assert session.get(Template, old["id"]) is None
+    
+    client.delete(f"/api/templates/{new['id']}")
+    client.post("/api/maintenance/gc?grace_hours=0")
+    assert not path.exists()
+
+
+def test_project_storage_ledger_and_quota(
+    client: TestClient,
+    session: Session,
+    test_entry: Entry,
+    test_project: Project,
+    tmp_path,
+    monkeypatch,
+):
+    """Depolama defteri yüklemede güncellenir, kota aşan yükleme reddedilir"""
+    import uuid
+    import app.stats as stats
+    from app.api import reports as reports_api
+    
+    monkeypatch.setattr(stats, "REPORT_DIR", tmp_path)
+    monkeypatch.setattr(reports_api, "REPORT_DIR", tmp_path)
+    url = f"/api/projects/{test_project.id}/storage"
+    
+    content = f"defter,{uuid.uuid4()}\n".encode()
+    client.post(
+        f"/api/attachments/?entry_id={test_entry.id}",
+        files={"file": ("defter.csv", content, "text/csv")},
+    )
+    dataset = client.post(
+        f"/api/datasets/import?entry_id={test_entry.id}&name=defter",
+        files={"file": ("defter.csv", b"x,y\n1,2\n2,4\n", "text/csv")},
+    ).json()
+    chart = client.post(
+        f"/api/datasets/{dataset['id']}/chart?user_id={test_entry.author_id}",
+        json={"dataset_id": dataset["id"], "chart_type": "line", "x_column": "x", "y_column": "y"},
+    ).json()
+    client.post("/api/reports/pdf", json={"entry_id": test_entry.id})
+    report_size = sum(path.stat().st_size for path in tmp_path.iterdir())
+    
+    usage = client.get(url).json()
+    assert usage["attachment_bytes"] == len(content)
+    dataset_bytes = dataset["stored_size"] + dataset["columnar_size"]
+    assert usage["dataset_bytes"] == dataset_bytes
+    assert usage["chart_bytes"] == chart["file_size"] > 0
+    assert usage["report_bytes"] == report_size > 0
+    assert usage["used_bytes"] == len(content) + dataset_bytes + chart["file_size"] + report_size
+    experiment = usage["experiments"][0]
+    assert experiment["experiment_id"] == test_entry.experiment_id
+    assert experiment["used_bytes"] == usage["used_bytes"]
+    
+    # Yeniden hesaplama artımlı defterle aynı sonucu verir
+    client.post("/api/stats/rebuild")
+    assert client.get(url).json() == usage
+    
+    response = client.put(
+        f"/api/projects/{test_project.id}/quota?user_id={test_entry.author_id}",
+        json={"storage_quota_bytes": usage["used_bytes"] + 10},
+    )
+    assert response.json()["storage_quota_bytes"] == usage["used_bytes"] + 10
+    response = client.post(
+        f"/api/attachments/?entry_id={test_entry.id}",
+        files={"file": ("fazla.csv", b"y" * 100, "text/csv")},
+    )
+    assert response.status_code == 413
+    response = client.post(
+        "/api/uploads/",
+        json={"entry_id": test_entry.id, "filename": "buyuk.raw", "total_size": 100},
+    )
+    assert response.status_code == 413
+    # Parse öncesi kontrolden geçen dataset, kolon önbelleğiyle kotayı aşarsa kaydedilmez
+    from app.columnar import COLUMNAR_DIR
+    cached = set(COLUMNAR_DIR.iterdir())
+    response = client.post(
+        f"/api/datasets/import?entry_id={test_entry.id}&name=kucuk",
+        files={"file": ("kucuk.csv", b"a\n1\n", "text/csv")},
+    )
+    assert response.status_code == 413
+    assert set(COLUMNAR_DIR.iterdir()) == cached
+    assert client.get(url).json()["used_bytes"] == usage["used_bytes"]
+
+
+def test_dataset_columnar_cache(client: TestClient, test_entry: Entry, monkeypatch):
+    """Import kolon önbelleği yazar; önizleme ve grafik kaynağı yeniden parse etmez"""
+    from app.database import DATA_DIR
+    from app.api import datasets as datasets_api
+    from app.columnar import column_categories, read_manifest
+    
+    csv = b"t,deger,numune\n1,0.5,A\n2,1.5,\n3,2.5,B\n"
+    dataset = client.post(
+        f"/api/datasets/import?entry_id={test_entry.id}&name=kolon",
+        files={"file": ("kolon.csv", csv, "text/csv")},
+    ).json()
+    directory = DATA_DIR / dataset["columnar_path"]
+    manifest = read_manifest(directory)
+    assert manifest["row_count"] == 3
+    assert [c["kind"] for c in manifest["columns"]] == ["numeric", "numeric", "category"]
+    assert column_categories(directory, manifest["columns"][2]) == ["A", "B"]
+    assert sorted(p.name for p in directory.iterdir()) == [
+        "0.npy", "1.npy", "2.cat_data.npy", "2.cat_offsets.npy", "2.npy", "manifest.json",
+    ]
+    
+    def no_parse(*args, **kwargs):
+        raise AssertionError("kaynak dosya yeniden parse edildi")
+    monkeypatch.setattr(datasets_api, "read_table", no_parse)
+    
+    preview = client.get(f"/api/datasets/{dataset['id']}/preview?rows=1").json()
+    assert preview["columns"] == ["t", "deger", "numune"]
+    assert preview["data"] == [{"t": 1, "deger": 0.5, "numune": "A"}]
+    
+    chart = client.post(
+        f"/api/datasets/{dataset['id']}/chart?user_id={test_entry.author_id}",
+        json={
+            "dataset_id": dataset["id"], "chart_type": "scatter",
+            "x_column": "t", "y_column": "deger",
+        },
+    )
+    assert chart.status_code == 201
+    missing = client.post(
+        f"/api/datasets/{dataset['id']}/chart?user_id={test_entry.author_id}",
+        json={
+            "dataset_id": dataset["id"], "chart_type": "line", "x_column": "t", "y_column": "yok",
+        },
+    )
+    assert missing.status_code == 422
+
+
+def test_dataset_chunked_import_profile(
+    client: TestClient, session: Session, test_entry: Entry, monkeypatch,
+):
+    """CSV parça parça işlenir; istatistikler tüm dosyayla aynı, tip değişimi kolonda birleşir"""
+    import io
+    import pandas as pd
+    from app.database import DATA_DIR
+    from app.api import datasets as datasets_api
+    from app.columnar import read_columnar
+    
+    monkeypatch.setattr(datasets_api, "CSV_CHUNK_ROWS", 7)
+    # Gövde okunurken yazıcı bağlantısı (transaction) tutulmamalı
+    stage_multipart = datasets_api.stage_multipart
+    async def staging_without_transaction(*args, **kwargs):
+        assert not session.in_transaction()
+        return await stage_multipart(*args, **kwargs)
+    monkeypatch.setattr(datasets_api, "stage_multipart", staging_without_transaction)
+    lines = ["i,olcum,etiket"]
+    for i in range(50):
+        # olcum önce tamsayı, sonra ondalıklı; etiket önce sayı, sonra metin
+        lines.append(f"{i},{i if i < 20 else i + 0.5},{i % 3 if i < 30 else 'x' + str(i % 4)}")
+    csv = ("\n".join(lines) + "\n").encode()
+    expected = pd.read_csv(io.BytesIO(csv))
+    
+    dataset = client.post(
+        f"/api/datasets/import?entry_id={test_entry.id}&name=parcali",
+        files={"file": ("parcali.csv", csv, "text/csv")},
+    ).json()
+    assert dataset["row_count"] == 50
+    assert dataset["columns_json"]["olcum"]["dtype"] == "float64"
+    assert dataset["columns_json"]["etiket"]["dtype"] == "object"
+    assert dataset["columns_json"]["i"]["unique"] == 50
+    assert set(dataset["stats_json"]) == {"i", "olcum"}
+    for column in ("i", "olcum"):
+        stats = dataset["stats_json"][column]
+        assert stats["mean"] == pytest.approx(expected[column].mean())
+        assert stats["std"] == pytest.approx(expected[column].std())
+        assert stats["min"] == expected[column].min()
+        assert stats["max"] == expected[column].max()
+        assert stats["quantiles"]["50%"] == pytest.approx(expected[column].median())
+    
+    df = read_columnar(DATA_DIR / dataset["columnar_path"])
+    assert df["olcum"].tolist() == expected["olcum"].tolist()
+    assert df["etiket"].astype(str).tolist() == expected["etiket"].astype(str).tolist()
+
+def test_dataset_high_cardinality_text(client: TestClient, test_entry: Entry, monkeypatch):
+    """Farklı değeri sözlük sınırını aşan metin kolonu düz metin olarak yazılır"""
+    from app.database import DATA_DIR
+    from app import columnar
+    from app.api import datasets as datasets_api
+    from app.columnar import read_columnar, read_manifest
+    
+    monkeypatch.setattr(datasets_api, "CSV_CHUNK_ROWS", 10)
+    monkeypatch.setattr(columnar, "CATEGORY_LIMIT", 16)
+    lines = ["i,kod,grup"]
+    for i in range(100):
+        lines.append(f"{i},{'' if i % 17 == 0 else f'numune-{i}-ç'},g{i % 4}")
+    csv = ("\n".join(lines) + "\n").encode()
+    
+    dataset = client.post(
+        f"/api/datasets/import?entry_id={test_entry.id}&name=kodlar",
+        files={"file": ("kodlar.csv", csv, "text/csv")},
+    ).json()
+    assert dataset["row_count"] == 100
+    directory = DATA_DIR / dataset["columnar_path"]
+    manifest = read_manifest(directory)
+    assert [c["kind"] for c in manifest["columns"]] == ["numeric", "string", "category"]
+    # Değerler manifest'e yazılmaz
+    assert "numune" not in (directory / "manifest.json").read_text(encoding="utf-8")
+    
+    df = read_columnar(directory)
+    expected = [None if i % 17 == 0 else f"numune-{i}-ç" for i in range(100)]
+    assert df["kod"].tolist() == expected
+    assert df["grup"].tolist() == [f"g{i % 4}" for i in range(100)]
+    window = read_columnar(directory, ["kod"], nrows=5, offset=32)
+    assert window["kod"].tolist() == expected[32:37]
+    
+    rows = client.get(f"/api/datasets/{dataset['id']}/rows?offset=15&limit=3").json()
+    assert rows["data"]["kod"] == expected[15:18]
+
+
+
+def test_columnar_window_decodes_only_used_categories(monkeypatch):
+    """Pencere okuması manifest'i yeniden okumaz, sözlükten yalnızca penceredeki değerleri çözer"""
+    import pandas as pd
+    from app import columnar
+    from app.database import DATA_DIR
+    
+    writer = columnar.ColumnarWriter(DATA_DIR / "storage" / "columnar")
+    writer.append(pd.DataFrame({"n": range(1000), "etiket": [f"e{i}" for i in range(1000)]}))
+    directory = writer.close()
+    columnar.read_columnar(directory, ["n"], nrows=1)
+    
+    def no_manifest(*args, **kwargs):
+        raise AssertionError("manifest yeniden okundu")
+    monkeypatch.setattr(columnar, "read_manifest", no_manifest)
+    window = columnar.read_columnar(directory, ["etiket"], nrows=3, offset=500)
+    assert window["etiket"].tolist() == ["e500", "e501", "e502"]
+    assert list(window["etiket"].cat.categories) == ["e500", "e501", "e502"]
+    columnar.remove_columnar(directory)
+
+
+def test_dataset_rows_window(client: TestClient, session: Session, test_entry: Entry):
+    """Satır penceresi: offset/limit, kolon seçimi, kolon bazlı yanıt"""
+    from app.models import Dataset
+    
+    rows = (f"{i},{i * 0.5},{'AB'[i % 2] if i != 3 else ''}\n" for i in range(10))
+    csv = b"t,deger,numune\n" + "".join(rows).encode()
+    dataset = client.post(
+        f"/api/datasets/import?entry_id={test_entry.id}&name=pencere",
+        files={"file": ("pencere.csv", csv, "text/csv")},
+    ).json()
+    url = f"/api/datasets/{dataset['id']}/rows"
+    
+    window = client.get(f"{url}?offset=2&limit=3&columns=numune,t").json()
+    assert window["total_rows"] == 10
+    assert window["row_count"] == 3
+    assert window["columns"] == ["numune", "t"]
+    assert window["data"] == {"numune": ["A", None, "A"], "t": [2, 3, 4]}
+    
+    assert client.get(f"{url}?offset=8&limit=5").json()["data"]["deger"] == [4.0, 4.5]
+    assert client.get(f"{url}?offset=20").json()["row_count"] == 0
+    assert client.get(f"{url}?columns=yok").status_code == 422
+    
+    # Önbellek yoksa kaynak dosyadan aynı pencere
+    db_dataset = session.get(Dataset, dataset["id"])
+    db_dataset.columnar_path = None
+    session.add(db_dataset)
+    session.commit()
+    assert client.get(f"{url}?offset=2&limit=3&columns=numune,t").json()["data"] == window["data"]
+
+
+def test_chart_downsampling(client: TestClient, test_entry: Entry):
+    """Büyük serilerde nokta azaltma: lttb tepe noktasını korur, sayılar kaydedilir"""
+    import numpy as np
+    from app.downsample import lttb, minmax
+    
+    x = np.arange(10_000, dtype=float)
+    y = np.sin(x / 500)
+    y[4321] = 50.0
+    picked = lttb(x, y, 100)
+    assert len(picked) == 100 and picked[0] == 0 and picked[-1] == 9_999
+    assert 4321 in picked
+    picked = minmax(x, y, 100)
+    assert 4321 in picked and np.argmin(y) in picked and len(picked) <= 100
+    
+    csv = b"t,v\n" + b"".join(f"{i},{(i * 7) % 13}\n".encode() for i in range(3000))
+    dataset = client.post(
+        f"/api/datasets/import?entry_id={test_entry.id}&name=seri",
+        files={"file": ("seri.csv", csv, "text/csv")},
+    ).json()
+    url = f"/api/datasets/{dataset['id']}/chart?user_id={test_entry.author_id}"
+    body = {"dataset_id": dataset["id"], "x_column": "t", "y_column": "v"}
+    
+    def chart(chart_type, **config):
+        return client.post(url, json={**body, "chart_type": chart_type, **config})
+
+    line = chart("line", config_json={"downsample": {"threshold": 500}}).json()
+    assert (line["point_count"], line["rendered_point_count"]) == (3000, 500)
+    scatter = chart("scatter").json()
+    assert scatter["point_count"] == 3000 and scatter["rendered_point_count"] <= 2000
+    full = chart("line", config_json={"downsample": {"algorithm": "none"}}).json()
+    assert full["rendered_point_count"] == 3000
+    bad = chart("line", config_json={"downsample": {"algorithm": "x"}})
+    assert bad.status_code == 422
+
+
+def test_chart_render_cache(client: TestClient, test_entry: Entry, monkeypatch):
+    """Aynı grafik isteği yeniden çizilmez; farklı ayar yeni grafik üretir"""
+    from app import charts
+    from app.api import datasets as datasets_api
+    from app.database import DATA_DIR
+    
+    csv = b"t,v\n1,2\n2,4\n3,1\n"
+    dataset = client.post(
+        f"/api/datasets/import?entry_id={test_entry.id}&name=onbellek",
+        files={"file": ("onbellek.csv", csv, "text/csv")},
+    ).json()
+    assert dataset["sha256"]
+    url = f"/api/datasets/{dataset['id']}/chart?user_id={test_entry.author_id}"
+    body = {"dataset_id": dataset["id"], "chart_type": "line", "x_column": "t", "y_column": "v"}
+    
+    first = client.post(url, json=body)
+    assert first.status_code == 201
+    assert (DATA_DIR / first.json()["image_path"]).exists()
+    
+    def no_render(*args):
+        raise AssertionError("önbellekteki grafik yeniden çizildi")
+    monkeypatch.setattr(datasets_api, "render_async", no_render)
+    again = client.post(url, json=body)
+    assert again.status_code == 200
+    assert again.json()["id"] == first.json()["id"]
+    
+    monkeypatch.undo()
+    monkeypatch.setattr(charts, "CHART_WORKERS", 0)
+    other = client.post(url, json={**body, "title": "Başka"})
+    assert other.status_code == 201
+    assert other.json()["id"] != first.json()["id"]
+
+
+@pytest.mark.skipif(DB_MODE != "wal", reason="okuma/yazma ayrımı yalnızca wal modunda")
+def test_real_sessions_route_reads_and_writes(monkeypatch):
+    """Gerçek get_session: GET salt okunur havuza, POST tek yazıcıya gider"""
+    import sqlalchemy.exc
+    from sqlalchemy import text
+    from starlette.requests import Request
+    from app import database
+    
+    def session_for(method):
+        generator = database.get_session(Request({"type": "http", "method": method, "headers": []}))
+        return generator, next(generator)
+    
+    reader_gen, reader = session_for("GET")
+    assert reader.get_bind() is database.read_engine
+    assert reader.exec(text("PRAGMA query_only")).one()[0] == 1
+    with pytest.raises(sqlalchemy.exc.OperationalError, match="readonly"):
+        reader.exec(text("CREATE TABLE okuma_denemesi (x INTEGER)"))
+    reader.rollback()
+    reader_gen.close()
+    
+    writer_gen, writer = session_for("POST")
+    assert writer.get_bind() is database.engine
+    assert writer.exec(text("PRAGMA query_only")).one()[0] == 0
+    # Yazıcı havuzu tek bağlantılı: transaction açıkken ikinci yazıcı bekler
+    monkeypatch.setattr(database.engine.pool, "_timeout", 0.1)
+    with pytest.raises(sqlalchemy.exc.TimeoutError):
+        database.engine.connect()
+    writer.rollback()
+    writer_gen.close()
+    with database.engine.connect():
+        pass
+    
+    read_gen = database.get_read_session()
+    assert next(read_gen).get_bind() is database.read_engine
+    read_gen.close()